@@ -2,24 +2,31 @@
 Endpoints REST para el módulo de chat.
 
 - POST /api/chat/conversations/              → Crear conversación.
-- GET  /api/chat/conversations/              → Listar conversaciones del usuario.
+- GET  /api/chat/conversations/              → Listar conversaciones del usuario (con último mensaje y no leídos).
 - GET  /api/chat/conversations/<id>/         → Detalle de una conversación.
-- GET  /api/chat/conversations/<id>/messages → Historial de mensajes (MongoDB).
+- GET  /api/chat/conversations/<id>/messages → Historial de mensajes (MongoDB), con cursores.
 - POST /api/chat/conversations/get_or_create → Obtener o crear conversación por order_id + other_user_id.
+- POST /api/chat/conversations/<id>/read/    → Marcar la conversación como leída.
+- GET  /api/chat/conversations/write-buffer/ → Backlog del buffer de escritura (solo admin).
+- GET  /api/chat/conversations/outbound/     → Colas de salida de los WebSockets (solo admin).
 """
 
 from __future__ import annotations
 
+import logging
 from datetime import datetime, timezone
 
 from django.db.models import Q
+from pymongo.errors import PyMongoError
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from . import mongo
+from . import archive, inbox, mongo, outbound, write_behind
 from .models import Conversation
-from .serializers import ConversationSerializer, MessageSerializer
+from .serializers import ConversationInboxSerializer, ConversationSerializer, MessageSerializer
+
+logger = logging.getLogger(__name__)
 
 
 class ConversationViewSet(viewsets.ModelViewSet):
@@ -40,6 +47,35 @@ class ConversationViewSet(viewsets.ModelViewSet):
             .order_by("-created_at")
         )
 
+    # ------------------------------------------------------------------
+    # Bandeja de entrada: resúmenes de MongoDB en una sola consulta $in
+    # ------------------------------------------------------------------
+    def list(self, request, *args, **kwargs):
+        conversations = list(self.filter_queryset(self.get_queryset()))
+        try:
+            summaries = inbox.get_summaries((c.id for c in conversations), request.user.id)
+        except PyMongoError as e:
+            # Sin MongoDB la lista sigue saliendo de SQLite, sin resúmenes.
+            logger.warning(f"⚠️ [CHAT INBOX] Resúmenes no disponibles: {e}")
+            summaries = {}
+        serializer = ConversationInboxSerializer(
+            conversations,
+            many=True,
+            context={**self.get_serializer_context(), "summaries": summaries},
+        )
+        return Response(serializer.data)
+
+    @action(detail=True, methods=["post"], url_path="read")
+    def read(self, request, pk=None):
+        """
+        POST /api/chat/conversations/<uuid>/read/
+
+        Pone en cero los mensajes no leídos del usuario en la conversación.
+        """
+        conversation = self.get_object()
+        inbox.mark_read(conversation.id, request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     # ------------------------------------------------------------------
     # get_or_create — endpoint principal para los frontends
     # ------------------------------------------------------------------
@@ -78,13 +114,53 @@ class ConversationViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
         )
 
+    # ------------------------------------------------------------------
+    # Backlog del buffer de escritura diferida (por proceso)
+    # ------------------------------------------------------------------
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="write-buffer",
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def write_buffer(self, request):
+        """
+        GET /api/chat/conversations/write-buffer/
+
+        Mensajes pendientes de escribir en MongoDB en el proceso que atiende
+        la petición (ver write_behind.py).
+        """
+        return Response(write_behind.stats())
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="outbound",
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def outbound_queues(self, request):
+        """
+        GET /api/chat/conversations/outbound/
+
+        Colas de salida de los WebSockets abiertos en el proceso que atiende
+        la petición y contadores de coalescencia y clientes lentos (ver
+        outbound.py).
+        """
+        return Response(outbound.stats())
+
     # ------------------------------------------------------------------
     # Historial de mensajes (paginación por cursor con ?before=)
     # ------------------------------------------------------------------
     @action(detail=True, methods=["get"], url_path="messages")
     def messages(self, request, pk=None):
         """
-        GET /api/chat/conversations/<uuid>/messages/?limit=50&before=<iso-ts>
+        GET /api/chat/conversations/<uuid>/messages/?limit=50&before=<cursor>
+        GET /api/chat/conversations/<uuid>/messages/?after=<cursor>
+
+        Cada mensaje trae un ``cursor`` opaco. Para cargar más antiguos se
+        envía el del primer mensaje en ``before``; para ponerse al día tras
+        una reconexión, el del último recibido en ``after``. ``before`` sigue
+        aceptando un timestamp ISO-8601.
         """
         conversation = self.get_object()
         user = request.user
@@ -97,22 +173,36 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
         limit = min(int(request.query_params.get("limit", 50)), 100)
         before_raw = request.query_params.get("before")
-        before = None
+        after_raw = request.query_params.get("after")
+        before = after = None
         if before_raw:
             try:
-                before = datetime.fromisoformat(before_raw)
-                if before.tzinfo is None:
-                    before = before.replace(tzinfo=timezone.utc)
+                before = mongo.decode_cursor(before_raw)
+            except ValueError:
+                try:
+                    before = datetime.fromisoformat(before_raw)
+                    if before.tzinfo is None:
+                        before = before.replace(tzinfo=timezone.utc)
+                except ValueError:
+                    return Response(
+                        {"detail": "Formato de 'before' inválido. Usar el cursor de un mensaje."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+        if after_raw:
+            try:
+                after = mongo.decode_cursor(after_raw)
             except ValueError:
                 return Response(
-                    {"detail": "Formato de 'before' inválido. Usar ISO-8601."},
+                    {"detail": "Formato de 'after' inválido. Usar el cursor de un mensaje."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-        docs = mongo.get_conversation_messages(
+        # Incluye los mensajes ya compactados en chat_archives.
+        docs = archive.get_conversation_messages(
             conversation_id=str(conversation.id),
             limit=limit,
             before=before,
+            after=after,
         )
 
         serializer = MessageSerializer(docs, many=True)
@@ -5,3 +5,7 @@ class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.chat"
     verbose_name = "Chat"
+
+    def ready(self):
+        """Importa los signals cuando la app está lista."""
+        import apps.chat.signals  # noqa
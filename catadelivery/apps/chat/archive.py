@@ -0,0 +1,235 @@
+"""
+Archivo comprimido de conversaciones cerradas.
+
+``chat_messages`` guarda un documento por mensaje para siempre; los de
+pedidos ya entregados o cancelados casi no se leen, pero siguen ocupando
+``idx_conversation_timestamp_id`` y el working set de MongoDB. El command
+``compact_chat_archives`` pliega esas conversaciones en un solo documento
+de ``chat_archives``::
+
+    {
+        "_id":             "uuid de la conversación",
+        "count":           int,
+        "first_timestamp": datetime (UTC),
+        "last_timestamp":  datetime (UTC),
+        "last_seq":        int | None,
+        "codec":           "zlib+bson",
+        "data":            Binary (BSON {"messages": [...]} comprimido),
+        "archived_at":     datetime (UTC)
+    }
+
+y borra los originales. Compactar es idempotente: si el proceso se corta
+entre escribir el archivo y borrar los mensajes, la siguiente corrida los
+vuelve a plegar (se deduplican por ``_id``); los mensajes que lleguen
+después de archivar se pliegan en el mismo documento.
+
+``get_conversation_messages`` y ``aget_messages_since`` envuelven a las de
+``mongo`` y completan con el archivo cuando hace falta, así la vista de
+historial y el replay del WebSocket no distinguen una conversación
+archivada.
+"""
+
+from __future__ import annotations
+
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Any
+
+import bson
+from pymongo import ASCENDING
+
+from . import mongo
+
+logger = logging.getLogger(__name__)
+
+ARCHIVES_COLLECTION = "chat_archives"
+CODEC = "zlib+bson"
+
+# Un documento BSON no puede superar 16 MB.
+MAX_ARCHIVE_BYTES = 15 * 1024 * 1024
+
+
+def get_archives_collection():
+    return mongo._get_db()[ARCHIVES_COLLECTION]
+
+
+def get_async_archives_collection():
+    return mongo._get_async_db()[ARCHIVES_COLLECTION]
+
+
+# ---------------------------------------------------------------------------
+# Codificación
+# ---------------------------------------------------------------------------
+def encode_messages(docs: list[dict[str, Any]]) -> bytes:
+    """Mensajes (sin ``conversation_id``) → BSON comprimido."""
+    return zlib.compress(bson.encode({"messages": docs}), 6)
+
+
+def decode_messages(archive: dict[str, Any] | None) -> list[dict[str, Any]]:
+    """Mensajes de un documento de archivo, del más antiguo al más reciente."""
+    if not archive:
+        return []
+    if archive.get("codec") != CODEC:
+        raise ValueError(f"Codec de archivo desconocido: {archive.get('codec')!r}")
+    return bson.decode(zlib.decompress(archive["data"]))["messages"]
+
+
+def load(conversation_id) -> list[dict[str, Any]]:
+    """Mensajes archivados de la conversación (``[]`` si no tiene archivo)."""
+    return decode_messages(get_archives_collection().find_one({"_id": str(conversation_id)}))
+
+
+async def aload(conversation_id) -> list[dict[str, Any]]:
+    """Versión asíncrona de :func:`load`."""
+    return decode_messages(
+        await get_async_archives_collection().find_one({"_id": str(conversation_id)})
+    )
+
+
+# ---------------------------------------------------------------------------
+# Compactación
+# ---------------------------------------------------------------------------
+def compact_conversation(conversation_id) -> int:
+    """
+    Pliega los mensajes de la conversación en su documento de archivo y
+    borra los originales.
+
+    Returns
+    -------
+    int
+        Mensajes movidos de ``chat_messages`` al archivo (0 si no había o si
+        el archivo superaría el tamaño máximo de un documento).
+    """
+    conversation_id = str(conversation_id)
+    collection = mongo.get_messages_collection()
+    live = list(
+        collection.find({"conversation_id": conversation_id}, mongo.MESSAGE_PROJECTION)
+        .sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+    )
+    if not live:
+        return 0
+
+    by_id = {doc["_id"]: doc for doc in load(conversation_id)}
+    by_id.update((doc["_id"], doc) for doc in live)
+    messages = sorted(by_id.values(), key=lambda doc: (doc["timestamp"], doc["_id"]))
+    data = encode_messages(messages)
+    if len(data) > MAX_ARCHIVE_BYTES:
+        logger.warning(
+            f"⚠️ [CHAT ARCHIVE] Conversación {conversation_id} no archivada: "
+            f"{len(data)} bytes comprimidos."
+        )
+        return 0
+
+    seqs = [doc["seq"] for doc in messages if doc.get("seq") is not None]
+    get_archives_collection().replace_one(
+        {"_id": conversation_id},
+        {
+            "count": len(messages),
+            "first_timestamp": messages[0]["timestamp"],
+            "last_timestamp": messages[-1]["timestamp"],
+            "last_seq": max(seqs) if seqs else None,
+            "codec": CODEC,
+            "data": bson.Binary(data),
+            "archived_at": datetime.now(timezone.utc),
+        },
+        upsert=True,
+    )
+    # Solo los que quedaron en el archivo: los que lleguen mientras tanto
+    # se pliegan en la próxima corrida.
+    collection.delete_many({
+        "conversation_id": conversation_id,
+        "_id": {"$in": [doc["_id"] for doc in live]},
+    })
+    return len(live)
+
+
+def last_activity(conversation_ids: list[str]) -> dict[str, datetime]:
+    """
+    Timestamp del último mensaje sin archivar de cada conversación (las que
+    no tienen mensajes en ``chat_messages`` no aparecen).
+    """
+    pipeline = [
+        {"$match": {"conversation_id": {"$in": conversation_ids}}},
+        {"$group": {"_id": "$conversation_id", "last": {"$max": "$timestamp"}}},
+    ]
+    return {
+        row["_id"]: row["last"].replace(tzinfo=timezone.utc)
+        for row in mongo.get_messages_collection().aggregate(pipeline)
+    }
+
+
+# ---------------------------------------------------------------------------
+# Lectura transparente
+# ---------------------------------------------------------------------------
+def _naive_utc(timestamp: datetime) -> datetime:
+    # pymongo y bson.decode devuelven datetimes naive en UTC.
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _compare(doc: dict[str, Any], position: mongo.MessagePosition) -> int:
+    """-1, 0 o 1 según *doc* esté antes, en o después de *position*."""
+    if isinstance(position, datetime):
+        mine, theirs = doc["timestamp"], _naive_utc(position)
+    else:
+        timestamp, object_id = position
+        mine, theirs = (doc["timestamp"], doc["_id"]), (_naive_utc(timestamp), object_id)
+    return (mine > theirs) - (mine < theirs)
+
+
+def _select(docs, limit, before, after) -> list[dict[str, Any]]:
+    """Misma selección que ``mongo._messages_query`` sobre *docs* ordenados."""
+    docs = [
+        doc for doc in docs
+        if (before is None or _compare(doc, before) < 0)
+        and (after is None or _compare(doc, after) > 0)
+    ]
+    return docs[:limit] if after is not None else docs[-limit:]
+
+
+def get_conversation_messages(
+    conversation_id: str,
+    limit: int = 50,
+    before: mongo.MessagePosition | None = None,
+    after: mongo.MessagePosition | None = None,
+) -> list[dict[str, Any]]:
+    """
+    :func:`mongo.get_conversation_messages` más los mensajes archivados.
+
+    Lo archivado es anterior a lo que sigue en ``chat_messages``: al
+    paginar hacia atrás solo se lee el archivo si la página no se llenó.
+    """
+    docs = mongo.get_conversation_messages(conversation_id, limit, before, after)
+    if len(docs) >= limit and after is None:
+        return docs
+    archived = _select(load(conversation_id), limit, before, after)
+    if not archived:
+        return docs
+
+    merged = {doc["_id"]: doc for doc in mongo._chronological(archived, ascending=True)}
+    merged.update((doc["_id"], doc) for doc in docs)
+    # Los _id en hexadecimal ordenan igual que los ObjectId.
+    ordered = sorted(merged.values(), key=lambda doc: (doc["timestamp"], doc["_id"]))
+    return ordered[:limit] if after is not None else ordered[-limit:]
+
+
+async def aget_messages_since(
+    conversation_id: str,
+    since_seq: int,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """:func:`mongo.aget_messages_since` más los mensajes archivados."""
+    docs = await mongo.aget_messages_since(conversation_id, since_seq, limit)
+    if len(docs) >= limit:
+        return docs
+    by_seq = {
+        doc["seq"]: doc
+        for doc in await aload(conversation_id)
+        if doc.get("seq") is not None and doc["seq"] > since_seq
+    }
+    if not by_seq:
+        return docs
+    by_seq.update((doc["seq"], doc) for doc in docs)
+    return [by_seq[seq] for seq in sorted(by_seq)][:limit]
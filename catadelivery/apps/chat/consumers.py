@@ -8,25 +8,210 @@ Flujo:
    a. Que el usuario esté autenticado.
    b. Que la conversación exista en SQLite.
    c. Que el usuario pertenezca a la conversación (rider o dueño del store).
+   b y c usan el cache de pertenencia (``membership``): en estado estable
+   no hay consultas ni saltos a hilos.
 4. Si pasa las validaciones, se une al grupo de Channels (por conversation_id).
-5. ``receive_json()`` persiste el mensaje en MongoDB y lo emite al grupo.
-6. ``disconnect()`` abandona el grupo.
+   Si la URL trae ``?since_seq=<n>`` (último ``seq`` que recibió el cliente),
+   antes de la entrega en vivo se reenvían solo los mensajes con
+   ``seq > n`` y un frame ``{"event": "replay_complete", ...}``. Los
+   mensajes en vivo que lleguen durante el replay se entregan después; el
+   cliente descarta los ``seq`` que ya tiene.
+5. ``receive()`` encola el mensaje en el buffer de escritura diferida
+   (``write_behind``, con ``_id`` y timestamp locales) y lo emite al grupo
+   sin esperar a MongoDB.
+6. Todo frame hacia el cliente (eventos del grupo, replay, errores) pasa
+   por una cola de salida acotada (``outbound``): coalescencia de ráfagas
+   (``?batch=1``), ventana de acks (``?ack=1`` y ``{"ack": n}``) y cierre
+   con ``outbound.CLOSE_SLOW_CONSUMER`` si el cliente no da abasto.
+7. ``disconnect()`` abandona el grupo.
+
+``OrderTrackingConsumer`` sigue el mismo esquema para la posición en vivo
+del rider de un pedido (``ws/orders/<order_id>/tracking/``).
+
+``UserStreamConsumer`` (``ws/stream/``) multiplexa ambos en un solo socket
+por usuario: el cliente se suscribe y desuscribe a conversaciones y pedidos
+con frames livianos, en lugar de abrir un socket (con su JWT y su consulta)
+por cada uno.
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import uuid
+from datetime import timezone
+from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from pymongo.errors import PyMongoError
 
-from .models import Conversation
-from . import mongo
+from apps.order.models import Order
+from apps.users.models import UserProfile
+
+from . import archive, live_position, membership, mongo, outbound, write_behind
 
 logger = logging.getLogger(__name__)
 
+REPLAY_MAX_MESSAGES = getattr(settings, "CHAT_REPLAY_MAX_MESSAGES", 500)
+
+
+def message_frame(conversation_id, doc, sender_username) -> dict:
+    """Frame JSON de un mensaje, igual para la entrega en vivo y el replay."""
+    timestamp = doc["timestamp"]
+    if timestamp.tzinfo is None:
+        # pymongo devuelve datetimes naive en UTC.
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return {
+        "message_id": str(doc["_id"]),
+        "conversation_id": str(conversation_id),
+        "seq": doc.get("seq"),
+        "sender_id": doc["sender_id"],
+        "sender_username": sender_username,
+        "message": doc["message"],
+        "timestamp": timestamp.isoformat(),
+    }
+
+
+async def send_chat_message(channel_layer, conversation_id, members, user, text) -> dict:
+    """
+    Encola el mensaje en el buffer de escritura diferida (solo espera la
+    escritura en modo durable) y lo emite al grupo de la conversación.
+
+    Lanza ``PyMongoError`` si no se pudo asignar el ``seq`` o guardar.
+    """
+    doc = await write_behind.add_message(
+        conversation_id=conversation_id,
+        sender_id=user.id,
+        message=text,
+        recipient_ids=[member for member in members if member != user.id],
+    )
+    await channel_layer.group_send(
+        f"chat_{conversation_id}",
+        {
+            "type": "chat.message",
+            **message_frame(conversation_id, doc, user.username),
+        },
+    )
+    return doc
+
+
+async def _missed_messages(conversation_id, since_seq: int) -> list[dict]:
+    """Mensajes con ``seq > since_seq`` de MongoDB (o su archivo) y del buffer local."""
+    stored = await archive.aget_messages_since(conversation_id, since_seq, REPLAY_MAX_MESSAGES)
+    by_seq = {doc["seq"]: doc for doc in stored}
+    for doc in write_behind.get_buffer().pending_since(conversation_id, since_seq):
+        by_seq.setdefault(doc["seq"], doc)
+    return [by_seq[seq] for seq in sorted(by_seq)][:REPLAY_MAX_MESSAGES]
+
+
+async def replay_frames(conversation_id, members, since_seq: int):
+    """
+    Frames de los mensajes que un cliente con ``since_seq`` no recibió.
+
+    Returns
+    -------
+    tuple
+        ``(frames, last_seq, truncated)``; con ``truncated`` faltan mensajes
+        y el cliente debe completar el historial por REST.
+    """
+    current = await mongo.acurrent_seq(conversation_id)
+    if current <= since_seq:
+        return [], current, False
+
+    docs = await _missed_messages(conversation_id, since_seq)
+    if len(docs) < REPLAY_MAX_MESSAGES and (not docs or docs[-1]["seq"] < current):
+        # Lo que falta sigue en el buffer de escritura de otro proceso:
+        # esperar a su próximo flush y volver a leer.
+        await asyncio.sleep(write_behind.get_buffer().flush_interval * 2)
+        docs = await _missed_messages(conversation_id, since_seq)
+
+    usernames = {
+        u.id: u.username
+        async for u in UserProfile.objects.filter(id__in=members).only("id", "username")
+    }
+    frames = [
+        message_frame(conversation_id, doc, usernames.get(doc["sender_id"]))
+        for doc in docs
+    ]
+    last_seq = docs[-1]["seq"] if docs else since_seq
+    return frames, last_seq, len(docs) >= REPLAY_MAX_MESSAGES
+
+
+@database_sync_to_async
+def get_tracked_order(order_id):
+    """Datos del pedido para autorizar el tracking y enviar la última posición."""
+    return (
+        Order.objects.filter(pk=order_id)
+        .values(
+            "id",
+            "client_id",
+            "status",
+            "rider__current_latitude",
+            "rider__current_longitude",
+            "rider__last_location_update",
+        )
+        .first()
+    )
+
+
+def last_known_position(order) -> dict | None:
+    """Última posición conocida del rider si el pedido está en ruta."""
+    if (
+        order["status"] == live_position.IN_ROUTE_STATUS
+        and order["rider__current_latitude"] is not None
+        and order["rider__current_longitude"] is not None
+        and order["rider__last_location_update"] is not None
+    ):
+        return live_position.compact_position(
+            order["id"],
+            order["rider__current_latitude"],
+            order["rider__current_longitude"],
+            order["rider__last_location_update"],
+        )
+    return None
+
+
+def can_track(order, user) -> bool:
+    """Solo el cliente del pedido (o staff) puede seguir al rider."""
+    return order["client_id"] == user.id or user.is_staff
+
+
+def query_param(scope, name: str) -> str | None:
+    """Primer valor de *name* en el query string del WebSocket."""
+    values = parse_qs(scope.get("query_string", b"").decode()).get(name)
+    return values[0] if values else None
+
+
+def open_outbound(consumer) -> outbound.OutboundQueue:
+    """
+    Cola de salida de *consumer*; con ``?batch=1`` agrupa las ráfagas y con
+    ``?ack=1`` limita los frames sin confirmar.
+    """
+    return outbound.OutboundQueue(
+        send=lambda text: consumer.send(text_data=text),
+        close=consumer.close,
+        batching=query_param(consumer.scope, "batch") == "1",
+        acks=query_param(consumer.scope, "ack") == "1",
+    )
+
+
+def take_ack(consumer, content) -> bool:
+    """Aplica un frame ``{"ack": n}`` del cliente; ``True`` si lo era."""
+    if not isinstance(content, dict) or "ack" not in content:
+        return False
+    consumer.outbound.ack(content["ack"])
+    return True
+
+
+async def close_outbound(consumer) -> None:
+    queue = getattr(consumer, "outbound", None)
+    if queue is not None:
+        await queue.stop()
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
     """Consumer asíncrono para chat 1-a-1 entre store y rider."""
@@ -46,8 +231,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
         # 2. ¿La conversación existe?
-        conversation = await self._get_conversation(self.conversation_id)
-        if conversation is None:
+        self.members = members = await membership.aget_members(self.conversation_id)
+        if not members:
             logger.warning(
                 "WS rechazado: conversación %s no existe.", self.conversation_id
             )
@@ -55,8 +240,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
         # 3. ¿El usuario pertenece a la conversación?
-        belongs = await self._user_belongs(conversation, user)
-        if not belongs:
+        if user.id not in members:
             logger.warning(
                 "WS rechazado: usuario %s no pertenece a conversación %s.",
                 user.id,
@@ -68,16 +252,44 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Todo OK → unirse al grupo y aceptar la conexión
         await self.channel_layer.group_add(self.room_group, self.channel_name)
         await self.accept()
+        self.outbound = open_outbound(self)
         logger.info(
             "WS conectado: usuario %s en conversación %s.",
             user.id,
             self.conversation_id,
         )
 
+        # 4. Reconexión: reenviar solo lo que el cliente no recibió.
+        since_seq = self._since_seq()
+        if since_seq is not None:
+            try:
+                await self._replay(since_seq)
+            except PyMongoError:
+                logger.exception("Replay fallido en conversación %s.", self.conversation_id)
+
+    def _since_seq(self) -> int | None:
+        try:
+            return max(int(query_param(self.scope, "since_seq")), 0)
+        except (TypeError, ValueError):
+            return None
+
+    async def _replay(self, since_seq: int) -> None:
+        frames, last_seq, truncated = await replay_frames(
+            self.conversation_id, self.members, since_seq
+        )
+        for frame in frames:
+            await self.outbound.put_wait(frame)
+        await self.outbound.put_wait({
+            "event": "replay_complete",
+            "last_seq": last_seq,
+            "truncated": truncated,
+        })
+
     # ------------------------------------------------------------------
     # Desconexión
     # ------------------------------------------------------------------
     async def disconnect(self, close_code):
+        await close_outbound(self)
         await self.channel_layer.group_discard(self.room_group, self.channel_name)
 
     # ------------------------------------------------------------------
@@ -88,72 +300,286 @@ class ChatConsumer(AsyncWebsocketConsumer):
         Payload esperado del cliente::
 
             {"message": "Hola, ya salí del local."}
+
+        o, con ``?ack=1``, ``{"ack": <frames recibidos>}``.
         """
         try:
             content = json.loads(text_data)
         except (json.JSONDecodeError, TypeError):
-            await self.send(text_data=json.dumps({"error": "JSON inválido."}))
+            await self.outbound.put_wait({"error": "JSON inválido."})
+            return
+        if take_ack(self, content):
             return
 
         user = self.scope["user"]
-        message_text = content.get("message", "").strip()
+        message_text = content.get("message", "").strip() if isinstance(content, dict) else ""
         if not message_text:
-            await self.send(text_data=json.dumps({"error": "El mensaje no puede estar vacío."}))
+            await self.outbound.put_wait({"error": "El mensaje no puede estar vacío."})
             return
 
-        # Persistir en MongoDB
-        doc = await self._save_message(
-            conversation_id=self.conversation_id,
-            sender_id=user.id,
-            message=message_text,
-        )
-
-        # Emitir al grupo (todos los participantes conectados)
-        await self.channel_layer.group_send(
-            self.room_group,
-            {
-                "type": "chat.message",
-                "conversation_id": str(self.conversation_id),
-                "sender_id": user.id,
-                "sender_username": user.username,
-                "message": message_text,
-                "timestamp": doc["timestamp"].isoformat(),
-            },
-        )
+        # Encolar para MongoDB y emitir al grupo (todos los participantes conectados)
+        try:
+            await send_chat_message(
+                self.channel_layer, self.conversation_id, self.members, user, message_text
+            )
+        except PyMongoError:
+            logger.exception("No se pudo guardar el mensaje en conversación %s.", self.conversation_id)
+            await self.outbound.put_wait({"error": "No se pudo enviar el mensaje."})
 
     # ------------------------------------------------------------------
     # Handler de grupo: reenviar mensaje a cada WebSocket
     # ------------------------------------------------------------------
     async def chat_message(self, event):
-        """Recibido vía channel layer; reenviado al WebSocket del cliente."""
-        await self.send(text_data=json.dumps({
+        """Recibido vía channel layer; encolado para el WebSocket del cliente."""
+        self.outbound.put({
+            "message_id": event["message_id"],
             "conversation_id": event["conversation_id"],
+            "seq": event["seq"],
             "sender_id": event["sender_id"],
             "sender_username": event["sender_username"],
             "message": event["message"],
             "timestamp": event["timestamp"],
-        }))
+        })
+
+
+class OrderTrackingConsumer(AsyncWebsocketConsumer):
+    """
+    Consumer de solo lectura con la posición en vivo del rider de un pedido.
+
+    El cliente abre ``ws://.../ws/orders/<order_id>/tracking/?token=<jwt>``
+    y recibe payloads compactos (ver ``live_position.compact_position``)
+    mientras el pedido está en ruta.
+    """
+
+    async def connect(self):
+        self.order_id = self.scope["url_route"]["kwargs"]["order_id"]
+        self.group = live_position.tracking_group(self.order_id)
+        user = self.scope.get("user")
+
+        if user is None or isinstance(user, AnonymousUser):
+            logger.warning("WS tracking rechazado: usuario no autenticado.")
+            await self.close(code=4001)
+            return
+
+        order = await get_tracked_order(self.order_id)
+        if order is None:
+            await self.close(code=4004)
+            return
+
+        if not can_track(order, user):
+            logger.warning(
+                "WS tracking rechazado: usuario %s no es cliente del pedido %s.",
+                user.id,
+                self.order_id,
+            )
+            await self.close(code=4003)
+            return
+
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        self.outbound = open_outbound(self)
+
+        # Enviar la última posición conocida para no esperar al próximo fix.
+        position = last_known_position(order)
+        if position is not None:
+            self.outbound.put(position, key="position", sheddable=True)
+
+    async def disconnect(self, close_code):
+        await close_outbound(self)
+        if hasattr(self, "group"):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """El canal es de solo lectura: solo se atienden los ``{"ack": n}``."""
+        try:
+            take_ack(self, json.loads(text_data))
+        except (json.JSONDecodeError, TypeError):
+            pass
+
+    async def rider_position(self, event):
+        """Recibido vía channel layer; solo la última posición pendiente se envía."""
+        self.outbound.put(event["position"], key="position", sheddable=True)
+
+
+class UserStreamConsumer(AsyncWebsocketConsumer):
+    """
+    Socket único por usuario, multiplexado por tópicos.
+
+    El cliente abre ``ws://.../ws/stream/?token=<jwt>`` y manda frames::
+
+        {"action": "subscribe",   "topic": "chat:<conversation_id>", "since_seq": 12}
+        {"action": "subscribe",   "topic": "order:<order_id>"}
+        {"action": "unsubscribe", "topic": "chat:<conversation_id>"}
+        {"action": "send",        "topic": "chat:<conversation_id>", "message": "Hola"}
+
+    ``since_seq`` es opcional y funciona como en ``ChatConsumer``. El
+    servidor responde con ``{"event": "subscribed" | "unsubscribed" |
+    "error", "topic": ..., ...}`` y reenvía los mismos frames que los
+    consumers de un solo tópico, con ``"topic"`` agregado. Se reutilizan los
+    grupos ``chat_<id>`` y ``order_tracking_<id>``: quien publica no
+    distingue entre ambos tipos de socket. Con ``?batch=1`` las ráfagas
+    llegan agrupadas y con ``?ack=1`` el cliente confirma con
+    ``{"ack": n}`` (ver ``outbound``); bajo presión se descartan primero
+    las posiciones intermedias.
+    """
+
+    MAX_SUBSCRIPTIONS = getattr(settings, "CHAT_STREAM_MAX_SUBSCRIPTIONS", 100)
+
+    async def connect(self):
+        user = self.scope.get("user")
+        # tópico → (grupo, miembros de la conversación o None)
+        self.subscriptions: dict[str, tuple[str, tuple | None]] = {}
+
+        if user is None or isinstance(user, AnonymousUser):
+            logger.warning("WS stream rechazado: usuario no autenticado.")
+            await self.close(code=4001)
+            return
+        await self.accept()
+        self.outbound = open_outbound(self)
+
+    async def disconnect(self, close_code):
+        await close_outbound(self)
+        for group, _ in getattr(self, "subscriptions", {}).values():
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def _send_json(self, payload: dict) -> None:
+        # Por la cola, en orden con los eventos de los grupos.
+        await self.outbound.put_wait(payload)
+
+    async def _error(self, detail: str, topic: str | None = None) -> None:
+        await self._send_json({"event": "error", "topic": topic, "detail": detail})
 
     # ------------------------------------------------------------------
-    # Helpers async → sync
+    # Frames del cliente
     # ------------------------------------------------------------------
-    @database_sync_to_async
-    def _get_conversation(self, conversation_id) -> Conversation | None:
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            return Conversation.objects.get(
-                pk=conversation_id
-            )
-        except (Conversation.DoesNotExist, ValueError):
+            content = json.loads(text_data)
+        except (json.JSONDecodeError, TypeError):
+            await self._error("JSON inválido.")
+            return
+        if not isinstance(content, dict):
+            await self._error("JSON inválido.")
+            return
+        if take_ack(self, content):
+            return
+
+        action = content.get("action")
+        raw_topic = content.get("topic")
+        topic = self._normalize_topic(raw_topic)
+        if topic is None:
+            await self._error("Tópico inválido.", raw_topic if isinstance(raw_topic, str) else None)
+            return
+
+        if action == "subscribe":
+            await self._subscribe(topic, content.get("since_seq"))
+        elif action == "unsubscribe":
+            await self._unsubscribe(topic)
+        elif action == "send":
+            await self._send_message(topic, content.get("message"))
+        else:
+            await self._error("Acción desconocida.", topic)
+
+    @staticmethod
+    def _normalize_topic(topic) -> str | None:
+        """``chat:<uuid>`` u ``order:<id>`` en forma canónica, o ``None``."""
+        if not isinstance(topic, str):
             return None
+        kind, _, key = topic.partition(":")
+        if kind == "chat":
+            try:
+                return f"chat:{uuid.UUID(key)}"
+            except ValueError:
+                return None
+        if kind == "order" and key.isdigit():
+            return f"order:{int(key)}"
+        return None
 
-    @database_sync_to_async
-    def _user_belongs(self, conversation: Conversation, user) -> bool:
-        return conversation.user_belongs(user)
+    async def _subscribe(self, topic: str, since_seq) -> None:
+        if topic in self.subscriptions:
+            await self._send_json({"event": "subscribed", "topic": topic})
+            return
+        if len(self.subscriptions) >= self.MAX_SUBSCRIPTIONS:
+            await self._error("Demasiadas suscripciones.", topic)
+            return
 
-    @database_sync_to_async
-    def _save_message(self, conversation_id, sender_id, message):
-        return mongo.save_message(
-            conversation_id=conversation_id,
-            sender_id=sender_id,
-            message=message,
-        )
+        kind, _, key = topic.partition(":")
+        user = self.scope["user"]
+        if kind == "chat":
+            members = await membership.aget_members(key)
+            if not members or user.id not in members:
+                await self._error("Conversación no encontrada.", topic)
+                return
+            group, position = f"chat_{key}", None
+        else:
+            order = await get_tracked_order(int(key))
+            if order is None or not can_track(order, user):
+                await self._error("Pedido no encontrado.", topic)
+                return
+            members, group, position = None, live_position.tracking_group(key), last_known_position(order)
+
+        await self.channel_layer.group_add(group, self.channel_name)
+        self.subscriptions[topic] = (group, members)
+        await self._send_json({"event": "subscribed", "topic": topic})
+
+        if position is not None:
+            await self._send_json({"topic": topic, **position})
+        if members is not None and since_seq is not None:
+            try:
+                since_seq = max(int(since_seq), 0)
+            except (TypeError, ValueError):
+                return
+            try:
+                frames, last_seq, truncated = await replay_frames(key, members, since_seq)
+            except PyMongoError:
+                logger.exception("Replay fallido en conversación %s.", key)
+                return
+            for frame in frames:
+                await self._send_json({"topic": topic, **frame})
+            await self._send_json({
+                "event": "replay_complete",
+                "topic": topic,
+                "last_seq": last_seq,
+                "truncated": truncated,
+            })
+
+    async def _unsubscribe(self, topic: str) -> None:
+        subscription = self.subscriptions.pop(topic, None)
+        if subscription is not None:
+            await self.channel_layer.group_discard(subscription[0], self.channel_name)
+        await self._send_json({"event": "unsubscribed", "topic": topic})
+
+    async def _send_message(self, topic: str, message) -> None:
+        subscription = self.subscriptions.get(topic)
+        if subscription is None or subscription[1] is None:
+            await self._error("Suscríbete a la conversación antes de escribir.", topic)
+            return
+        text = message.strip() if isinstance(message, str) else ""
+        if not text:
+            await self._error("El mensaje no puede estar vacío.", topic)
+            return
+        conversation_id = topic.partition(":")[2]
+        try:
+            await send_chat_message(
+                self.channel_layer, conversation_id, subscription[1], self.scope["user"], text
+            )
+        except PyMongoError:
+            logger.exception("No se pudo guardar el mensaje en conversación %s.", conversation_id)
+            await self._error("No se pudo enviar el mensaje.", topic)
+
+    # ------------------------------------------------------------------
+    # Handlers de grupo
+    # ------------------------------------------------------------------
+    async def chat_message(self, event):
+        topic = f"chat:{event['conversation_id']}"
+        # Puede llegar un mensaje en vuelo justo después de desuscribirse.
+        if topic not in self.subscriptions:
+            return
+        frame = {key: value for key, value in event.items() if key != "type"}
+        self.outbound.put({"topic": topic, **frame})
+
+    async def rider_position(self, event):
+        position = event["position"]
+        topic = f"order:{position['o']}"
+        if topic in self.subscriptions:
+            self.outbound.put({"topic": topic, **position}, key=topic, sheddable=True)
@@ -0,0 +1,147 @@
+"""
+Resumen por conversación para la bandeja de entrada del chat.
+
+Para pintar la bandeja la app pedía ``/messages/?limit=1`` por cada
+conversación y contaba los no leídos en el cliente. Ahora cada conversación
+tiene un documento en ``chat_conversation_summaries``::
+
+    {
+        "_id":            "uuid de la conversación",
+        "last_message":   {"_id", "sender_id", "message", "timestamp"},
+        "last_timestamp": datetime (UTC),
+        "unread":         {"<user_id>": int, ...}
+    }
+
+- Se actualiza junto con la inserción de los mensajes: ``write_behind``
+  lo aplica después de cada ``insert_many``. Cada conversación es un único
+  update con pipeline sobre su documento (atómico): suma los no leídos del
+  destinatario, pone en cero los del remitente y reemplaza el último
+  mensaje solo si es más nuevo.
+- ``get_summaries`` lee los resúmenes de muchas conversaciones con una sola
+  consulta ``$in``.
+- ``mark_read`` pone en cero los no leídos de un usuario.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from pymongo import UpdateOne
+
+from . import mongo
+
+SUMMARIES_COLLECTION = "chat_conversation_summaries"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def get_summaries_collection():
+    return mongo._get_db()[SUMMARIES_COLLECTION]
+
+
+def get_async_summaries_collection():
+    return mongo._get_async_db()[SUMMARIES_COLLECTION]
+
+
+def summary_updates(items: Iterable[tuple[dict[str, Any], Iterable[int]]]) -> list[UpdateOne]:
+    """
+    Arma un update por conversación para los mensajes recién insertados.
+
+    Parameters
+    ----------
+    items : iterable of (doc, recipient_ids)
+        Documento del mensaje (con ``_id``) y usuarios que deben verlo como
+        no leído.
+    """
+    by_conversation: dict[str, dict[str, Any]] = {}
+    for doc, recipient_ids in items:
+        entry = by_conversation.setdefault(
+            doc["conversation_id"], {"last": doc, "unread": {}, "senders": set()}
+        )
+        if (doc["timestamp"], doc["_id"]) > (entry["last"]["timestamp"], entry["last"]["_id"]):
+            entry["last"] = doc
+        entry["senders"].add(str(doc["sender_id"]))
+        for user_id in recipient_ids:
+            key = str(user_id)
+            entry["unread"][key] = entry["unread"].get(key, 0) + 1
+
+    updates = []
+    for conversation_id, entry in by_conversation.items():
+        last = entry["last"]
+        last_message = {
+            "_id": last["_id"],
+            "sender_id": last["sender_id"],
+            "message": last["message"],
+            "timestamp": last["timestamp"],
+        }
+        counters = {
+            key: {"$add": [{"$ifNull": [f"$unread.{key}", 0]}, count]}
+            for key, count in entry["unread"].items()
+        }
+        # Quien escribe ya leyó la conversación.
+        counters.update({key: 0 for key in entry["senders"] - entry["unread"].keys()})
+        is_newer = {"$gt": [last["timestamp"], {"$ifNull": ["$last_timestamp", _EPOCH]}]}
+        updates.append(UpdateOne(
+            {"_id": conversation_id},
+            [{"$set": {
+                "unread": {"$mergeObjects": [{"$ifNull": ["$unread", {}]}, counters]},
+                # $literal: el texto del mensaje podría empezar con "$".
+                "last_message": {"$cond": [is_newer, {"$literal": last_message}, "$last_message"]},
+                "last_timestamp": {"$cond": [is_newer, last["timestamp"], "$last_timestamp"]},
+            }}],
+            upsert=True,
+        ))
+    return updates
+
+
+def apply(items) -> None:
+    """Aplica :func:`summary_updates` con el cliente síncrono."""
+    updates = summary_updates(items)
+    if updates:
+        get_summaries_collection().bulk_write(updates, ordered=False)
+
+
+async def aapply(items) -> None:
+    """Aplica :func:`summary_updates` con el cliente asíncrono."""
+    updates = summary_updates(items)
+    if updates:
+        await get_async_summaries_collection().bulk_write(updates, ordered=False)
+
+
+def get_summaries(conversation_ids: Iterable, user_id: int) -> dict[str, dict[str, Any]]:
+    """
+    Resúmenes de *conversation_ids* vistos por *user_id*, en una consulta.
+
+    Returns
+    -------
+    dict
+        ``{conversation_id: {"last_message", "unread_count"}}``; las
+        conversaciones sin mensajes no aparecen.
+    """
+    ids = [str(conversation_id) for conversation_id in conversation_ids]
+    if not ids:
+        return {}
+    key = str(user_id)
+    cursor = get_summaries_collection().find(
+        {"_id": {"$in": ids}},
+        {"last_message": 1, f"unread.{key}": 1},
+    )
+    summaries = {}
+    for doc in cursor:
+        last = doc.get("last_message")
+        if last is not None:
+            last["_id"] = str(last["_id"])
+        summaries[doc["_id"]] = {
+            "last_message": last,
+            "unread_count": doc.get("unread", {}).get(key, 0),
+        }
+    return summaries
+
+
+def mark_read(conversation_id, user_id: int) -> None:
+    """Pone en cero los no leídos de *user_id* en la conversación."""
+    get_summaries_collection().update_one(
+        {"_id": str(conversation_id)},
+        {"$set": {f"unread.{user_id}": 0}},
+    )
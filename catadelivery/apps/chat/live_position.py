@@ -0,0 +1,109 @@
+"""
+Difusión en tiempo real de la posición del rider al cliente del pedido.
+
+Cuando un pedido está *In Route* (status=4), cada actualización de ubicación
+del rider se publica en el grupo de Channels ``order_tracking_<order_id>``,
+al que se suscribe ``OrderTrackingConsumer``. Así el cliente no necesita
+hacer polling de ``GET /api/users/<rider>/`` (que serializa el perfil
+completo con suscripciones y direcciones) solo para leer dos floats.
+
+La difusión se limita del lado del servidor: como máximo un mensaje cada
+``RIDER_LIVE_MIN_INTERVAL_S`` segundos por rider, y solo si se movió al
+menos ``RIDER_LIVE_MIN_DISTANCE_M`` metros desde la última posición enviada.
+
+Payload compacto enviado al WebSocket::
+
+    {"o": 123, "lat": -3.99312, "lon": -79.20451, "ts": 1718000000}
+"""
+
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from apps.common.geo import haversine_distance
+
+MIN_INTERVAL_S = getattr(settings, "RIDER_LIVE_MIN_INTERVAL_S", 3.0)
+MIN_DISTANCE_M = getattr(settings, "RIDER_LIVE_MIN_DISTANCE_M", 5.0)
+
+# 5 decimales ≈ 1 m: suficiente para el mapa y reduce el tamaño del payload.
+COORD_DECIMALS = 5
+
+IN_ROUTE_STATUS = 4
+
+# Última posición difundida por rider en este proceso: {rider_id: (lat, lon, ts)}
+_last_sent: dict[int, tuple[float, float, datetime]] = {}
+_last_lock = threading.Lock()
+
+
+def tracking_group(order_id) -> str:
+    """Nombre del grupo de Channels para el seguimiento de un pedido."""
+    return f"order_tracking_{order_id}"
+
+
+def compact_position(order_id: int, latitude: float, longitude: float, ts: datetime) -> dict:
+    """Construye el payload compacto que recibe el cliente."""
+    return {
+        "o": order_id,
+        "lat": round(latitude, COORD_DECIMALS),
+        "lon": round(longitude, COORD_DECIMALS),
+        "ts": int(ts.timestamp()),
+    }
+
+
+def _should_broadcast(rider_id: int, lat: float, lon: float, ts: datetime) -> bool:
+    """Aplica throttle y deduplicación; registra el punto si se difunde."""
+    with _last_lock:
+        last = _last_sent.get(rider_id)
+        if last is not None:
+            last_lat, last_lon, last_ts = last
+            if (ts - last_ts).total_seconds() < MIN_INTERVAL_S:
+                return False
+            if haversine_distance(last_lat, last_lon, lat, lon) * 1000 < MIN_DISTANCE_M:
+                return False
+        _last_sent[rider_id] = (lat, lon, ts)
+        return True
+
+
+def publish_rider_position(
+    rider_id: int,
+    latitude: float,
+    longitude: float,
+    timestamp: datetime | None = None,
+) -> int:
+    """
+    Publica la posición del rider en el grupo de cada pedido que lleva en ruta.
+
+    Returns
+    -------
+    int
+        Cantidad de pedidos a los que se difundió la posición (0 si el
+        throttle la descartó o el rider no tiene pedidos en ruta).
+    """
+    from apps.order.models import Order
+
+    ts = timestamp or datetime.now(timezone.utc)
+    if not _should_broadcast(rider_id, latitude, longitude, ts):
+        return 0
+
+    order_ids = list(
+        Order.objects.filter(rider_id=rider_id, status=IN_ROUTE_STATUS)
+        .values_list("id", flat=True)
+    )
+    if not order_ids:
+        return 0
+
+    channel_layer = get_channel_layer()
+    for order_id in order_ids:
+        async_to_sync(channel_layer.group_send)(
+            tracking_group(order_id),
+            {
+                "type": "rider.position",
+                "position": compact_position(order_id, latitude, longitude, ts),
+            },
+        )
+    return len(order_ids)
@@ -0,0 +1,231 @@
+"""
+Almacén del recorrido GPS de los riders en MongoDB.
+
+``UserProfile`` solo guarda la última posición del rider. Para resolver
+disputas y modelar ETAs necesitamos el recorrido completo, pero escribir
+cada fix en SQLite no es viable. Este módulo guarda el recorrido en la
+misma base MongoDB del chat, en la colección ``rider_location_trails``.
+
+Estructura de un bucket (un documento por rider y ventana de tiempo)::
+
+    {
+        "rider_id":     int,
+        "bucket_start": datetime (UTC, inicio de la ventana),
+        "count":        int,
+        "first_ts":     datetime (UTC),
+        "last_ts":      datetime (UTC),
+        "points":       [{"lat": float, "lon": float, "ts": datetime}, ...]
+    }
+
+Antes de persistir se aplica un downsampling por distancia/tiempo: un fix
+solo se guarda si el rider se movió al menos ``RIDER_TRAIL_MIN_DISTANCE_M``
+metros (y pasaron ``RIDER_TRAIL_MIN_INTERVAL_S`` segundos), o si pasaron
+``RIDER_TRAIL_MAX_INTERVAL_S`` segundos desde el último punto guardado.
+
+La retención la aplica MongoDB con un índice TTL sobre ``last_ts``.
+"""
+
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timezone
+from typing import Any
+
+from django.conf import settings
+from pymongo import ASCENDING
+
+from apps.common.geo import haversine_distance
+
+from .mongo import _get_db
+
+
+# ---------------------------------------------------------------------------
+# Configuración (sobrescribible desde settings)
+# ---------------------------------------------------------------------------
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+BUCKET_SECONDS = _setting("RIDER_TRAIL_BUCKET_SECONDS", 15 * 60)
+MAX_POINTS_PER_BUCKET = _setting("RIDER_TRAIL_MAX_POINTS_PER_BUCKET", 200)
+MIN_DISTANCE_M = _setting("RIDER_TRAIL_MIN_DISTANCE_M", 25.0)
+MIN_INTERVAL_S = _setting("RIDER_TRAIL_MIN_INTERVAL_S", 5.0)
+MAX_INTERVAL_S = _setting("RIDER_TRAIL_MAX_INTERVAL_S", 60.0)
+RETENTION_DAYS = _setting("RIDER_TRAIL_RETENTION_DAYS", 30)
+
+
+# ---------------------------------------------------------------------------
+# Colección (los índices se crean una sola vez por proceso)
+# ---------------------------------------------------------------------------
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+
+def get_trails_collection():
+    """Devuelve la colección ``rider_location_trails`` con sus índices."""
+    global _indexes_ready
+    collection = _get_db()["rider_location_trails"]
+    if not _indexes_ready:
+        with _indexes_lock:
+            if not _indexes_ready:
+                ensure_indexes()
+                _indexes_ready = True
+    return collection
+
+
+def ensure_indexes() -> None:
+    """Crea el índice de consulta por rider/ventana y el índice TTL."""
+    collection = _get_db()["rider_location_trails"]
+    collection.create_index(
+        [("rider_id", ASCENDING), ("bucket_start", ASCENDING)],
+        name="idx_rider_bucket",
+    )
+    collection.create_index(
+        [("last_ts", ASCENDING)],
+        name="ttl_last_ts",
+        expireAfterSeconds=int(RETENTION_DAYS * 24 * 3600),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Downsampling
+# ---------------------------------------------------------------------------
+# Último punto persistido por rider en este proceso: {rider_id: (lat, lon, ts)}
+_last_persisted: dict[int, tuple[float, float, datetime]] = {}
+_last_lock = threading.Lock()
+
+
+def _should_persist(rider_id: int, lat: float, lon: float, ts: datetime) -> bool:
+    """
+    Decide si un fix debe guardarse y, en ese caso, lo registra como el
+    último punto persistido del rider.
+    """
+    with _last_lock:
+        last = _last_persisted.get(rider_id)
+        if last is not None:
+            last_lat, last_lon, last_ts = last
+            elapsed = (ts - last_ts).total_seconds()
+            if elapsed < 0:
+                # Fix fuera de orden: nunca retrocedemos en el recorrido.
+                return False
+            moved_m = haversine_distance(last_lat, last_lon, lat, lon) * 1000
+            moved_enough = moved_m >= MIN_DISTANCE_M and elapsed >= MIN_INTERVAL_S
+            if not moved_enough and elapsed < MAX_INTERVAL_S:
+                return False
+        _last_persisted[rider_id] = (lat, lon, ts)
+        return True
+
+
+def _bucket_start(ts: datetime) -> datetime:
+    """Redondea *ts* hacia abajo al inicio de su ventana."""
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % BUCKET_SECONDS, tz=timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Escritura
+# ---------------------------------------------------------------------------
+def record_location(
+    rider_id: int,
+    latitude: float,
+    longitude: float,
+    timestamp: datetime | None = None,
+) -> bool:
+    """
+    Agrega un fix GPS al recorrido del rider, si supera el downsampling.
+
+    Parameters
+    ----------
+    rider_id : int
+        PK del ``UserProfile`` (rider).
+    latitude, longitude : float
+        Coordenadas del fix.
+    timestamp : datetime | None
+        Momento del fix (UTC). Por defecto, ahora.
+
+    Returns
+    -------
+    bool
+        True si el punto se persistió, False si fue descartado.
+    """
+    ts = timestamp or datetime.now(timezone.utc)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+
+    if not _should_persist(rider_id, latitude, longitude, ts):
+        return False
+
+    # Upsert sobre el bucket abierto de la ventana; si ya está lleno,
+    # el filtro por ``count`` no coincide y se abre uno nuevo.
+    get_trails_collection().update_one(
+        {
+            "rider_id": rider_id,
+            "bucket_start": _bucket_start(ts),
+            "count": {"$lt": MAX_POINTS_PER_BUCKET},
+        },
+        {
+            "$push": {"points": {"lat": latitude, "lon": longitude, "ts": ts}},
+            "$inc": {"count": 1},
+            "$min": {"first_ts": ts},
+            "$max": {"last_ts": ts},
+        },
+        upsert=True,
+    )
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Lectura
+# ---------------------------------------------------------------------------
+def get_trail(
+    rider_id: int,
+    start: datetime,
+    end: datetime | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Devuelve los puntos del rider entre *start* y *end*, en orden cronológico.
+
+    Parameters
+    ----------
+    rider_id : int
+        PK del rider.
+    start : datetime
+        Inicio del intervalo (inclusive).
+    end : datetime | None
+        Fin del intervalo (inclusive). Por defecto, ahora.
+
+    Returns
+    -------
+    list[dict]
+        Puntos ``{"lat", "lon", "ts"}``.
+    """
+    end = end or datetime.now(timezone.utc)
+    # Todos los puntos de un bucket caen en su ventana, así que basta con
+    # acotar ``bucket_start``; los extremos se recortan en memoria.
+    query = {
+        "rider_id": rider_id,
+        "bucket_start": {"$gte": _bucket_start(start), "$lte": end},
+    }
+    points = []
+    for bucket in get_trails_collection().find(query, {"points": 1, "_id": 0}):
+        for point in bucket.get("points", []):
+            ts = point["ts"]
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=timezone.utc)
+            if start <= ts <= end:
+                points.append({"lat": point["lat"], "lon": point["lon"], "ts": ts})
+    points.sort(key=lambda p: p["ts"])
+    return points
+
+
+def get_order_trail(order, end: datetime | None = None) -> list[dict[str, Any]]:
+    """
+    Recorrido del rider asignado durante la ventana de entrega de *order*.
+
+    La ventana empieza cuando se asignó el rider (``assigned_at``) o, si no
+    hay asignación registrada, al crear el pedido (``dt``).
+    """
+    if order.rider_id is None:
+        return []
+    start = order.assigned_at or order.dt
+    return get_trail(order.rider_id, start=start, end=end)
@@ -0,0 +1,205 @@
+"""
+Management command para medir mensajes/segundo del channel layer entre
+varios procesos.
+
+Uso:
+    # Contra el Redis configurado (CHANNEL_REDIS_URL)
+    python manage.py bench_channel_layer --workers 4 --messages 5000
+
+    # Contra otro servidor (TCP o socket Unix)
+    python manage.py bench_channel_layer --url unix:///tmp/redis.sock
+
+    # Contra un servidor local de prueba, sin Redis instalado
+    # (requiere ``pip install "fakeredis[lua]"``)
+    python manage.py bench_channel_layer --fake-redis
+
+Modos:
+- ``ring``: cada proceso envía ``--messages`` mensajes al canal del
+  siguiente y recibe los del anterior (tráfico punto a punto).
+- ``group``: todos los procesos se unen a un grupo y el proceso 0 emite
+  ``--messages`` mensajes con ``group_send`` (como un chat o el tracking de
+  un pedido); cada proceso recibe todos.
+
+El resultado es el total de mensajes entregados dividido por el tiempo del
+proceso más lento.
+"""
+import asyncio
+import copy
+import multiprocessing
+import queue
+import socket
+import threading
+import time
+
+import django
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+GROUP = "bench"
+
+
+def _init_worker():
+    # Con "spawn" el proceso hijo no hereda Django configurado.
+    if not django_apps.ready:
+        django.setup()
+
+
+def _worker(index, workers, messages, payload_bytes, mode, config, barrier, results):
+    _init_worker()
+    elapsed = asyncio.run(
+        _run_worker(index, workers, messages, payload_bytes, mode, config, barrier)
+    )
+    results.put((index, elapsed))
+
+
+async def _run_worker(index, workers, messages, payload_bytes, mode, config, barrier):
+    layer = import_string(config["BACKEND"])(**config.get("CONFIG", {}))
+    own = f"bench.worker.{index}"
+    body = "x" * payload_bytes
+    if mode == "group":
+        await layer.group_add(GROUP, own)
+
+    # Todos los procesos conectados (y en el grupo) antes de medir.
+    barrier.wait()
+    start = time.perf_counter()
+
+    async def produce():
+        if mode == "ring":
+            peer = f"bench.worker.{(index + 1) % workers}"
+            for seq in range(messages):
+                await layer.send(peer, {"type": "bench.message", "seq": seq, "body": body})
+        elif index == 0:
+            for seq in range(messages):
+                await layer.group_send(GROUP, {"type": "bench.message", "seq": seq, "body": body})
+
+    async def consume():
+        for _ in range(messages):
+            await layer.receive(own)
+
+    await asyncio.gather(produce(), consume())
+    elapsed = time.perf_counter() - start
+
+    if mode == "group":
+        await layer.group_discard(GROUP, own)
+    if hasattr(layer, "close_pools"):
+        await layer.close_pools()
+    return elapsed
+
+
+def start_fake_redis():
+    """
+    Levanta un servidor fakeredis en un puerto TCP libre (en un hilo de
+    este proceso) y devuelve su URL.
+    """
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        raise CommandError('--fake-redis requiere fakeredis: pip install "fakeredis[lua]"')
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+class Command(BaseCommand):
+    help = "Mide mensajes/segundo del channel layer entre N procesos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--messages", type=int, default=2000, help="Mensajes por proceso.")
+        parser.add_argument("--payload-bytes", type=int, default=200)
+        parser.add_argument("--mode", choices=["ring", "group"], default="ring")
+        parser.add_argument("--url", help="URL de Redis (redis://... o unix://...).")
+        parser.add_argument("--fake-redis", action="store_true", help="Usar un servidor fakeredis local.")
+        parser.add_argument("--timeout", type=float, default=600, help="Segundos máximos de la medición.")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        messages = options["messages"]
+        if workers < 2:
+            raise CommandError("--workers debe ser al menos 2.")
+
+        config = copy.deepcopy(settings.CHANNEL_LAYERS["default"])
+        url = start_fake_redis() if options["fake_redis"] else options["url"]
+        if url:
+            config = {
+                "BACKEND": "channels_redis.core.RedisChannelLayer",
+                "CONFIG": {**config.get("CONFIG", {}), "hosts": [url]},
+            }
+        if config["BACKEND"].endswith("InMemoryChannelLayer"):
+            raise CommandError(
+                "InMemoryChannelLayer no funciona entre procesos: "
+                "define CHANNEL_REDIS_URL o usa --url / --fake-redis."
+            )
+        # Que ningún envío falle por ChannelFull durante la medición.
+        config.setdefault("CONFIG", {})["capacity"] = messages + 1
+        config["CONFIG"]["prefix"] = f"bench{int(time.time())}"
+
+        ctx = multiprocessing.get_context("spawn")
+        barrier = ctx.Barrier(workers)
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(
+                target=_worker,
+                args=(i, workers, messages, options["payload_bytes"], options["mode"], config, barrier, results),
+            )
+            for i in range(workers)
+        ]
+        self.stdout.write(
+            f"Backend {config['BACKEND']} | {workers} procesos | {messages} mensajes c/u | "
+            f"modo {options['mode']} | {options['payload_bytes']} bytes"
+        )
+        for process in processes:
+            process.start()
+        try:
+            elapsed = self.collect(processes, results, options["timeout"])
+        except BaseException:
+            # Si uno falló, los demás quedan esperando en la barrera o sus mensajes.
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            raise
+        finally:
+            for process in processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+
+        delivered = workers * messages
+        wall = max(elapsed.values())
+        for index in sorted(elapsed):
+            self.stdout.write(f"  - proceso {index}: {messages / elapsed[index]:,.0f} msg/s recibidos")
+        self.stdout.write(self.style.SUCCESS(
+            f"{delivered:,} mensajes entregados en {wall:.2f} s → {delivered / wall:,.0f} msg/s"
+        ))
+
+    def collect(self, processes, results, timeout):
+        """
+        Espera el resultado de cada proceso. Falla apenas uno termina sin
+        reportar (excepción, señal) o al vencer *timeout*.
+        """
+        elapsed = {}
+        deadline = time.monotonic() + timeout
+        while len(elapsed) < len(processes):
+            try:
+                index, seconds = results.get(timeout=1)
+            except queue.Empty:
+                pass
+            else:
+                elapsed[index] = seconds
+                continue
+            # Con código 0 el resultado ya está en la cola; se lee en la próxima vuelta.
+            for index, process in enumerate(processes):
+                if index not in elapsed and process.exitcode not in (None, 0):
+                    raise CommandError(
+                        f"El proceso {index} terminó con código {process.exitcode} sin reportar resultado."
+                    )
+            if time.monotonic() > deadline:
+                pending = ", ".join(str(i) for i in range(len(processes)) if i not in elapsed)
+                raise CommandError(f"Los procesos {pending} no terminaron en {timeout:g} s.")
+        return elapsed
@@ -0,0 +1,128 @@
+"""
+Management command para compactar el chat de pedidos cerrados.
+
+Las conversaciones de pedidos entregados o cancelados cuyo último mensaje
+tiene más de ``CHAT_ARCHIVE_AFTER_DAYS`` días se pliegan en un documento
+comprimido de ``chat_archives`` y sus mensajes se borran de
+``chat_messages`` (ver ``apps/chat/archive.py``). El historial sigue
+disponible en ``/api/chat/conversations/<id>/messages/``.
+
+Uso:
+    python manage.py compact_chat_archives
+    python manage.py compact_chat_archives --days 7 --dry-run
+
+    # Modo daemon: cada 6 horas (+/- 10%)
+    python manage.py compact_chat_archives --daemon --interval 21600
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pymongo.errors import PyMongoError
+
+from apps.chat import archive
+from apps.chat.models import Conversation
+from apps.users.management.scheduling import add_daemon_arguments, run_forever, timed
+
+logger = logging.getLogger(__name__)
+
+# Delivered / Cancelled (Order.STATUS_CHOICES)
+FINISHED_STATUSES = (5, 6)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(str(item))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Compacta en chat_archives los mensajes de conversaciones de pedidos cerrados."
+
+    def add_arguments(self, parser):
+        add_daemon_arguments(parser, default_interval=6 * 3600)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", 30),
+            help="Días sin mensajes tras cerrar el pedido antes de archivar (default CHAT_ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Conversaciones consultadas por lote en MongoDB (default 500).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo informar qué conversaciones se archivarían.",
+        )
+
+    def handle(self, *args, **options):
+        if options["daemon"]:
+            run_forever(
+                lambda: self.run_once(options),
+                options["interval"],
+                options["jitter"],
+                self.stdout,
+            )
+        else:
+            self.run_once(options)
+
+    def run_once(self, options):
+        (conversations, messages), elapsed_ms = timed(lambda: self.compact(options))
+        verb = "se archivarían" if options["dry_run"] else "archivadas"
+        self.stdout.write(self.style.SUCCESS(
+            f"Compactación completada en {elapsed_ms:.0f} ms. "
+            f"{conversations} conversaciones {verb} ({messages} mensajes)."
+        ))
+        logger.info("[CHAT ARCHIVE] %s conversaciones, %s mensajes (%.0f ms)", conversations, messages, elapsed_ms)
+
+    def compact(self, options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        chunk_size = options["chunk_size"]
+        # created_at es anterior a cualquier mensaje: descarta las recientes sin ir a MongoDB.
+        ids = (
+            Conversation.objects.filter(order__status__in=FINISHED_STATUSES, created_at__lt=cutoff)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+        conversations = messages = 0
+        for chunk in _chunks(ids.iterator(chunk_size=chunk_size), chunk_size):
+            archived, moved = self.compact_chunk(chunk, cutoff, options["dry_run"])
+            conversations += archived
+            messages += moved
+        return conversations, messages
+
+    def compact_chunk(self, chunk, cutoff, dry_run):
+        # Solo las que aún tienen mensajes sin archivar y llevan inactivas el plazo.
+        idle = [
+            conversation_id
+            for conversation_id, last in archive.last_activity(chunk).items()
+            if last < cutoff
+        ]
+        if dry_run:
+            for conversation_id in idle:
+                self.stdout.write(f"  - {conversation_id}")
+            return len(idle), 0
+
+        conversations = messages = 0
+        for conversation_id in idle:
+            try:
+                moved = archive.compact_conversation(conversation_id)
+            except PyMongoError as e:
+                logger.error(f"❌ [CHAT ARCHIVE] Conversación {conversation_id}: {e}")
+                continue
+            if moved:
+                conversations += 1
+                messages += moved
+        return conversations, messages
@@ -0,0 +1,27 @@
+"""
+Management command para crear los índices de MongoDB del chat.
+
+Uso:
+    python manage.py ensure_chat_indexes
+
+Crea ``idx_conversation_timestamp_id`` (historial paginado) e
+``idx_conversation_seq`` (replay con ``?since_seq=``) en ``chat_messages``
+y borra el índice anterior ``idx_conversation_timestamp``. También corre
+después de ``migrate`` (ver ``apps/chat/signals.py``); es idempotente.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import PyMongoError
+
+from apps.chat import location_trail, mongo
+
+
+class Command(BaseCommand):
+    help = "Crea los índices de MongoDB de mensajes y recorridos del chat."
+
+    def handle(self, *args, **options):
+        try:
+            mongo.ensure_indexes()
+            location_trail.ensure_indexes()
+        except PyMongoError as e:
+            raise CommandError(f"No se pudieron crear los índices: {e}")
+        self.stdout.write(self.style.SUCCESS("Índices de MongoDB del chat al día."))
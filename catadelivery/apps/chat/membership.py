@@ -0,0 +1,84 @@
+"""
+Cache de pertenencia a conversaciones para ``ChatConsumer.connect``.
+
+Las apps móviles reconectan el WebSocket en cada cambio de red y cada
+conexión consultaba la ``Conversation`` en SQLite con un salto a un hilo.
+Aquí se guarda, por ``conversation_id``, la tupla
+``(participant_1_id, participant_2_id)`` en el cache
+``CHAT_MEMBERSHIP_CACHE_ALIAS`` con TTL.
+
+- Dos niveles: un ``LocMemCache`` propio del proceso, leído de forma
+  síncrona (un acierto no consulta la base ni salta de hilo), con TTL corto
+  ``CHAT_MEMBERSHIP_LOCAL_TTL``; detrás, el alias compartido entre procesos
+  (Redis cuando hay varios workers daphne), con ``CHAT_MEMBERSHIP_CACHE_TTL``.
+  El ``aget`` del ``RedisCache`` de Django pasa por ``sync_to_async``: ese
+  salto solo ocurre cuando falla el nivel local, a lo sumo una vez por
+  conversación y proceso cada ``CHAT_MEMBERSHIP_LOCAL_TTL`` segundos.
+- Un fallo en ambos niveles consulta con el ORM asíncrono (``aget``). Solo
+  se guardan las conversaciones encontradas: un id inexistente puede ser
+  una conversación que se está creando en otro proceso.
+- ``signals.py`` invalida la entrada al guardar o borrar la conversación:
+  en el alias compartido y en el nivel local del proceso que guarda; los
+  demás procesos ven el cambio al vencer su entrada local.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+
+from .models import Conversation
+
+MEMBERSHIP_CACHE_TTL = getattr(settings, "CHAT_MEMBERSHIP_CACHE_TTL", 300)
+MEMBERSHIP_CACHE_ALIAS = getattr(settings, "CHAT_MEMBERSHIP_CACHE_ALIAS", "default")
+MEMBERSHIP_LOCAL_TTL = getattr(settings, "CHAT_MEMBERSHIP_LOCAL_TTL", 10)
+
+# Nivel local del proceso (no depende de CACHES).
+_local = LocMemCache("chat-membership", {"OPTIONS": {"MAX_ENTRIES": 10000}})
+
+
+def _cache():
+    return caches[MEMBERSHIP_CACHE_ALIAS]
+
+
+def _cache_key(conversation_id) -> str:
+    return f"chat:members:{conversation_id}"
+
+
+async def aget_members(conversation_id) -> tuple[int, ...]:
+    """
+    Devuelve ``(participant_1_id, participant_2_id)`` o ``()`` si la
+    conversación no existe.
+    """
+    key = _cache_key(conversation_id)
+    # LocMemCache.get es memoria local; su aget pasaría por sync_to_async.
+    members = _local.get(key)
+    if members is not None:
+        return members
+
+    cache = _cache()
+    shared_is_local = isinstance(cache, LocMemCache)
+    members = cache.get(key) if shared_is_local else await cache.aget(key)
+    if members is None:
+        try:
+            conversation = await Conversation.objects.only(
+                "participant_1_id", "participant_2_id"
+            ).aget(pk=conversation_id)
+        except (Conversation.DoesNotExist, ValueError, ValidationError):
+            return ()
+        members = (conversation.participant_1_id, conversation.participant_2_id)
+        if shared_is_local:
+            cache.set(key, members, MEMBERSHIP_CACHE_TTL)
+        else:
+            await cache.aset(key, members, MEMBERSHIP_CACHE_TTL)
+    _local.set(key, members, MEMBERSHIP_LOCAL_TTL)
+    return members
+
+
+def invalidate(conversation_id) -> None:
+    """Elimina la entrada de la conversación (compartida y local)."""
+    key = _cache_key(conversation_id)
+    _local.delete(key)
+    _cache().delete(key)
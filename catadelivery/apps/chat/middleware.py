@@ -9,7 +9,8 @@ por lo que el token JWT se envía como query-string:
 Este middleware:
 1. Extrae el token de la query-string.
 2. Lo valida con SimpleJWT.
-3. Asigna ``scope["user"]`` con el UserProfile correspondiente.
+3. Asigna ``scope["user"]`` con el UserProfile correspondiente, usando el
+   mismo cache de usuarios que la autenticación REST (``apps.users.auth``).
 4. Si el token es inválido o ausente, asigna AnonymousUser.
 """
 
@@ -19,22 +20,35 @@ from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
-from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import AccessToken
 
-User = get_user_model()
+from apps.users.auth import CachedJWTAuthentication, get_cached_user
 
 
 @database_sync_to_async
-def _get_user(token_str: str):
-    """Valida el JWT y devuelve el usuario o AnonymousUser."""
+def _load_user(validated_token):
+    """Carga el usuario desde la base de datos (y lo deja en cache)."""
+    try:
+        return CachedJWTAuthentication().get_user(validated_token)
+    except Exception:
+        return AnonymousUser()
+
+
+async def _get_user(token_str: str):
+    """
+    Valida el JWT y devuelve el usuario o AnonymousUser.
+
+    Si el usuario está en cache no hay salto al thread-pool ni consulta SQL.
+    """
     try:
         validated = AccessToken(token_str)
-        user_id = validated["user_id"]
-        return User.objects.get(pk=user_id)
     except Exception:
         return AnonymousUser()
+    user = get_cached_user(validated)
+    if user is not None:
+        return user
+    return await _load_user(validated)
 
 
 class JWTAuthMiddleware(BaseMiddleware):
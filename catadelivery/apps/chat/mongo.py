@@ -2,7 +2,10 @@
 Módulo de acceso a MongoDB para mensajes de chat.
 
 Responsabilidades:
-- Conexión lazy al servidor MongoDB mediante pymongo.
+- Conexión lazy al servidor MongoDB mediante pymongo (API síncrona, para
+  vistas DRF y management commands).
+- Cliente asíncrono compartido (motor) para los consumers: las funciones
+  ``a*`` corren en el event loop, sin saltos a un hilo.
 - CRUD de documentos en la colección ``chat_messages``.
 
 Estructura del documento en MongoDB::
@@ -11,42 +14,88 @@ Estructura del documento en MongoDB::
         "conversation_id": "uuid-string",
         "sender_id":       int,
         "message":         "texto del mensaje",
-        "timestamp":       datetime (UTC)
+        "timestamp":       datetime (UTC),
+        "seq":             int (1, 2, 3... por conversación)
     }
 
+``seq`` sale de un contador atómico por conversación en ``chat_sequences``
+y permite a un cliente que reconecta pedir solo lo que se perdió.
+
+Los mensajes de pedidos cerrados se compactan en ``chat_archives`` (ver
+``archive.py``); las funciones de lectura de aquí solo ven los que siguen
+en ``chat_messages``.
+
 No se duplican datos de usuario ni de conversación: la validación de
 pertenencia ocurre en Django contra SQLite antes de llegar aquí.
 """
 
 from __future__ import annotations
 
+import base64
+import binascii
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Tuple, Union
 
+from bson import ObjectId
+from bson.errors import InvalidId
 from django.conf import settings
-from pymongo import MongoClient, DESCENDING
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument
+
+MESSAGES_COLLECTION = "chat_messages"
+SEQUENCES_COLLECTION = "chat_sequences"
+
+# ``conversation_id`` ya viene en la URL: no se devuelve en el historial.
+MESSAGE_PROJECTION = {"conversation_id": 0}
+
+# Posición en el historial: ``(timestamp, _id)`` o, por compatibilidad, un timestamp.
+MessagePosition = Union[Tuple[datetime, ObjectId], datetime]
 
 
 # ---------------------------------------------------------------------------
 # Conexión lazy (singleton)
 # ---------------------------------------------------------------------------
 _client: MongoClient | None = None
+_async_client: AsyncIOMotorClient | None = None
+
+
+def _client_options() -> dict[str, Any]:
+    return {
+        "serverSelectionTimeoutMS": 5000,
+        "maxPoolSize": getattr(settings, "MONGO_MAX_POOL_SIZE", 100),
+    }
 
 
 def _get_db():
     """Devuelve la base de datos MongoDB configurada en settings."""
     global _client
     if _client is None:
-        _client = MongoClient(
-            settings.MONGO_URI,
-            serverSelectionTimeoutMS=5000,
-        )
+        _client = MongoClient(settings.MONGO_URI, **_client_options())
     return _client[settings.MONGO_DB_NAME]
 
 
+def _get_async_db():
+    """
+    Devuelve la base de datos vía el cliente asíncrono compartido.
+
+    Motor se asocia al event loop en la primera operación: el cliente se
+    comparte entre todos los consumers del proceso (un solo pool de
+    conexiones).
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncIOMotorClient(settings.MONGO_URI, **_client_options())
+    return _async_client[settings.MONGO_DB_NAME]
+
+
 def get_messages_collection():
     """Devuelve la colección ``chat_messages``."""
-    return _get_db()["chat_messages"]
+    return _get_db()[MESSAGES_COLLECTION]
+
+
+def get_async_messages_collection():
+    """Devuelve la colección ``chat_messages`` del cliente asíncrono."""
+    return _get_async_db()[MESSAGES_COLLECTION]
 
 
 # ---------------------------------------------------------------------------
@@ -74,22 +123,54 @@ def save_message(
     dict
         Documento insertado con ``_id`` convertido a string.
     """
-    collection = get_messages_collection()
-    doc = {
+    doc = new_message_doc(conversation_id, sender_id, message)
+    doc["seq"] = next_seq(conversation_id)
+    result = get_messages_collection().insert_one(doc)
+    doc["_id"] = str(result.inserted_id)
+    return doc
+
+
+async def asave_message(
+    conversation_id: str,
+    sender_id: int,
+    message: str,
+) -> dict[str, Any]:
+    """Versión asíncrona de :func:`save_message`."""
+    doc = new_message_doc(conversation_id, sender_id, message)
+    doc["seq"] = await anext_seq(conversation_id)
+    result = await get_async_messages_collection().insert_one(doc)
+    doc["_id"] = str(result.inserted_id)
+    return doc
+
+
+def new_message_doc(
+    conversation_id: str,
+    sender_id: int,
+    message: str,
+    with_id: bool = False,
+) -> dict[str, Any]:
+    """
+    Arma el documento de un mensaje con ``timestamp`` actual.
+
+    Con ``with_id`` también asigna el ``_id`` localmente (lo usa el buffer
+    de escritura diferida, que emite el mensaje antes de insertarlo).
+    """
+    doc: dict[str, Any] = {
         "conversation_id": str(conversation_id),
         "sender_id": sender_id,
         "message": message,
         "timestamp": datetime.now(timezone.utc),
     }
-    result = collection.insert_one(doc)
-    doc["_id"] = str(result.inserted_id)
+    if with_id:
+        doc["_id"] = ObjectId()
     return doc
 
 
 def get_conversation_messages(
     conversation_id: str,
     limit: int = 50,
-    before: datetime | None = None,
+    before: MessagePosition | None = None,
+    after: MessagePosition | None = None,
 ) -> list[dict[str, Any]]:
     """
     Obtiene los mensajes de una conversación con paginación por cursor.
@@ -100,38 +181,198 @@ def get_conversation_messages(
         UUID de la conversación.
     limit : int
         Cantidad máxima de mensajes a devolver (default 50).
-    before : datetime | None
-        Si se proporciona, solo devuelve mensajes anteriores a este timestamp
-        (útil para scroll infinito / paginación).
+    before : tuple[datetime, ObjectId] | datetime | None
+        Solo mensajes anteriores a esta posición (scroll hacia atrás). La
+        posición sale de :func:`decode_cursor`; un ``datetime`` solo se
+        acepta por compatibilidad con ``?before=<iso-ts>``.
+    after : tuple[datetime, ObjectId] | datetime | None
+        Solo mensajes posteriores a esta posición (ponerse al día tras una
+        reconexión); devuelve los ``limit`` más antiguos de ese tramo.
 
     Returns
     -------
     list[dict]
-        Mensajes ordenados del más antiguo al más reciente.
+        Mensajes ordenados del más antiguo al más reciente, sin
+        ``conversation_id`` y con un ``cursor`` opaco cada uno.
     """
-    collection = get_messages_collection()
-    query: dict[str, Any] = {"conversation_id": str(conversation_id)}
-    if before is not None:
-        query["timestamp"] = {"$lt": before}
+    query, sort = _messages_query(conversation_id, before, after)
+    cursor = (
+        get_messages_collection()
+        .find(query, MESSAGE_PROJECTION)
+        .sort(sort)
+        .limit(limit)
+    )
+    return _chronological(list(cursor), ascending=after is not None)
+
 
+async def aget_conversation_messages(
+    conversation_id: str,
+    limit: int = 50,
+    before: MessagePosition | None = None,
+    after: MessagePosition | None = None,
+) -> list[dict[str, Any]]:
+    """Versión asíncrona de :func:`get_conversation_messages`."""
+    query, sort = _messages_query(conversation_id, before, after)
     cursor = (
-        collection.find(query)
-        .sort("timestamp", DESCENDING)
+        get_async_messages_collection()
+        .find(query, MESSAGE_PROJECTION)
+        .sort(sort)
         .limit(limit)
     )
-    messages = []
-    for doc in cursor:
+    return _chronological(await cursor.to_list(length=limit), ascending=after is not None)
+
+
+# ---------------------------------------------------------------------------
+# Números de secuencia por conversación
+# ---------------------------------------------------------------------------
+def next_seq(conversation_id: str) -> int:
+    """
+    Reserva el siguiente ``seq`` de la conversación (``$inc`` atómico).
+
+    Es una ida y vuelta a MongoDB antes de emitir cada mensaje (un
+    ``findAndModify`` por ``_id``, del orden de un milisegundo en la misma
+    red; ``write_behind.stats()["seq_ms"]`` lo mide en producción). No se
+    reservan bloques por proceso: los dos participantes suelen estar en
+    workers distintos y, con bloques, un mensaje posterior podría recibir
+    un ``seq`` menor que otro ya entregado, y el replay con
+    ``seq > since_seq`` lo perdería.
+    """
+    counter = _get_db()[SEQUENCES_COLLECTION].find_one_and_update(
+        {"_id": str(conversation_id)},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"]
+
+
+async def anext_seq(conversation_id: str) -> int:
+    """Versión asíncrona de :func:`next_seq`."""
+    counter = await _get_async_db()[SEQUENCES_COLLECTION].find_one_and_update(
+        {"_id": str(conversation_id)},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"]
+
+
+async def acurrent_seq(conversation_id: str) -> int:
+    """Último ``seq`` asignado en la conversación (0 si no hay mensajes)."""
+    counter = await _get_async_db()[SEQUENCES_COLLECTION].find_one({"_id": str(conversation_id)})
+    return counter["seq"] if counter else 0
+
+
+async def aget_messages_since(
+    conversation_id: str,
+    since_seq: int,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """
+    Mensajes con ``seq > since_seq`` en orden de ``seq`` (usa
+    ``idx_conversation_seq``).
+    """
+    cursor = (
+        get_async_messages_collection()
+        .find(
+            {"conversation_id": str(conversation_id), "seq": {"$gt": since_seq}},
+            MESSAGE_PROJECTION,
+        )
+        .sort("seq", ASCENDING)
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+
+# ---------------------------------------------------------------------------
+# Cursores opacos sobre (timestamp, _id)
+# ---------------------------------------------------------------------------
+def encode_cursor(timestamp: datetime, object_id: ObjectId) -> str:
+    """Cursor opaco para la posición ``(timestamp, _id)`` de un mensaje."""
+    millis = int(timestamp.replace(tzinfo=timestamp.tzinfo or timezone.utc).timestamp() * 1000)
+    raw = f"{millis}.{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """Inverso de :func:`encode_cursor`; lanza ``ValueError`` si es inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        millis, object_id = raw.split(".")
+        timestamp = datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc)
+        return timestamp, ObjectId(object_id)
+    except (
+        ValueError,
+        TypeError,
+        InvalidId,
+        UnicodeDecodeError,
+        binascii.Error,
+        # fromtimestamp con milisegundos fuera de rango (cursor forjado).
+        OverflowError,
+        OSError,
+    ) as e:
+        raise ValueError("Cursor inválido.") from e
+
+
+def _position_filter(position: MessagePosition, op: str) -> dict[str, Any]:
+    """Filtro estrictamente antes (``$lt``) o después (``$gt``) de *position*."""
+    if isinstance(position, datetime):
+        return {"timestamp": {op: position}}
+    timestamp, object_id = position
+    return {
+        "$or": [
+            {"timestamp": {op: timestamp}},
+            {"timestamp": timestamp, "_id": {op: object_id}},
+        ]
+    }
+
+
+def _messages_query(conversation_id, before, after):
+    """
+    Filtro y orden de la consulta de historial.
+
+    Todas las variantes son prefijo + rango de ``idx_conversation_timestamp_id``,
+    así que MongoDB no ordena en memoria.
+    """
+    conditions: list[dict[str, Any]] = [{"conversation_id": str(conversation_id)}]
+    if before is not None:
+        conditions.append(_position_filter(before, "$lt"))
+    if after is not None:
+        conditions.append(_position_filter(after, "$gt"))
+    query = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    direction = ASCENDING if after is not None else DESCENDING
+    return query, [("timestamp", direction), ("_id", direction)]
+
+
+def _chronological(docs: list[dict[str, Any]], ascending: bool = False) -> list[dict[str, Any]]:
+    """Agrega ``cursor``, convierte ``_id`` a string y ordena de antiguo → reciente."""
+    for doc in docs:
+        doc["cursor"] = encode_cursor(doc["timestamp"], doc["_id"])
         doc["_id"] = str(doc["_id"])
-        messages.append(doc)
-    # Devolver en orden cronológico (antiguo → reciente)
-    messages.reverse()
-    return messages
+    if not ascending:
+        docs.reverse()
+    return docs
 
 
 def ensure_indexes() -> None:
-    """Crea los índices necesarios en la colección de mensajes."""
+    """
+    Crea los índices necesarios en la colección de mensajes.
+
+    Corre después de ``migrate`` (``signals.create_mongo_indexes``) y con
+    ``python manage.py ensure_chat_indexes``.
+    """
     collection = get_messages_collection()
     collection.create_index(
-        [("conversation_id", 1), ("timestamp", DESCENDING)],
-        name="idx_conversation_timestamp",
+        [("conversation_id", 1), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+        name="idx_conversation_timestamp_id",
+    )
+    collection.create_index(
+        [("conversation_id", 1), ("seq", ASCENDING)],
+        name="idx_conversation_seq",
+        unique=True,
+        # Los mensajes anteriores a los números de secuencia no tienen seq.
+        partialFilterExpression={"seq": {"$exists": True}},
     )
+    # El índice anterior es prefijo del nuevo: sobra.
+    if "idx_conversation_timestamp" in collection.index_information():
+        collection.drop_index("idx_conversation_timestamp")
@@ -0,0 +1,300 @@
+"""
+Cola de salida acotada por conexión WebSocket.
+
+Antes ``chat_message`` hacía ``await self.send(...)`` por cada evento del
+grupo. Channels atiende los eventos de un consumer de a uno, así que un
+cliente con mala señal frenaba su propia cola del channel layer (que
+descarta en silencio al llenarse) y, con servidores que no esperan al
+socket (daphne), los frames se acumulaban sin límite en memoria.
+
+Ahora los handlers de grupo solo encolan (``put`` no espera) y una tarea por
+conexión escribe al socket:
+
+- **Acotada**: a lo sumo ``CHAT_OUTBOUND_MAX_FRAMES`` frames pendientes.
+- **Coalescencia**: los frames con ``key`` (p. ej. la posición del rider de
+  un pedido) reemplazan al pendiente con la misma clave; solo importa el
+  último. Si el cliente abrió el socket con ``?batch=1``, lo que se junte
+  durante ``CHAT_OUTBOUND_COALESCE_MS`` se envía en un solo frame
+  ``{"event": "batch", "frames": [...]}``.
+- **Ventana de acks**: daphne no espera al socket (``send`` vuelve al
+  instante), así que el tiempo de envío no dice nada del cliente. Si el
+  cliente abre el socket con ``?ack=1`` y manda ``{"ack": n}`` con el total
+  de frames que recibió, a lo sumo ``CHAT_OUTBOUND_MAX_UNACKED`` frames van
+  en vuelo; el resto espera en la cola (donde se coalesce y se descarta).
+- **Cliente lento** (cola llena, ventana llena más de
+  ``CHAT_OUTBOUND_SEND_TIMEOUT_S`` o, con servidores que sí esperan al
+  socket, un envío que tarda eso): con ``CHAT_OUTBOUND_POLICY = "shed"``
+  primero se descartan los frames prescindibles más viejos (``sheddable``,
+  p. ej. posiciones); si no hay, o con ``"close"``, se cierra el socket con
+  ``CLOSE_SLOW_CONSUMER`` y el cliente reconecta con ``?since_seq=`` para
+  recuperar lo que faltó.
+
+Todo lo que el servidor manda por el socket pasa por la cola (también el
+replay y las respuestas de control), así el conteo de frames del cliente y
+el del servidor coinciden.
+
+``stats()`` reporta los contadores del proceso (los expone la vista de
+conversaciones).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import weakref
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Código de cierre: "reconectar y reanudar con ?since_seq=".
+CLOSE_SLOW_CONSUMER = 4008
+
+POLICIES = ("shed", "close")
+
+
+def _setting(name: str, default):
+    return getattr(settings, f"CHAT_OUTBOUND_{name}", default)
+
+
+_metrics: Counter = Counter()
+_queues: weakref.WeakSet = weakref.WeakSet()
+
+
+class OutboundQueue:
+    """
+    Frames pendientes de una conexión y la tarea que los escribe.
+
+    Parameters
+    ----------
+    send : callable
+        Corrutina que recibe el texto del frame (``consumer.send`` con
+        ``text_data``).
+    close : callable
+        Corrutina que recibe el código de cierre (``consumer.close``).
+    batching : bool
+        Si el cliente acepta frames ``{"event": "batch", ...}``.
+    acks : bool
+        Si el cliente confirma los frames recibidos (ver :meth:`ack`).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        close: Callable[[int], Awaitable[None]],
+        batching: bool = False,
+        acks: bool = False,
+    ):
+        self.max_frames = _setting("MAX_FRAMES", 256)
+        self.policy = _setting("POLICY", "shed")
+        self.coalesce_s = _setting("COALESCE_MS", 25) / 1000
+        self.batch_max = _setting("BATCH_MAX_FRAMES", 50)
+        self.send_timeout = _setting("SEND_TIMEOUT_S", 10)
+        self.max_unacked = _setting("MAX_UNACKED", 64)
+        if self.policy not in POLICIES:
+            raise ValueError(f"CHAT_OUTBOUND_POLICY debe ser uno de {POLICIES}.")
+
+        self.batching = batching
+        self.acks = acks
+        self._send = send
+        self._close = close
+        # clave → (frame, sheddable); los frames sin clave usan un contador.
+        self._frames: OrderedDict[Any, tuple[dict, bool]] = OrderedDict()
+        self._ids = itertools.count()
+        self._ready = asyncio.Event()
+        # Hay lugar en la cola (para put_wait) / llegó un ack.
+        self._space = asyncio.Event()
+        self._acked_event = asyncio.Event()
+        self._sent = 0
+        self._acked = 0
+        self._closing = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        _queues.add(self)
+        _metrics["connections"] += 1
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def put(self, frame: dict, key: str | None = None, sheddable: bool = False) -> bool:
+        """
+        Encola *frame* sin esperar. Devuelve ``False`` si se descartó
+        porque la conexión se está cerrando por lenta.
+        """
+        if self._closing:
+            return False
+        _metrics["frames_queued"] += 1
+        if key is not None and key in self._frames:
+            # Coalescencia: el nuevo reemplaza al pendiente y pasa al final.
+            del self._frames[key]
+            _metrics["frames_coalesced"] += 1
+        elif len(self._frames) >= self.max_frames and not self._shed():
+            self._slow_consumer("cola llena")
+            return False
+
+        self._frames[next(self._ids) if key is None else key] = (frame, sheddable)
+        self._ready.set()
+        return True
+
+    async def put_wait(self, frame: dict) -> bool:
+        """
+        Como :meth:`put` (sin clave ni descarte), pero si la cola está llena
+        espera a que haya lugar. Para los frames que genera el propio
+        servidor en orden, como el replay o las respuestas de control.
+        """
+        while not self._closing and len(self._frames) >= self.max_frames:
+            self._space.clear()
+            await self._space.wait()
+        return self.put(frame)
+
+    def ack(self, count) -> None:
+        """
+        El cliente recibió *count* frames desde que abrió el socket
+        (acumulado: perder un ack no importa). Libera la ventana.
+        """
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            return
+        if count > self._acked:
+            self._acked = min(count, self._sent)
+            self._acked_event.set()
+
+    @property
+    def unacked(self) -> int:
+        return self._sent - self._acked if self.acks else 0
+
+    async def stop(self) -> None:
+        """Detiene la escritura y descarta lo pendiente (al desconectar)."""
+        self._closing = True
+        self._frames.clear()
+        self._space.set()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        _queues.discard(self)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    # ------------------------------------------------------------------
+    # Cliente lento
+    # ------------------------------------------------------------------
+    def _shed(self) -> bool:
+        """Descarta el frame prescindible más viejo; ``False`` si no hay."""
+        if self.policy != "shed":
+            return False
+        for key, (_, sheddable) in self._frames.items():
+            if sheddable:
+                del self._frames[key]
+                _metrics["frames_shed"] += 1
+                return True
+        return False
+
+    def _slow_consumer(self, reason: str) -> None:
+        self._closing = True
+        _metrics["slow_consumer_closes"] += 1
+        _metrics["frames_dropped"] += len(self._frames) + 1
+        logger.warning(
+            f"⚠️ [CHAT OUTBOUND] Cliente lento ({reason}, {len(self._frames)} frames "
+            f"pendientes): se cierra con {CLOSE_SLOW_CONSUMER}."
+        )
+        self._frames.clear()
+        self._ready.set()
+        self._space.set()
+        self._acked_event.set()
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def _take(self) -> list[dict]:
+        count = min(len(self._frames), self.batch_max if self.batching else 1)
+        frames = [self._frames.popitem(last=False)[1][0] for _ in range(count)]
+        if not self._frames:
+            self._ready.clear()
+        self._space.set()
+        return frames
+
+    async def _wait_for_window(self) -> bool:
+        """Espera un ack si hay ``max_unacked`` frames en vuelo; ``False`` si no llega."""
+        if self.unacked < self.max_unacked:
+            return True
+        _metrics["ack_stalls"] += 1
+        deadline = asyncio.get_running_loop().time() + self.send_timeout
+        while self.unacked >= self.max_unacked and not self._closing:
+            self._acked_event.clear()
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                await asyncio.wait_for(self._acked_event.wait(), max(remaining, 0))
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await self._ready.wait()
+            if self._closing:
+                break
+            if not await self._wait_for_window():
+                self._slow_consumer("sin acks")
+                break
+            if self._closing:
+                break
+            if self.batching and self.coalesce_s:
+                # Juntar la ráfaga en un solo frame.
+                await asyncio.sleep(self.coalesce_s)
+                if self._closing:
+                    break
+            frames = self._take()
+            if not frames:
+                continue
+            if len(frames) == 1:
+                text = json.dumps(frames[0], separators=(",", ":"))
+            else:
+                text = json.dumps({"event": "batch", "frames": frames}, separators=(",", ":"))
+                _metrics["batches_sent"] += 1
+            try:
+                # Solo vence con servidores que esperan al socket (no daphne).
+                await asyncio.wait_for(self._send(text), self.send_timeout)
+            except asyncio.TimeoutError:
+                self._slow_consumer("envío lento")
+                break
+            self._sent += 1
+            _metrics["frames_sent"] += len(frames)
+        await self._close(CLOSE_SLOW_CONSUMER)
+
+
+def stats() -> dict[str, Any]:
+    """Colas abiertas del proceso y contadores desde que arrancó."""
+    queues = list(_queues)
+    depths = [len(queue) for queue in queues]
+    return {
+        "open": len(depths),
+        "pending": sum(depths),
+        "max_pending": max(depths, default=0),
+        "with_acks": sum(1 for queue in queues if queue.acks),
+        "unacked": sum(queue.unacked for queue in queues),
+        "policy": _setting("POLICY", "shed"),
+        "max_frames": _setting("MAX_FRAMES", 256),
+        "max_unacked": _setting("MAX_UNACKED", 64),
+        **{
+            name: _metrics[name]
+            for name in (
+                "connections",
+                "frames_queued",
+                "frames_sent",
+                "frames_coalesced",
+                "batches_sent",
+                "frames_shed",
+                "frames_dropped",
+                "ack_stalls",
+                "slow_consumer_closes",
+            )
+        },
+    }
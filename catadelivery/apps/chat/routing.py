@@ -9,4 +9,9 @@ websocket_urlpatterns = [
         r"ws/chat/(?P<conversation_id>[0-9a-f\-]{36})/$",
         consumers.ChatConsumer.as_asgi(),
     ),
+    re_path(
+        r"ws/orders/(?P<order_id>\d+)/tracking/$",
+        consumers.OrderTrackingConsumer.as_asgi(),
+    ),
+    re_path(r"ws/stream/$", consumers.UserStreamConsumer.as_asgi()),
 ]
@@ -34,11 +34,35 @@ class ConversationSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class ConversationInboxSerializer(ConversationSerializer):
+    """
+    Conversación con su resumen de bandeja de entrada (ver inbox.py).
+    Los resúmenes llegan precargados en ``context["summaries"]``.
+    """
+
+    last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
+
+    class Meta(ConversationSerializer.Meta):
+        fields = ConversationSerializer.Meta.fields + ["last_message", "unread_count"]
+
+    def _summary(self, obj):
+        return self.context.get("summaries", {}).get(str(obj.id), {})
+
+    def get_last_message(self, obj):
+        return self._summary(obj).get("last_message")
+
+    def get_unread_count(self, obj):
+        return self._summary(obj).get("unread_count", 0)
+
+
 class MessageSerializer(serializers.Serializer):
     """Serializer de lectura para mensajes provenientes de MongoDB."""
 
     _id = serializers.CharField(read_only=True)
-    conversation_id = serializers.CharField(read_only=True)
     sender_id = serializers.IntegerField(read_only=True)
     message = serializers.CharField(read_only=True)
     timestamp = serializers.DateTimeField(read_only=True)
+    seq = serializers.IntegerField(read_only=True, required=False)
+    # Cursor opaco de la posición del mensaje, para ?before= / ?after=.
+    cursor = serializers.CharField(read_only=True)
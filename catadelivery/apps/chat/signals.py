@@ -0,0 +1,35 @@
+"""
+Signals del chat: invalidan el cache de pertenencia (ver membership.py)
+al guardar o borrar una ``Conversation`` y crean los índices de MongoDB
+después de ``migrate`` (ver ``mongo.ensure_indexes``).
+"""
+import logging
+
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from pymongo.errors import PyMongoError
+
+from . import membership, mongo
+from .models import Conversation
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+def invalidate_membership(sender, instance, **kwargs):
+    membership.invalidate(instance.pk)
+
+
+@receiver(post_migrate)
+def create_mongo_indexes(sender, **kwargs):
+    if sender.name != "apps.chat":
+        return
+    try:
+        mongo.ensure_indexes()
+    except PyMongoError as e:
+        # Sin MongoDB el migrate de SQLite no debe fallar.
+        logger.warning(
+            f"⚠️ [CHAT] No se crearon los índices de MongoDB ({e}); "
+            f"correr python manage.py ensure_chat_indexes."
+        )
@@ -0,0 +1,165 @@
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase
+
+from django.test import override_settings
+
+from . import outbound
+
+
+class StubSocket:
+    """``send``/``close`` de un consumer que registran lo que reciben."""
+
+    def __init__(self):
+        self.frames = []
+        self.closed = asyncio.Event()
+        self.close_code = None
+
+    async def send(self, text):
+        self.frames.append(json.loads(text))
+
+    async def close(self, code):
+        self.close_code = code
+        self.closed.set()
+
+
+class OutboundQueueTests(IsolatedAsyncioTestCase):
+    """Cola de salida con un socket falso (sin channel layer ni servidor)."""
+
+    settings = override_settings(
+        CHAT_OUTBOUND_MAX_FRAMES=3,
+        CHAT_OUTBOUND_POLICY="shed",
+        CHAT_OUTBOUND_COALESCE_MS=1,
+        CHAT_OUTBOUND_BATCH_MAX_FRAMES=50,
+        CHAT_OUTBOUND_SEND_TIMEOUT_S=0.05,
+        CHAT_OUTBOUND_MAX_UNACKED=2,
+    )
+
+    def open_queue(self, **kwargs):
+        socket = StubSocket()
+        queue = outbound.OutboundQueue(socket.send, socket.close, **kwargs)
+        self.queues.append(queue)
+        return queue, socket
+
+    async def asyncSetUp(self):
+        self.settings.enable()
+        self.queues = []
+        self.before = outbound.stats()
+
+    async def asyncTearDown(self):
+        for queue in self.queues:
+            await queue.stop()
+        self.settings.disable()
+
+    def delta(self, name):
+        return outbound.stats()[name] - self.before[name]
+
+    async def drain(self, queue):
+        """Espera a que la tarea de escritura vacíe la cola."""
+        for _ in range(100):
+            if not len(queue):
+                break
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.01)
+
+    async def test_frames_with_the_same_key_are_coalesced(self):
+        queue, socket = self.open_queue()
+        for n in range(3):
+            queue.put({"p": n}, key="position", sheddable=True)
+        queue.put({"message": "hola"})
+        await self.drain(queue)
+        await queue.stop()
+
+        self.assertEqual(socket.frames, [{"p": 2}, {"message": "hola"}])
+        self.assertEqual(self.delta("frames_coalesced"), 2)
+        self.assertEqual(self.delta("frames_sent"), 2)
+
+    async def test_shed_policy_drops_the_oldest_sheddable_frame(self):
+        queue, socket = self.open_queue()
+        queue.put({"p": 1}, key="a", sheddable=True)
+        queue.put({"m": 1})
+        queue.put({"m": 2})
+        self.assertTrue(queue.put({"m": 3}))
+        await self.drain(queue)
+        await queue.stop()
+
+        self.assertEqual(socket.frames, [{"m": 1}, {"m": 2}, {"m": 3}])
+        self.assertEqual(self.delta("frames_shed"), 1)
+        self.assertIsNone(socket.close_code)
+
+    async def test_close_policy_closes_on_overflow(self):
+        with override_settings(CHAT_OUTBOUND_POLICY="close"):
+            queue, socket = self.open_queue()
+        queue.put({"p": 1}, key="a", sheddable=True)
+        queue.put({"m": 1})
+        queue.put({"m": 2})
+        self.assertFalse(queue.put({"m": 3}))
+        await asyncio.wait_for(socket.closed.wait(), 1)
+
+        self.assertEqual(socket.close_code, outbound.CLOSE_SLOW_CONSUMER)
+        self.assertEqual(socket.frames, [])
+        self.assertEqual(self.delta("frames_shed"), 0)
+        self.assertEqual(self.delta("frames_dropped"), 4)
+        self.assertEqual(self.delta("slow_consumer_closes"), 1)
+
+    async def test_batching_sends_a_burst_in_one_frame(self):
+        queue, socket = self.open_queue(batching=True)
+        queue.put({"m": 1})
+        queue.put({"m": 2})
+        queue.put({"m": 3})
+        await self.drain(queue)
+        await queue.stop()
+
+        self.assertEqual(socket.frames, [{"event": "batch", "frames": [{"m": 1}, {"m": 2}, {"m": 3}]}])
+        self.assertEqual(self.delta("batches_sent"), 1)
+        self.assertEqual(self.delta("frames_sent"), 3)
+
+    async def test_acks_open_the_window(self):
+        queue, socket = self.open_queue(acks=True)
+        for n in range(3):
+            queue.put({"m": n})
+        await asyncio.sleep(0.02)
+        self.assertEqual(len(socket.frames), 2)
+        self.assertEqual(queue.unacked, 2)
+
+        queue.ack(2)
+        await self.drain(queue)
+        await queue.stop()
+
+        self.assertEqual(socket.frames, [{"m": 0}, {"m": 1}, {"m": 2}])
+        self.assertIsNone(socket.close_code)
+        self.assertEqual(self.delta("ack_stalls"), 1)
+
+    async def test_full_ack_window_closes_with_4008(self):
+        queue, socket = self.open_queue(acks=True)
+        for n in range(3):
+            queue.put({"m": n})
+        await asyncio.wait_for(socket.closed.wait(), 1)
+
+        self.assertEqual(socket.close_code, outbound.CLOSE_SLOW_CONSUMER)
+        self.assertEqual(socket.frames, [{"m": 0}, {"m": 1}])
+        self.assertEqual(self.delta("slow_consumer_closes"), 1)
+        self.assertFalse(queue.put({"m": 3}))
+
+    async def test_put_wait_waits_for_room(self):
+        queue, socket = self.open_queue()
+        for n in range(5):
+            self.assertTrue(await queue.put_wait({"m": n}))
+        await self.drain(queue)
+        await queue.stop()
+
+        self.assertEqual(socket.frames, [{"m": n} for n in range(5)])
+        self.assertEqual(self.delta("frames_shed"), 0)
+
+    async def test_stats_report_open_queues(self):
+        queue, _ = self.open_queue(acks=True)
+        queue.put({"m": 1})
+        queue.put({"m": 2})
+
+        stats = outbound.stats()
+        self.assertEqual(self.delta("connections"), 1)
+        self.assertEqual(self.delta("frames_queued"), 2)
+        self.assertGreaterEqual(stats["open"], 1)
+        self.assertGreaterEqual(stats["with_acks"], 1)
+        self.assertEqual(stats["max_frames"], 3)
+        self.assertEqual(stats["max_unacked"], 2)
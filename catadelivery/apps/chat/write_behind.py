@@ -0,0 +1,374 @@
+"""
+Buffer de escritura diferida (write-behind) para los mensajes de chat.
+
+Antes cada mensaje esperaba su ``insert_one`` antes de emitirse al grupo:
+la latencia de MongoDB quedaba en el camino de entrega. Con el buffer:
+
+1. ``ChatConsumer`` arma el documento con ``_id`` (``ObjectId``) y
+   ``timestamp`` asignados localmente y su ``seq`` (contador atómico en
+   MongoDB), lo agrega al buffer y lo emite al grupo de inmediato. El
+   ``seq`` es la única ida a MongoDB antes de emitir; ``stats()`` reporta
+   su latencia (ver ``mongo.next_seq``).
+2. El buffer escribe por lotes con ``insert_many(ordered=False)`` cuando
+   junta ``CHAT_WRITE_BEHIND_BATCH_SIZE`` mensajes o pasan
+   ``CHAT_WRITE_BEHIND_FLUSH_INTERVAL_S`` segundos, lo que ocurra primero.
+3. Si un lote falla se reintenta (los ``_id`` duplicados de un reintento se
+   ignoran); un documento que no se puede codificar se aísla escribiendo
+   el lote de a uno y se descarta. Al cerrar el proceso se vacía lo
+   pendiente con el cliente síncrono.
+4. Tras cada lote escrito se actualizan los resúmenes de la bandeja de
+   entrada (``inbox``) de las conversaciones afectadas.
+
+Con ``CHAT_WRITE_BEHIND_DURABLE = True`` (o ``add(doc, durable=True)``) el
+llamador espera a que su lote quede escrito antes de seguir, como con el
+``insert_one`` anterior.
+
+El buffer es por proceso y vive en el event loop del servidor ASGI.
+``stats()`` reporta el backlog (lo expone la vista de conversaciones).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import time
+from collections import deque
+from typing import Any
+
+from django.conf import settings
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+from . import inbox, mongo
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _setting(name: str, default):
+    return getattr(settings, f"CHAT_WRITE_BEHIND_{name}", default)
+
+
+class _Entry:
+    __slots__ = ("doc", "recipient_ids", "attempts", "future")
+
+    def __init__(self, doc: dict[str, Any], recipient_ids, future: asyncio.Future | None):
+        self.doc = doc
+        self.recipient_ids = tuple(recipient_ids)
+        self.attempts = 0
+        self.future = future
+
+
+class MessageBuffer:
+    """Cola de documentos pendientes de insertar en ``chat_messages``."""
+
+    def __init__(self):
+        self.batch_size = _setting("BATCH_SIZE", 100)
+        self.flush_interval = _setting("FLUSH_INTERVAL_S", 0.2)
+        self.max_retries = _setting("MAX_RETRIES", 5)
+        self.backlog_warning = _setting("BACKLOG_WARNING", 5000)
+        self.durable = _setting("DURABLE", False)
+
+        self._pending: list[_Entry] = []
+        self._in_flight: list[_Entry] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        self._oldest_pending_at: float | None = None
+        self.flushed = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        # Latencia (ms) de las últimas reservas de seq.
+        self._seq_ms: deque[float] = deque(maxlen=1000)
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    async def add(
+        self,
+        doc: dict[str, Any],
+        recipient_ids=(),
+        durable: bool | None = None,
+    ) -> None:
+        """
+        Encola *doc* (con ``_id`` y ``timestamp`` ya asignados).
+        *recipient_ids* son los usuarios para los que cuenta como no leído.
+
+        Si *durable* (por defecto ``CHAT_WRITE_BEHIND_DURABLE``), espera a
+        que el lote que lo contiene quede escrito.
+        """
+        durable = self.durable if durable is None else durable
+        loop = asyncio.get_running_loop()
+        future = loop.create_future() if durable else None
+        self._pending.append(_Entry(doc, recipient_ids, future))
+        if self._oldest_pending_at is None:
+            self._oldest_pending_at = time.monotonic()
+
+        if durable or len(self._pending) >= self.batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._start_flush)
+
+        if len(self._pending) >= self.backlog_warning:
+            logger.warning(
+                f"⚠️ [CHAT BUFFER] Backlog de {len(self._pending)} mensajes sin escribir."
+            )
+        if future is not None:
+            await future
+
+    async def flush(self) -> None:
+        """Escribe todo lo pendiente y espera a que termine."""
+        while self._pending or self._flush_task is not None:
+            self._start_flush()
+            if self._flush_task is not None:
+                await asyncio.shield(self._flush_task)
+
+    def pending_since(self, conversation_id: str, since_seq: int) -> list[dict[str, Any]]:
+        """Documentos aún sin escribir de la conversación con ``seq > since_seq``."""
+        conversation_id = str(conversation_id)
+        return [
+            entry.doc
+            for entry in self._in_flight + self._pending
+            if entry.doc["conversation_id"] == conversation_id and entry.doc["seq"] > since_seq
+        ]
+
+    def stats(self) -> dict[str, Any]:
+        """Backlog actual y contadores desde que arrancó el proceso."""
+        oldest = self._oldest_pending_at
+        return {
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "oldest_pending_s": round(time.monotonic() - oldest, 3) if oldest else 0.0,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "durable": self.durable,
+            "seq_ms": _percentiles(self._seq_ms),
+        }
+
+    def record_seq_latency(self, ms: float) -> None:
+        """Registra cuánto tardó en MongoDB la reserva del ``seq`` de un mensaje."""
+        self._seq_ms.append(ms)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Un solo lote en vuelo; el siguiente arranca al terminar este.
+        if self._flush_task is None and self._pending:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_batch())
+
+    async def _flush_batch(self) -> None:
+        batch = self._pending[: self.batch_size]
+        del self._pending[: self.batch_size]
+        self._in_flight = batch
+        self._oldest_pending_at = time.monotonic() if self._pending else None
+        try:
+            await self._write_batch(batch)
+        except Exception:  # noqa: BLE001
+            # Un error inesperado no puede dejar _flush_task tomado para
+            # siempre: lo que quedó en vuelo vuelve a la cola.
+            logger.exception("❌ [CHAT BUFFER] Error inesperado al escribir un lote")
+            self.failed_flushes += 1
+            self._requeue(self._in_flight)
+        finally:
+            self._in_flight = []
+            self._flush_task = None
+            self._schedule_next()
+
+    async def _write_batch(self, batch: list[_Entry]) -> None:
+        failed_indexes: set[int] = set()
+        poisoned: set[int] = set()
+        error: Exception | None = None
+        try:
+            await mongo.get_async_messages_collection().insert_many(
+                [entry.doc for entry in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            # Duplicados = ya escritos en un intento previo.
+            failed_indexes = {
+                err["index"]
+                for err in e.details.get("writeErrors", [])
+                if err.get("code") != DUPLICATE_KEY_ERROR
+            }
+            error = e
+        except PyMongoError as e:
+            failed_indexes = set(range(len(batch)))
+            error = e
+        except Exception as e:  # noqa: BLE001
+            # Un documento que no se puede codificar (InvalidDocument, ...)
+            # hace fallar todo el lote: se escribe de a uno para aislarlo.
+            failed_indexes, poisoned = await self._write_each(batch)
+            error = e
+
+        retry = []
+        written = []
+        for index, entry in enumerate(batch):
+            if index not in failed_indexes and index not in poisoned:
+                self.flushed += 1
+                written.append(entry)
+                continue
+            entry.attempts += 1
+            if index in poisoned or entry.attempts >= self.max_retries:
+                self.dropped += 1
+                _resolve(entry.future, error)
+                logger.error(
+                    f"❌ [CHAT BUFFER] Mensaje {entry.doc.get('_id')} descartado tras "
+                    f"{entry.attempts} intentos: {error}"
+                )
+            else:
+                retry.append(entry)
+
+        if failed_indexes or poisoned:
+            self.failed_flushes += 1
+            logger.warning(
+                f"⚠️ [CHAT BUFFER] {len(failed_indexes | poisoned)} mensajes sin escribir: {error}"
+            )
+        self._requeue(retry)
+        self._in_flight = []
+
+        if written:
+            try:
+                await inbox.aapply((entry.doc, entry.recipient_ids) for entry in written)
+            except PyMongoError as e:
+                logger.warning(f"⚠️ [CHAT BUFFER] No se actualizó la bandeja de entrada: {e}")
+            finally:
+                for entry in written:
+                    _resolve(entry.future)
+
+    async def _write_each(self, batch: list[_Entry]) -> tuple[set[int], set[int]]:
+        """
+        Inserta el lote documento por documento. Devuelve los índices que
+        fallaron por MongoDB (se reintentan) y los que no se pueden escribir
+        nunca (se descartan).
+        """
+        collection = mongo.get_async_messages_collection()
+        failed: set[int] = set()
+        poisoned: set[int] = set()
+        for index, entry in enumerate(batch):
+            try:
+                await collection.insert_one(entry.doc)
+            except DuplicateKeyError:
+                pass
+            except PyMongoError:
+                failed.add(index)
+            except Exception:  # noqa: BLE001
+                poisoned.add(index)
+        return failed, poisoned
+
+    def _requeue(self, entries: list[_Entry]) -> None:
+        if not entries:
+            return
+        self._pending[:0] = entries
+        if self._oldest_pending_at is None:
+            self._oldest_pending_at = time.monotonic()
+
+    def _schedule_next(self) -> None:
+        if not self._pending:
+            return
+        if len(self._pending) >= self.batch_size or any(e.future for e in self._pending):
+            self._start_flush()
+        elif self._timer is None:
+            # Tras un error, esperar el intervalo antes de reintentar.
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._start_flush
+            )
+
+    def flush_sync(self) -> None:
+        """
+        Vacía pendientes y lotes en vuelo con el cliente síncrono.
+
+        Se usa al cerrar el proceso, cuando el event loop ya no corre.
+        """
+        entries = self._in_flight + self._pending
+        self._in_flight = []
+        self._pending = []
+        if not entries:
+            return
+        lost: set[int] = set()
+        try:
+            mongo.get_messages_collection().insert_many(
+                [entry.doc for entry in entries], ordered=False
+            )
+        except BulkWriteError as e:
+            lost = {
+                err["index"] for err in e.details.get("writeErrors", [])
+                if err.get("code") != DUPLICATE_KEY_ERROR
+            }
+            if lost:
+                logger.error(f"❌ [CHAT BUFFER] {len(lost)} mensajes perdidos al cerrar: {e}")
+        except PyMongoError as e:
+            logger.error(f"❌ [CHAT BUFFER] {len(entries)} mensajes perdidos al cerrar: {e}")
+            return
+        try:
+            inbox.apply(
+                (entry.doc, entry.recipient_ids)
+                for index, entry in enumerate(entries)
+                if index not in lost
+            )
+        except PyMongoError as e:
+            logger.warning(f"⚠️ [CHAT BUFFER] No se actualizó la bandeja de entrada: {e}")
+
+
+def _percentiles(samples) -> dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"samples": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "samples": len(ordered),
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def _resolve(future: asyncio.Future | None, error: Exception | None = None) -> None:
+    if future is None or future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+# ---------------------------------------------------------------------------
+# Instancia del proceso
+# ---------------------------------------------------------------------------
+_buffer: MessageBuffer | None = None
+
+
+def get_buffer() -> MessageBuffer:
+    """Buffer compartido por todos los consumers del proceso."""
+    global _buffer
+    if _buffer is None:
+        _buffer = MessageBuffer()
+        atexit.register(_buffer.flush_sync)
+    return _buffer
+
+
+async def add_message(
+    conversation_id: str,
+    sender_id: int,
+    message: str,
+    recipient_ids=(),
+    durable: bool | None = None,
+) -> dict[str, Any]:
+    """
+    Arma el documento del mensaje (``_id`` y ``timestamp`` locales, ``seq``
+    del contador de la conversación) y lo encola para escribirse. Devuelve
+    el documento para emitirlo.
+    """
+    doc = mongo.new_message_doc(conversation_id, sender_id, message, with_id=True)
+    started = time.perf_counter()
+    doc["seq"] = await mongo.anext_seq(conversation_id)
+    get_buffer().record_seq_latency((time.perf_counter() - started) * 1000)
+    await get_buffer().add(doc, recipient_ids=recipient_ids, durable=durable)
+    return doc
+
+
+def stats() -> dict[str, Any]:
+    """Estado del buffer del proceso."""
+    return get_buffer().stats()
@@ -0,0 +1,215 @@
+"""
+Consultas geográficas con geohash precalculado.
+
+``ClientAddress``, ``Store`` y la posición de los riders en ``UserProfile``
+guardan, además de lat/lon, un geohash indexado que se mantiene al guardar.
+Para responder "qué hay cerca" se buscan por rango de índice las celdas
+que cubren el radio (celda central + 8 vecinas) y luego se refina con la
+distancia exacta de Haversine, en lugar de calcular Haversine sobre toda
+la tabla.
+
+Ejemplo::
+
+    from apps.common import geo
+    from apps.store.models import Store
+
+    cercanos = geo.nearby(Store.objects.filter(enabled=True), lat, lon, radius_km=3)
+    # [(store, distancia_km), ...] ordenados por distancia
+"""
+import math
+from typing import Iterable, List, Tuple
+
+from django.db.models import Q
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(BASE32)}
+
+# Precisión guardada en la base (≈ 4.8 m x 4.8 m).
+GEOHASH_PRECISION = 9
+
+KM_PER_DEGREE = 111.32
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calcula la distancia en kilómetros entre dos puntos geográficos
+    usando la fórmula de Haversine.
+
+    Args:
+        lat1: Latitud del primer punto
+        lon1: Longitud del primer punto
+        lat2: Latitud del segundo punto
+        lon2: Longitud del segundo punto
+
+    Returns:
+        Distancia en kilómetros
+    """
+    # Radio de la Tierra en kilómetros
+    R = 6371.0
+
+    # Convertir grados a radianes
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    # Diferencias
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    # Fórmula de Haversine
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    distance = R * c
+    return distance
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Codifica una coordenada como geohash de *precision* caracteres."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[ch])
+            bit = 0
+            ch = 0
+    return "".join(chars)
+
+
+def decode_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Devuelve ``(lat_min, lat_max, lon_min, lon_max)`` de la celda."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for c in geohash:
+        value = _BASE32_INDEX[c]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def cell_size_km(precision: int, latitude: float = 0.0) -> Tuple[float, float]:
+    """Alto y ancho (km) de una celda de *precision* caracteres a esa latitud."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    height = 180.0 / (2 ** lat_bits) * KM_PER_DEGREE
+    width = 360.0 / (2 ** lon_bits) * KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01)
+    return height, width
+
+
+def precision_for_radius(radius_km: float, latitude: float = 0.0) -> int:
+    """
+    Mayor precisión cuyas celdas miden al menos *radius_km* por lado, de modo
+    que la celda central y sus 8 vecinas cubren todo el círculo.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if min(cell_size_km(precision, latitude)) >= radius_km:
+            return precision
+    return 1
+
+
+def neighbours(geohash: str) -> List[str]:
+    """Las 8 celdas vecinas de *geohash* (misma precisión)."""
+    lat_min, lat_max, lon_min, lon_max = decode_bbox(geohash)
+    lat_c = (lat_min + lat_max) / 2
+    lon_c = (lon_min + lon_max) / 2
+    d_lat = lat_max - lat_min
+    d_lon = lon_max - lon_min
+    cells = []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dx == 0 and dy == 0:
+                continue
+            lat = lat_c + dy * d_lat
+            if not -90 <= lat <= 90:
+                continue
+            lon = (lon_c + dx * d_lon + 180) % 360 - 180
+            cells.append(encode(lat, lon, len(geohash)))
+    return cells
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """Prefijos geohash que cubren el círculo (celda central + vecinas)."""
+    precision = precision_for_radius(radius_km, latitude)
+    center = encode(latitude, longitude, precision)
+    return sorted({center, *neighbours(center)})
+
+
+def prefix_q(field: str, prefixes: Iterable[str]) -> Q:
+    """
+    ``Q`` que filtra *field* por cualquiera de los prefijos.
+
+    Se usa un rango ``[prefijo, prefijo + '{')`` en lugar de ``startswith``:
+    SQLite no siempre usa el índice con ``LIKE``, pero sí con un rango
+    ('{' es el carácter ASCII siguiente a 'z').
+    """
+    q = Q()
+    for prefix in prefixes:
+        q |= Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + "{"})
+    return q
+
+
+def nearby(
+    queryset,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    lat_field: str = "latitude",
+    lon_field: str = "longitude",
+    geohash_field: str = "geohash",
+) -> List[Tuple[object, float]]:
+    """
+    Objetos de *queryset* a menos de *radius_km* del punto.
+
+    Returns:
+        Lista de tuplas ``(objeto, distancia_km)`` ordenada por distancia.
+    """
+    candidates = queryset.filter(
+        prefix_q(geohash_field, covering_cells(latitude, longitude, radius_km))
+    )
+    results = []
+    for obj in candidates:
+        distance = haversine_distance(
+            latitude, longitude, getattr(obj, lat_field), getattr(obj, lon_field)
+        )
+        if distance <= radius_km:
+            results.append((obj, distance))
+    results.sort(key=lambda item: item[1])
+    return results
+
+
+def with_geohash_update_fields(instance, update_fields, lat_field, lon_field, geohash_field):
+    """
+    Recalcula ``instance.<geohash_field>`` y, si el ``save()`` usa
+    ``update_fields`` con alguna coordenada, agrega el geohash a la lista.
+
+    Pensado para llamarse desde ``save()`` de los modelos con coordenadas.
+    """
+    lat = getattr(instance, lat_field)
+    lon = getattr(instance, lon_field)
+    setattr(instance, geohash_field, encode(lat, lon) if lat is not None and lon is not None else "")
+    if update_fields is not None and ({lat_field, lon_field} & set(update_fields)):
+        update_fields = set(update_fields) | {geohash_field}
+    return update_fields
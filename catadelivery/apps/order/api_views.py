@@ -2,17 +2,22 @@ from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db.models import Q
 
-from apps.store.models import Product
+from apps.chat import location_trail
+from apps.store.models import Product, Store
 from rest_framework import permissions, serializers, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from apps.users.models import UserProfile
+from apps.users.models import ClientAddress, UserProfile
 
+from . import fees
 from .models import Order, OrderProduct
 from .serializers import OrderProductSerializer, OrderSerializer
 from .utils import assign_orders_to_riders, calculate_assignment_score, calculate_delivery_fee
 
+# Máximo de stores o direcciones por cotización de envío.
+QUOTE_MAX_IDS = 50
+
 
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.select_related("rider", "store", "client").prefetch_related("items")
@@ -90,7 +95,8 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = (
             Order.objects.select_related(
-                "rider", "store", "client", "delivery_address", "store__userprofile"
+                "rider", "store", "client", "delivery_address", "store__userprofile",
+                "rider__current_subscription",
             )
             .prefetch_related("items")
             .order_by("-dt")
@@ -170,7 +176,8 @@ class OrderViewSet(viewsets.ModelViewSet):
             rider=user,
             status=4  # In Route
         ).select_related(
-            "rider", "store", "client", "delivery_address", "store__userprofile"
+            "rider", "store", "client", "delivery_address", "store__userprofile",
+            "rider__current_subscription",
         ).prefetch_related("items").first()
 
         if active_order:
@@ -232,6 +239,79 @@ class OrderViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def delivery_quote(self, request):
+        """
+        Cotiza el costo de envío sin crear un pedido.
+
+        Uno de los dos lados debe ser un único id:
+            ?store=<id>                         → store a todas mis direcciones
+            ?store=<id>&addresses=<id>,<id>     → store a esas direcciones
+            ?address=<id>&stores=<id>,<id>,...  → esos stores a una dirección
+
+        A lo sumo ``QUOTE_MAX_IDS`` ids por lado. Staff debe indicar las
+        direcciones explícitamente.
+        """
+        def parse_ids(*names):
+            raw = ",".join(request.query_params.get(name, "") for name in names)
+            return [int(value) for value in raw.split(",") if value.strip()]
+
+        try:
+            store_ids = parse_ids("store", "stores")
+            address_ids = parse_ids("address", "addresses")
+        except ValueError:
+            return Response(
+                {"detail": "Los ids deben ser números enteros separados por comas."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not store_ids or (len(store_ids) > 1 and len(address_ids) != 1):
+            return Response(
+                {"detail": "Indique un store y N direcciones, o N stores y una dirección."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(store_ids) > QUOTE_MAX_IDS or len(address_ids) > QUOTE_MAX_IDS:
+            return Response(
+                {"detail": f"Se admiten a lo sumo {QUOTE_MAX_IDS} ids por lado."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if request.user.is_staff and not address_ids:
+            # Sin filtro por usuario serían todas las direcciones de la base.
+            return Response(
+                {"detail": "Indique las direcciones a cotizar con 'address' o 'addresses'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        addresses = ClientAddress.objects.only("id", "latitude", "longitude")
+        if not request.user.is_staff:
+            addresses = addresses.filter(user=request.user)
+        if address_ids:
+            addresses = addresses.filter(pk__in=address_ids)
+        stores = Store.objects.filter(pk__in=store_ids, enabled=True).only("id", "latitude", "longitude")
+
+        quotes = fees.quote_fees(list(stores.order_by("id")), list(addresses.order_by("id")))
+        return Response({"quotes": quotes}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def trail(self, request, pk=None):
+        """
+        Endpoint para consultar el recorrido GPS del rider durante la entrega
+        de un pedido (resolución de disputas). Solo para administradores.
+        """
+        order = self.get_object()
+        points = location_trail.get_order_trail(order)
+        return Response(
+            {
+                "order_id": order.id,
+                "rider_id": order.rider_id,
+                "points": [
+                    {"lat": p["lat"], "lon": p["lon"], "ts": p["ts"].isoformat()}
+                    for p in points
+                ],
+            },
+            status=status.HTTP_200_OK
+        )
+
     @action(detail=False, methods=["post"], permission_classes=[permissions.IsAdminUser])
     def auto_assign(self, request):
         """
@@ -0,0 +1,70 @@
+"""
+Cotización de costos de envío por lotes con memoización.
+
+Antes de hacer checkout la app quiere el costo de envío de un store a cada
+``ClientAddress`` del cliente (o de varios stores a una dirección). Este
+módulo calcula todos los pares en una pasada vectorizada
+(``calculate_delivery_fees``) y memoiza cada par ``(store, address)`` en el
+cache de Django.
+
+La clave de cada par son las coordenadas del store y de la dirección: el
+costo depende solo de ellas, así que mover un store o editar una dirección
+produce claves nuevas y una entrada vieja nunca se sirve, aunque el cache
+pierda, reinicie o no comparta invalidaciones entre procesos. No hace falta
+versionar ni invalidar.
+"""
+from django.core.cache import cache
+
+from .utils import calculate_delivery_fees
+
+FEE_CACHE_TTL = 24 * 3600
+
+
+def _pair_key(store, address):
+    # repr() conserva el float exacto guardado en la base.
+    return f"fee:{store.latitude!r}:{store.longitude!r}:{address.latitude!r}:{address.longitude!r}"
+
+
+def quote_fees(stores, addresses):
+    """
+    Cotiza el envío para cada combinación de *stores* × *addresses*.
+
+    Args:
+        stores: Objetos con ``id``, ``latitude`` y ``longitude``.
+        addresses: Objetos con ``id``, ``latitude`` y ``longitude``.
+
+    Returns:
+        Lista de dicts ``{"store", "address", "distance_km", "delivery_fee"}``
+        en el orden de los pares.
+    """
+    pairs = [(store, address) for store in stores for address in addresses]
+    if not pairs:
+        return []
+
+    keys = [_pair_key(store, address) for store, address in pairs]
+    memo = cache.get_many(keys)
+
+    missing = [i for i, key in enumerate(keys) if key not in memo]
+    if missing:
+        distances, fees = calculate_delivery_fees(
+            [pairs[i][0].latitude for i in missing],
+            [pairs[i][0].longitude for i in missing],
+            [pairs[i][1].latitude for i in missing],
+            [pairs[i][1].longitude for i in missing],
+        )
+        fresh = {
+            keys[i]: (round(distance, 3), fee)
+            for i, distance, fee in zip(missing, distances, fees)
+        }
+        cache.set_many(fresh, FEE_CACHE_TTL)
+        memo.update(fresh)
+
+    return [
+        {
+            "store": store.id,
+            "address": address.id,
+            "distance_km": memo[key][0],
+            "delivery_fee": memo[key][1],
+        }
+        for (store, address), key in zip(pairs, keys)
+    ]
@@ -0,0 +1,56 @@
+"""
+Management command para recalcular los geohash de direcciones, stores y
+posiciones de riders.
+
+Uso:
+    python manage.py rebuild_geohashes
+
+Necesario una vez para las filas creadas antes de agregar las columnas, o
+después de modificar coordenadas con ``QuerySet.update()``.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.common import geo
+from apps.store.models import Store
+from apps.users.models import ClientAddress, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Recalcula los geohash de ClientAddress, Store y UserProfile."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        targets = [
+            (ClientAddress.objects.all(), "latitude", "longitude", "geohash"),
+            (Store.objects.all(), "latitude", "longitude", "geohash"),
+            (
+                UserProfile.objects.filter(current_latitude__isnull=False, current_longitude__isnull=False),
+                "current_latitude",
+                "current_longitude",
+                "current_geohash",
+            ),
+        ]
+        for queryset, lat_field, lon_field, geohash_field in targets:
+            count = self.rebuild(queryset, lat_field, lon_field, geohash_field, options["batch_size"])
+            self.stdout.write(f"  - {queryset.model._meta.label}: {count} filas actualizadas")
+        self.stdout.write(self.style.SUCCESS("Geohash recalculados."))
+
+    def rebuild(self, queryset, lat_field, lon_field, geohash_field, batch_size):
+        model = queryset.model
+        changed = []
+        count = 0
+        for obj in queryset.only("pk", lat_field, lon_field, geohash_field).iterator(chunk_size=batch_size):
+            value = geo.encode(getattr(obj, lat_field), getattr(obj, lon_field))
+            if getattr(obj, geohash_field) != value:
+                setattr(obj, geohash_field, value)
+                changed.append(obj)
+            if len(changed) >= batch_size:
+                model.objects.bulk_update(changed, [geohash_field])
+                count += len(changed)
+                changed = []
+        if changed:
+            model.objects.bulk_update(changed, [geohash_field])
+            count += len(changed)
+        return count
@@ -1,45 +1,11 @@
 """
 Utilidades para asignación automática de deliveries usando el algoritmo húngaro.
 """
-import math
 from typing import List, Dict, Tuple
 from scipy.optimize import linear_sum_assignment
 import numpy as np
 
-
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    Calcula la distancia en kilómetros entre dos puntos geográficos
-    usando la fórmula de Haversine.
-
-    Args:
-        lat1: Latitud del primer punto
-        lon1: Longitud del primer punto
-        lat2: Latitud del segundo punto
-        lon2: Longitud del segundo punto
-
-    Returns:
-        Distancia en kilómetros
-    """
-    # Radio de la Tierra en kilómetros
-    R = 6371.0
-
-    # Convertir grados a radianes
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-
-    # Diferencias
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-
-    # Fórmula de Haversine
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    distance = R * c
-    return distance
+from apps.common.geo import haversine_distance
 
 
 def calculate_cost_matrix(riders: List[Dict], orders: List[Dict]) -> np.ndarray:
@@ -224,3 +190,44 @@ def calculate_delivery_fee(store_lat: float, store_lon: float,
     delivery_fee = round(delivery_fee, 2)
 
     return delivery_fee
+
+
+def haversine_distance_vec(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Versión vectorizada de ``haversine_distance`` con numpy.
+
+    Acepta escalares o arrays (con broadcasting) y devuelve las distancias
+    en kilómetros como ``np.ndarray``.
+    """
+    R = 6371.0
+
+    lat1_rad = np.radians(np.asarray(lat1, dtype=float))
+    lon1_rad = np.radians(np.asarray(lon1, dtype=float))
+    lat2_rad = np.radians(np.asarray(lat2, dtype=float))
+    lon2_rad = np.radians(np.asarray(lon2, dtype=float))
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    a = np.sin(dlat / 2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return R * c
+
+
+def calculate_delivery_fees(store_lats, store_lons, delivery_lats, delivery_lons) -> Tuple[List[float], List[float]]:
+    """
+    Calcula en una sola pasada vectorizada las distancias y los costos de
+    envío para varios pares store → dirección (misma regla que
+    ``calculate_delivery_fee``: $0.10 USD por cada 100 metros).
+
+    Returns:
+        Tupla (distancias_km, fees_usd) como listas de floats. El redondeo
+        final usa ``round`` de Python para coincidir exactamente con
+        ``calculate_delivery_fee``.
+    """
+    distance_km = haversine_distance_vec(store_lats, store_lons, delivery_lats, delivery_lons)
+    raw_fees = distance_km * 1000 / 100 * 0.10
+    distances = np.atleast_1d(distance_km).tolist()
+    fees = [round(fee, 2) for fee in np.atleast_1d(raw_fees).tolist()]
+    return distances, fees
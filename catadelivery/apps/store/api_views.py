@@ -1,9 +1,31 @@
-from rest_framework import permissions, serializers, viewsets
+import io
 
-from apps.users.models import UserProfile
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework import permissions, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
 
+from apps.common import geo
+from apps.order.utils import calculate_delivery_fees
+from apps.users.models import ClientAddress, UserProfile
+
+from . import catalog, product_upsert, search
 from .models import Category, Product, Store
-from .serializers import CategorySerializer, ProductSerializer, StoreSerializer
+from .serializers import CategorySerializer, NearbyStoreSerializer, ProductSerializer, StoreSerializer
+
+NEARBY_DEFAULT_RADIUS_KM = 5.0
+NEARBY_MAX_RADIUS_KM = 30.0
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+SEARCH_MIN_QUERY_LENGTH = 2
+
+
+class NearbyStorePagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
 
 
 class StoreViewSet(viewsets.ModelViewSet):
@@ -34,6 +56,116 @@ class StoreViewSet(viewsets.ModelViewSet):
             raise permissions.PermissionDenied("You can only update your own store.")
         serializer.save()
 
+    @action(detail=True, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def catalog(self, request, pk=None):
+        """
+        GET /api/stores/<id>/catalog/
+
+        Store, categorías y productos en un solo documento compacto,
+        precalculado y servido con ETag fuerte: si el cliente envía
+        ``If-None-Match`` con el ETag vigente se responde 304 con una sola
+        consulta (la versión del catálogo).
+        """
+        try:
+            store_id = int(pk)
+        except (TypeError, ValueError):
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        version = catalog.get_version(store_id)
+        user = request.user
+        # Mismas reglas de visibilidad que get_queryset, con los datos de la versión.
+        visible = version is not None and (
+            user.is_staff
+            or version["owner_id"] == user.id
+            or (version["enabled"] and user.role != UserProfile.Roles.STORE)
+        )
+        if not visible:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = version["etag"]
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            response = HttpResponseNotModified()
+        else:
+            body = catalog.get_body(version)
+            if body is None:
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def nearby(self, request):
+        """
+        GET /api/stores/nearby/?address=<id>&radius=<km>&limit=&offset=
+
+        Stores habilitados a menos de *radius* km (default 5) de una dirección
+        del usuario, ordenados por distancia y con el costo de envío incluido.
+        Los candidatos salen del índice de geohash; distancia y fee se
+        calculan en una sola pasada vectorizada.
+        """
+        address_param = request.query_params.get("address")
+        if not address_param:
+            return Response(
+                {"detail": "El parámetro 'address' es requerido."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            address_id = int(address_param)
+        except ValueError:
+            return Response(
+                {"detail": "El parámetro 'address' debe ser un entero."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            radius = float(request.query_params.get("radius", NEARBY_DEFAULT_RADIUS_KM))
+        except ValueError:
+            return Response(
+                {"detail": "El parámetro 'radius' debe ser un número."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+            return Response(
+                {"detail": f"El radio debe estar entre 0 y {NEARBY_MAX_RADIUS_KM:g} km."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        addresses = ClientAddress.objects.all()
+        if not request.user.is_staff:
+            addresses = addresses.filter(user=request.user)
+        address = addresses.filter(pk=address_id).first()
+        if address is None:
+            return Response(
+                {"detail": "Dirección no encontrada."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        candidates = list(
+            Store.objects.filter(enabled=True).filter(
+                geo.prefix_q("geohash", geo.covering_cells(address.latitude, address.longitude, radius))
+            )
+        )
+        results = []
+        if candidates:
+            distances, fees = calculate_delivery_fees(
+                [store.latitude for store in candidates],
+                [store.longitude for store in candidates],
+                address.latitude,
+                address.longitude,
+            )
+            for store, distance, fee in zip(candidates, distances, fees):
+                if distance <= radius:
+                    store.distance_km = round(distance, 3)
+                    store.delivery_fee = fee
+                    results.append(store)
+            results.sort(key=lambda store: store.distance_km)
+
+        paginator = NearbyStorePagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        serializer = NearbyStoreSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by("name")
@@ -72,3 +204,89 @@ class ProductViewSet(viewsets.ModelViewSet):
         if not user.is_staff and store.userprofile != user:
             raise permissions.PermissionDenied("You can only update products for your store.")
         serializer.save()
+
+    @action(detail=False, methods=["post"], url_path="bulk-upsert")
+    def bulk_upsert(self, request):
+        """
+        POST /api/products/bulk-upsert/
+
+        Crea o actualiza varios productos de un store en una transacción
+        (ver product_upsert.py). Acepta JSON::
+
+            {"store": 3, "products": [{"id": 10, "name": "...", "price": 2.5, "category": 1}, ...]}
+
+        o multipart con ``store`` y un archivo CSV en ``file``
+        (columnas ``id,name,description,price,category``).
+        """
+        try:
+            store_id = int(request.data.get("store"))
+        except (AttributeError, TypeError, ValueError):
+            # AttributeError: el cuerpo JSON no es un objeto (p. ej. una lista).
+            store_id = None
+        store = Store.objects.filter(pk=store_id).values("id", "userprofile_id").first() if store_id else None
+        if store is None:
+            return Response({"detail": "store es obligatorio y debe existir."}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.user.is_staff and store["userprofile_id"] != request.user.id:
+            raise permissions.PermissionDenied("You can only update products for your store.")
+
+        upload = request.FILES.get("file")
+        if upload is not None:
+            try:
+                rows = product_upsert.read_csv(io.TextIOWrapper(upload.file, encoding="utf-8-sig"))
+            except (UnicodeDecodeError, ValueError):
+                return Response({"detail": "El archivo debe ser un CSV en UTF-8."}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get("products")
+            if not isinstance(rows, list):
+                return Response(
+                    {"detail": "Envía products (lista) o un archivo CSV en file."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            result = product_upsert.upsert_products(store["id"], rows)
+        except product_upsert.UpsertError as e:
+            return Response({"detail": str(e), "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class SearchView(GenericAPIView):
+    """
+    GET /api/search/?q=<texto>[&type=product,store,category][&limit=20]
+
+    Búsqueda de texto completo (FTS5) en productos, stores y categorías de
+    stores habilitados. Cada palabra se busca por prefijo y los resultados
+    vienen ordenados por relevancia.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        q = (request.query_params.get("q") or "").strip()
+        if len(q) < SEARCH_MIN_QUERY_LENGTH:
+            return Response(
+                {"detail": f"q debe tener al menos {SEARCH_MIN_QUERY_LENGTH} caracteres."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = int(request.query_params.get("limit", SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit debe ser un entero."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+        kinds = None
+        type_param = request.query_params.get("type")
+        if type_param:
+            kinds = [kind.strip() for kind in type_param.split(",") if kind.strip()]
+            valid = {search.KIND_PRODUCT, search.KIND_STORE, search.KIND_CATEGORY}
+            if not kinds or not set(kinds) <= valid:
+                return Response(
+                    {"detail": f"type debe ser uno o más de: {', '.join(sorted(valid))}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        if not search.is_available():
+            return Response(
+                {"detail": "La búsqueda no está disponible."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        return Response({"results": search.search(q, limit=limit, kinds=kinds)})
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.store'
+
+    def ready(self):
+        """Importa los signals cuando la app está lista."""
+        import apps.store.signals  # noqa
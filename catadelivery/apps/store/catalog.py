@@ -0,0 +1,125 @@
+"""
+Snapshot precalculado del catálogo de un store.
+
+Abrir un store en la app requería varias llamadas (``StoreViewSet``,
+``CategoryViewSet`` y ``ProductViewSet?store=``), cada una serializando
+``__all__`` desde cero aunque el menú cambie pocas veces al día.
+
+``get_body(get_version(store_id))`` devuelve un documento JSON compacto con
+el store, sus categorías y sus productos, ya renderizado a bytes y guardado
+en el cache.
+
+La versión vive en la base (``Store.catalog_version``): ``Store.save()`` la
+cambia y los signals de ``apps.store.signals`` la cambian al guardar o
+borrar un Product o una Category del store. El ETag y la clave del cache
+salen de esa versión, así que todos los workers ven el mismo ETag aunque
+cada uno tenga su propio cache, y un snapshot viejo nunca se vuelve a servir.
+
+Cada petición hace una sola consulta por clave primaria para leer la
+versión; la respuesta 304 a un ``If-None-Match`` no arma ni lee el snapshot.
+"""
+import json
+import time
+
+from django.core.cache import cache
+
+from .images import variant_urls
+from .models import Category, Product, Store
+
+CATALOG_CACHE_TTL = 24 * 3600
+
+
+def invalidate_store_catalog(*store_ids):
+    """Invalida el snapshot de los stores (cambia su ``catalog_version``)."""
+    Store.objects.filter(pk__in=store_ids).update(catalog_version=time.time_ns())
+
+
+def invalidate_category_catalogs(category_id):
+    """Invalida los snapshots de los stores con productos de la categoría."""
+    Store.objects.filter(product__category_id=category_id).update(catalog_version=time.time_ns())
+
+
+def _file_url(field):
+    return field.url if field else None
+
+
+def build_snapshot(store):
+    """Construye el documento del catálogo de *store* (2 consultas)."""
+    products = list(
+        Product.objects.filter(store=store)
+        .only("id", "name", "description", "price", "category_id", "photoProduct", "photo_variants")
+        .order_by("name")
+    )
+    category_ids = {product.category_id for product in products}
+    categories = Category.objects.filter(pk__in=category_ids).order_by("name")
+    return {
+        "store": {
+            "id": store.id,
+            "name": store.name,
+            "description": store.description,
+            "address": store.address,
+            "latitude": store.latitude,
+            "longitude": store.longitude,
+            "enabled": store.enabled,
+            "logo": _file_url(store.logo),
+            "logo_variants": variant_urls(store.logo_variants),
+        },
+        "categories": [{"id": c.id, "name": c.name} for c in categories],
+        "products": [
+            {
+                "id": p.id,
+                "name": p.name,
+                "description": p.description,
+                "price": p.price,
+                "category": p.category_id,
+                "photo": _file_url(p.photoProduct),
+                "photo_variants": variant_urls(p.photo_variants),
+            }
+            for p in products
+        ],
+    }
+
+
+def get_version(store_id):
+    """
+    Lee la versión vigente del catálogo o ``None`` si el store no existe.
+
+    Returns:
+        Dict con ``store_id``, ``version``, ``etag`` (entre comillas, listo
+        para el header), ``enabled`` y ``owner_id`` (para validar acceso).
+    """
+    row = (
+        Store.objects.filter(pk=store_id)
+        .values("catalog_version", "enabled", "userprofile_id")
+        .first()
+    )
+    if row is None:
+        return None
+    return {
+        "store_id": store_id,
+        "version": row["catalog_version"],
+        "etag": '"{}.{}"'.format(store_id, row["catalog_version"]),
+        "enabled": row["enabled"],
+        "owner_id": row["userprofile_id"],
+    }
+
+
+def get_body(version):
+    """
+    Devuelve el snapshot (bytes JSON) de la versión leída con
+    :func:`get_version`, armándolo si este proceso no lo tiene en cache;
+    ``None`` si el store se borró entretanto.
+    """
+    key = "catalog:{}:{}".format(version["store_id"], version["version"])
+    body = cache.get(key)
+    if body is not None:
+        return body
+
+    store = Store.objects.filter(pk=version["store_id"]).first()
+    if store is None:
+        return None
+    body = json.dumps(build_snapshot(store), separators=(",", ":")).encode()
+    # Si el store cambió mientras se armaba, el body es más nuevo que la
+    # versión (nunca más viejo): el cliente lo reemplaza con el ETag siguiente.
+    cache.set(key, body, CATALOG_CACHE_TTL)
+    return body
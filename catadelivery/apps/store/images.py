@@ -0,0 +1,234 @@
+"""
+Derivados redimensionados de ``Store.logo`` y ``Product.photoProduct``.
+
+Los originales aceptan hasta 10 MB y se servían tal cual a los teléfonos.
+El command ``generate_image_derivatives`` (en modo ``--daemon``) busca las
+filas cuya imagen cambió y genera, en su propio pool de procesos, versiones
+WebP y JPEG en tres tamaños (``thumb``, ``list`` y ``detail``; lado mayor en
+píxeles, sin agrandar imágenes chicas). El proceso web no genera nada: un
+pool dentro del worker competía por CPU con las peticiones.
+
+Los nombres de los derivados se guardan en ``Store.logo_variants`` y
+``Product.photo_variants``::
+
+    {"source": "product_logos/pan.png",
+     "thumb": {"webp": "derivatives/product_logos/pan/thumb.webp",
+               "jpg": "derivatives/product_logos/pan/thumb.jpg"},
+     "list": {...}, "detail": {...}}
+
+``source`` es el original del que salieron: si no coincide con la imagen
+actual la fila está pendiente (``pending_rows`` lo filtra en SQL), y si el
+campo cambia antes de que termine el trabajo, el resultado viejo se
+descarta. Mientras no hay derivados los serializers devuelven ``null`` y la
+app usa el original.
+
+Si un original no se puede procesar (archivo faltante o corrupto), se anota
+``"failed": {"source": ..., "attempts": n}`` junto a los derivados vigentes;
+tras ``IMAGE_DERIVATIVE_MAX_ATTEMPTS`` intentos la fila se deja de lado
+hasta que cambie la imagen.
+"""
+import logging
+import os
+from io import BytesIO
+
+import django
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, IntegerField, Q
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+# Claves de los derivados que no son tamaños.
+META_KEYS = ("source", "failed")
+
+# Por modelo: (campo de imagen, campo con los derivados, campo con el id del store).
+IMAGE_FIELDS = {
+    "store.Store": ("logo", "logo_variants", "id"),
+    "store.Product": ("photoProduct", "photo_variants", "store_id"),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, f"IMAGE_DERIVATIVE_{name}", default)
+
+
+def sizes():
+    return _setting("SIZES", {"thumb": 160, "list": 480, "detail": 1080})
+
+
+def workers():
+    return _setting("WORKERS", 2)
+
+
+def max_attempts():
+    return _setting("MAX_ATTEMPTS", 3)
+
+
+def _init_worker():
+    # Con "spawn" el proceso hijo no hereda Django configurado.
+    if not django_apps.ready:
+        django.setup()
+
+
+# ---------------------------------------------------------------------------
+# Generación (proceso hijo)
+# ---------------------------------------------------------------------------
+def derivative_name(source, size, ext):
+    root, _ = os.path.splitext(source)
+    return f"derivatives/{root}/{size}.{ext}"
+
+
+def render_derivatives(source):
+    """
+    Genera todos los derivados de *source* (nombre en ``default_storage``).
+
+    Returns:
+        Dict de variantes (ver docstring del módulo).
+    """
+    from PIL import Image, ImageOps
+
+    quality = _setting("QUALITY", 80)
+    with default_storage.open(source, "rb") as fh:
+        original = ImageOps.exif_transpose(Image.open(fh))
+        original.load()
+
+    variants = {"source": source}
+    for size, max_side in sizes().items():
+        image = original.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        variants[size] = {}
+        for ext, fmt in FORMATS.items():
+            out = image
+            if fmt == "JPEG" and out.mode != "RGB":
+                out = out.convert("RGB")
+            elif fmt == "WEBP" and out.mode not in ("RGB", "RGBA"):
+                out = out.convert("RGBA")
+            buffer = BytesIO()
+            out.save(buffer, fmt, quality=quality, optimize=True)
+            name = derivative_name(source, size, ext)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[size][ext] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+# ---------------------------------------------------------------------------
+# Resultado (proceso del command)
+# ---------------------------------------------------------------------------
+def _variant_names(variants):
+    return {
+        name
+        for size, formats in (variants or {}).items()
+        if size not in META_KEYS
+        for name in formats.values()
+    }
+
+
+def delete_variants(variants, keep=()):
+    """Borra del storage los archivos de *variants* que no estén en *keep*."""
+    for name in _variant_names(variants) - set(keep):
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning(f"⚠️ [IMAGES] No se pudo borrar {name}")
+
+
+def pending_rows(model, force=False):
+    """
+    ``(pk, imagen)`` de las filas con imagen cuyos derivados
+    faltan o salieron de otro original, sin las que ya agotaron los
+    intentos con la imagen actual. Todo el filtro corre en la base.
+    """
+    image_field, variants_field, _ = IMAGE_FIELDS[model._meta.label]
+    rows = model.objects.exclude(Q(**{f"{image_field}__isnull": True}) | Q(**{image_field: ""}))
+    if not force:
+        rows = (
+            rows.annotate(
+                done_source=KT(f"{variants_field}__source"),
+                failed_source=KT(f"{variants_field}__failed__source"),
+                failed_attempts=Cast(KT(f"{variants_field}__failed__attempts"), IntegerField()),
+            )
+            .exclude(done_source=F(image_field))
+            .exclude(failed_source=F(image_field), failed_attempts__gte=max_attempts())
+        )
+    return rows.values_list("pk", image_field)
+
+
+def record_failure(model, pk, source):
+    """
+    Anota un intento fallido con *source* en los derivados de la fila (si
+    su imagen sigue siendo esa) y devuelve el número de intentos.
+    """
+    image_field, variants_field, _ = IMAGE_FIELDS[model._meta.label]
+    rows = model.objects.filter(pk=pk, **{image_field: source})
+    row = rows.values(variants_field).first()
+    if row is None:
+        return 0
+    variants = dict(row[variants_field] or {})
+    failed = variants.get("failed") or {}
+    attempts = failed.get("attempts", 0) + 1 if failed.get("source") == source else 1
+    variants["failed"] = {"source": source, "attempts": attempts}
+    rows.update(**{variants_field: variants})
+    return attempts
+
+
+def save_variants(model, pk, variants):
+    """
+    Guarda *variants* en la fila si su original sigue siendo el actual.
+
+    Usa ``QuerySet.update()`` (sin signals ni ``save()``) e invalida el
+    snapshot del catálogo del store afectado.
+
+    Returns:
+        True si se guardó.
+    """
+    from .catalog import invalidate_store_catalog
+
+    image_field, variants_field, store_field = IMAGE_FIELDS[model._meta.label]
+    row = model.objects.filter(pk=pk).values(variants_field, store_field).first()
+    updated = model.objects.filter(pk=pk, **{image_field: variants["source"]}).update(
+        **{variants_field: variants}
+    )
+    if not updated:
+        # La fila se borró o la imagen cambió mientras se procesaba.
+        delete_variants(variants)
+        return False
+    delete_variants(row[variants_field], keep=_variant_names(variants))
+    invalidate_store_catalog(row[store_field])
+    return True
+
+
+def clear_removed(instance):
+    """
+    Borra los derivados de *instance* si se quitó su imagen.
+
+    Las imágenes nuevas o cambiadas no se procesan aquí: quedan pendientes
+    hasta la próxima pasada de ``generate_image_derivatives --daemon``.
+    """
+    model = type(instance)
+    image_field, variants_field, _ = IMAGE_FIELDS[model._meta.label]
+    variants = getattr(instance, variants_field) or {}
+    if not getattr(instance, image_field) and variants:
+        delete_variants(variants)
+        model.objects.filter(pk=instance.pk).update(**{variants_field: {}})
+
+
+def variant_urls(variants, request=None):
+    """``{tamaño: {formato: url}}`` para la API, o None si aún no hay derivados."""
+    if not variants or "source" not in variants:
+        return None
+    result = {}
+    for size, formats in variants.items():
+        if size in META_KEYS:
+            continue
+        result[size] = {}
+        for ext, name in formats.items():
+            url = default_storage.url(name)
+            result[size][ext] = request.build_absolute_uri(url) if request is not None else url
+    return result
@@ -0,0 +1,90 @@
+"""
+Management command para generar los derivados de logos y fotos.
+
+Uso:
+    python manage.py generate_image_derivatives
+    python manage.py generate_image_derivatives --force --workers 4
+
+    # Modo daemon: cada 30 segundos (+/- 10%), para las subidas nuevas
+    python manage.py generate_image_derivatives --daemon --interval 30
+
+Procesa las filas con imagen cuyos derivados faltan o salieron de otro
+original (``--force`` regenera todo, por ejemplo al cambiar los tamaños).
+Los originales que fallan ``IMAGE_DERIVATIVE_MAX_ATTEMPTS`` veces se dejan
+de lado hasta que cambie la imagen (ver ``images.record_failure``).
+Las vistas no generan derivados: el daemon es el que atiende las subidas.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from apps.store import images
+from apps.store.models import Product, Store
+from apps.users.management.scheduling import add_daemon_arguments, run_forever, timed
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Genera los derivados WebP/JPEG de Store.logo y Product.photoProduct."
+
+    def add_arguments(self, parser):
+        add_daemon_arguments(parser, default_interval=30)
+        parser.add_argument("--force", action="store_true", help="Regenera aunque ya existan.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=images.workers(),
+            help="Procesos (default IMAGE_DERIVATIVE_WORKERS).",
+        )
+
+    def handle(self, *args, **options):
+        # Un solo pool para todas las pasadas del daemon.
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=images._init_worker) as executor:
+            if options["daemon"]:
+                # --force solo tiene sentido en la primera pasada.
+                self.run_once(executor, options["force"])
+                run_forever(
+                    lambda: self.run_once(executor, False),
+                    options["interval"],
+                    options["jitter"],
+                    self.stdout,
+                )
+            else:
+                self.run_once(executor, options["force"])
+                self.stdout.write(self.style.SUCCESS("Derivados generados."))
+
+    def run_once(self, executor, force):
+        for model in (Store, Product):
+            (done, failed), elapsed_ms = timed(lambda: self.backfill(executor, model, force))
+            if done or failed:
+                self.stdout.write(
+                    f"  - {model._meta.label}: {done} generados, {failed} con error ({elapsed_ms:.0f} ms)"
+                )
+                logger.info(
+                    "[IMAGES] %s: %s generados, %s con error (%.0f ms)",
+                    model._meta.label, done, failed, elapsed_ms,
+                )
+
+    def backfill(self, executor, model, force):
+        futures = {}
+        for pk, source in images.pending_rows(model, force).iterator():
+            futures[executor.submit(images.render_derivatives, source)] = (pk, source)
+
+        done = failed = 0
+        for future in as_completed(futures):
+            pk, source = futures[future]
+            try:
+                if images.save_variants(model, pk, future.result()):
+                    done += 1
+            except Exception as e:  # noqa: BLE001
+                failed += 1
+                attempts = images.record_failure(model, pk, source)
+                self.stderr.write(f"    {model._meta.label} {pk}: {e} (intento {attempts})")
+                if attempts >= images.max_attempts():
+                    logger.error(
+                        f"❌ [IMAGES] {model._meta.label} {pk}: {source} falló {attempts} veces; "
+                        f"no se reintenta hasta que cambie la imagen."
+                    )
+        return done, failed
@@ -0,0 +1,28 @@
+"""
+Management command para reconstruir el índice de búsqueda del catálogo.
+
+Uso:
+    python manage.py rebuild_search_index
+
+Necesario una vez para los datos existentes, después de cargas con
+``bulk_create``/``QuerySet.update()`` (que no disparan signals) o si el
+índice queda desincronizado.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.store import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice FTS5 de productos, stores y categorías."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("El índice de búsqueda requiere SQLite (FTS5).")
+        counts = search.rebuild(batch_size=options["batch_size"])
+        for kind, count in counts.items():
+            self.stdout.write(f"  - {kind}: {count} filas indexadas")
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido."))
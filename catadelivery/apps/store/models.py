@@ -1,5 +1,8 @@
+import time
+
 from django.db import models
 
+from apps.common import geo
 from apps.users.models import UserProfile
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
@@ -17,6 +20,7 @@ class Store(models.Model):
     address = models.TextField()
     latitude = models.FloatField()
     longitude = models.FloatField()
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True, editable=False)
     enabled = models.BooleanField()
     logo = models.ImageField(
         upload_to="store_logos/",
@@ -27,6 +31,11 @@ class Store(models.Model):
         null=True,
         blank=True
     )
+    # Derivados redimensionados del logo (ver images.py).
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Versión del snapshot del catálogo (ver catalog.py): cambia en cada
+    # save() del store y al tocar sus productos o categorías.
+    catalog_version = models.BigIntegerField(default=0, editable=False)
     
     userprofile = models.ForeignKey(
         UserProfile, 
@@ -41,6 +50,15 @@ class Store(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        kwargs["update_fields"] = geo.with_geohash_update_fields(
+            self, kwargs.get("update_fields"), "latitude", "longitude", "geohash",
+        )
+        self.catalog_version = time.time_ns()
+        if kwargs["update_fields"] is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"catalog_version"}
+        super().save(*args, **kwargs)
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     
@@ -66,6 +84,8 @@ class Product(models.Model):
         null=True,
         blank=True
     )
+    # Derivados redimensionados de la foto (ver images.py).
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Product"
@@ -0,0 +1,174 @@
+"""
+Carga masiva de productos de un store (crear o actualizar en una sola
+petición).
+
+Actualizar un menú de 300 productos eran 300 peticiones a
+``ProductViewSet``, cada una validando la propiedad del store con su propia
+consulta. ``upsert_products`` recibe todas las filas de una vez:
+
+- Las filas se validan completas antes de escribir; si alguna tiene error
+  no se aplica nada.
+- Cada fila se empareja con un producto existente del store por ``id`` o,
+  si no trae ``id``, por nombre (sin distinguir mayúsculas). El diff se hace
+  en memoria y solo se escriben los productos que cambian.
+- Los cambios se aplican con ``bulk_create``/``bulk_update`` en una
+  transacción; el snapshot del catálogo se invalida y el índice de búsqueda
+  se actualiza una sola vez al final.
+
+Formato de cada fila (JSON o columnas del CSV)::
+
+    id (opcional), name, description, price, category
+"""
+import csv
+import math
+
+from django.db import transaction
+
+from . import search
+from .catalog import invalidate_store_catalog
+from .models import Category, Product
+
+UPSERT_FIELDS = ("name", "description", "price", "category_id")
+MAX_ROWS = 2000
+
+
+class UpsertError(Exception):
+    """Filas inválidas: ``errors`` es una lista ``[{"row", "error"}]``."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} fila(s) con error")
+        self.errors = errors
+
+
+def read_csv(fileobj):
+    """Filas de un CSV abierto en modo texto, como lista de dicts."""
+    return list(csv.DictReader(fileobj))
+
+
+def _clean_row(row, categories):
+    """Devuelve un dict con los campos normalizados o lanza ValueError."""
+    raw_id = row.get("id")
+    product_id = None
+    if raw_id not in (None, ""):
+        try:
+            product_id = int(raw_id)
+        except (TypeError, ValueError):
+            raise ValueError("id debe ser un entero.")
+
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("name es obligatorio.")
+    if len(name) > 100:
+        raise ValueError("name supera los 100 caracteres.")
+
+    price = row.get("price")
+    if price in (None, ""):
+        price = None
+    else:
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            raise ValueError("price debe ser un número.")
+        # float() acepta "nan" e "inf", que JSON no puede volver a serializar.
+        if not math.isfinite(price):
+            raise ValueError("price debe ser un número finito.")
+        if price < 0:
+            raise ValueError("price no puede ser negativo.")
+
+    try:
+        category_id = int(row.get("category"))
+    except (TypeError, ValueError):
+        raise ValueError("category debe ser el id de una categoría.")
+    if category_id not in categories:
+        raise ValueError(f"La categoría {category_id} no existe.")
+
+    return {
+        "id": product_id,
+        "name": name,
+        "description": str(row.get("description") or "").strip(),
+        "price": price,
+        "category_id": category_id,
+    }
+
+
+def upsert_products(store_id, rows):
+    """
+    Crea o actualiza los productos de *store_id* según *rows*.
+
+    Args:
+        store_id: Store destino (la propiedad se valida en la vista).
+        rows: Lista de dicts (JSON o ``read_csv``).
+
+    Returns:
+        Dict ``{"created", "updated", "unchanged", "ids"}``; ``ids`` son los
+        productos de cada fila, en el mismo orden.
+
+    Raises:
+        UpsertError: Si alguna fila es inválida (no se escribe nada).
+    """
+    if len(rows) > MAX_ROWS:
+        raise UpsertError([{"row": None, "error": f"Máximo {MAX_ROWS} filas por carga."}])
+
+    categories = set(Category.objects.values_list("id", flat=True))
+    existing = {p.id: p for p in Product.objects.filter(store_id=store_id)}
+    by_name = {p.name.casefold(): p for p in existing.values()}
+
+    errors = []
+    plan = []  # (producto existente o None, datos)
+    seen = set()
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "error": "Cada fila debe ser un objeto."})
+            continue
+        try:
+            data = _clean_row(row, categories)
+        except ValueError as e:
+            errors.append({"row": index, "error": str(e)})
+            continue
+        if data["id"] is not None:
+            product = existing.get(data["id"])
+            if product is None:
+                errors.append({"row": index, "error": f"El producto {data['id']} no pertenece al store."})
+                continue
+        else:
+            product = by_name.get(data["name"].casefold())
+        key = product.id if product else data["name"].casefold()
+        if key in seen:
+            errors.append({"row": index, "error": "Producto repetido en la carga."})
+            continue
+        seen.add(key)
+        plan.append((product, data))
+    if errors:
+        raise UpsertError(errors)
+
+    to_create, to_update, products = [], [], []
+    for product, data in plan:
+        if product is None:
+            product = Product(store_id=store_id, **{f: data[f] for f in UPSERT_FIELDS})
+            to_create.append(product)
+            products.append(product)
+            continue
+        products.append(product)
+        changed = False
+        for field in UPSERT_FIELDS:
+            if getattr(product, field) != data[field]:
+                setattr(product, field, data[field])
+                changed = True
+        if changed:
+            to_update.append(product)
+
+    with transaction.atomic():
+        # SQLite devuelve los pk de bulk_create.
+        Product.objects.bulk_create(to_create)
+        Product.objects.bulk_update(to_update, UPSERT_FIELDS, batch_size=500)
+        # bulk_create/bulk_update no disparan signals.
+        search.index_instances(to_create + to_update)
+        if to_create or to_update:
+            invalidate_store_catalog(store_id)
+
+    return {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "unchanged": len(plan) - len(to_create) - len(to_update),
+        "ids": [product.id for product in products],
+    }
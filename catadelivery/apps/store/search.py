@@ -0,0 +1,229 @@
+"""
+Índice de búsqueda de texto completo (SQLite FTS5) para el catálogo.
+
+Una sola tabla virtual ``store_search_fts`` indexa productos (nombre y
+descripción), stores (nombre y descripción) y categorías (nombre). Cada fila
+guarda el tipo, el id del objeto y el store al que pertenece (columnas
+``UNINDEXED``); el texto se tokeniza con ``unicode61`` sin acentos, así que
+"cafe" encuentra "Café".
+
+- Los signals de ``apps.store.signals`` mantienen el índice al guardar o
+  borrar; la escritura va en la misma transacción que el cambio del modelo.
+- ``rebuild_search_index`` reconstruye el índice completo.
+- ``search(q)`` ordena por ``bm25`` (el nombre pesa más que la descripción),
+  hace match por prefijo de cada palabra y solo devuelve resultados de
+  stores habilitados.
+
+La tabla no es un modelo de Django: se crea con ``ensure_index()`` después
+de ``migrate``, desde el command de reconstrucción y, por si acaso, la
+primera vez que se escribe en ella en cada proceso.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import Category, Product, Store
+
+TABLE = "store_search_fts"
+
+KIND_PRODUCT = "product"
+KIND_STORE = "store"
+KIND_CATEGORY = "category"
+
+MAX_QUERY_TERMS = 8
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_index_ready = False
+
+
+def is_available():
+    """FTS5 solo existe en SQLite."""
+    return connection.vendor == "sqlite"
+
+
+def ensure_index():
+    """Crea la tabla virtual si no existe."""
+    global _index_ready
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "kind UNINDEXED, obj_id UNINDEXED, store_id UNINDEXED, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    _index_ready = True
+
+
+# ---------------------------------------------------------------------------
+# Sincronización
+# ---------------------------------------------------------------------------
+def _product_row(product):
+    return (KIND_PRODUCT, product.pk, product.store_id, product.name, product.description or "")
+
+
+def _store_row(store):
+    return (KIND_STORE, store.pk, store.pk, store.name, store.description or "")
+
+
+def _category_row(category):
+    return (KIND_CATEGORY, category.pk, None, category.name, "")
+
+
+_ROW_BUILDERS = {
+    Product: (KIND_PRODUCT, _product_row),
+    Store: (KIND_STORE, _store_row),
+    Category: (KIND_CATEGORY, _category_row),
+}
+
+
+def _delete(cursor, kind, obj_id):
+    cursor.execute(f"DELETE FROM {TABLE} WHERE kind = %s AND obj_id = %s", [kind, obj_id])
+
+
+def index_instance(instance):
+    """Inserta o reemplaza la fila de *instance* (Product, Store o Category)."""
+    if not is_available():
+        return
+    if not _index_ready:
+        ensure_index()
+    kind, build_row = _ROW_BUILDERS[type(instance)]
+    with connection.cursor() as cursor:
+        _delete(cursor, kind, instance.pk)
+        cursor.execute(
+            f"INSERT INTO {TABLE} (kind, obj_id, store_id, title, body) VALUES (%s, %s, %s, %s, %s)",
+            build_row(instance),
+        )
+
+
+def index_instances(instances):
+    """
+    Como ``index_instance`` para muchas filas del mismo modelo (cargas con
+    ``bulk_create``/``bulk_update``, que no disparan signals).
+    """
+    if not instances or not is_available():
+        return
+    if not _index_ready:
+        ensure_index()
+    kind, build_row = _ROW_BUILDERS[type(instances[0])]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE kind = %s AND obj_id = %s",
+            [(kind, instance.pk) for instance in instances],
+        )
+        _insert_many(cursor, [build_row(instance) for instance in instances])
+
+
+def remove_instance(instance):
+    """Borra la fila de *instance* del índice."""
+    if not is_available():
+        return
+    if not _index_ready:
+        ensure_index()
+    kind, _ = _ROW_BUILDERS[type(instance)]
+    with connection.cursor() as cursor:
+        _delete(cursor, kind, instance.pk)
+
+
+def rebuild(batch_size=1000):
+    """
+    Reconstruye el índice completo en una transacción.
+
+    Returns:
+        Dict ``{tipo: filas indexadas}``.
+    """
+    ensure_index()
+    counts = {}
+    sources = [
+        (KIND_PRODUCT, Product.objects.only("id", "store_id", "name", "description"), _product_row),
+        (KIND_STORE, Store.objects.only("id", "name", "description"), _store_row),
+        (KIND_CATEGORY, Category.objects.all(), _category_row),
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        for kind, queryset, build_row in sources:
+            rows = []
+            counts[kind] = 0
+            for obj in queryset.iterator(chunk_size=batch_size):
+                rows.append(build_row(obj))
+                if len(rows) >= batch_size:
+                    counts[kind] += _insert_many(cursor, rows)
+                    rows = []
+            counts[kind] += _insert_many(cursor, rows)
+    return counts
+
+
+def _insert_many(cursor, rows):
+    if rows:
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (kind, obj_id, store_id, title, body) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Búsqueda
+# ---------------------------------------------------------------------------
+def build_match_expression(q):
+    """
+    Convierte el texto del usuario en una expresión FTS5 segura.
+
+    Cada palabra se cita (así los operadores de FTS5 se tratan como texto) y
+    se busca por prefijo; todas las palabras deben aparecer.
+    Devuelve ``""`` si no hay palabras.
+    """
+    terms = _TOKEN_RE.findall(q or "")[:MAX_QUERY_TERMS]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search(q, limit=20, kinds=None):
+    """
+    Busca *q* en el catálogo de stores habilitados.
+
+    Args:
+        q: Texto libre.
+        limit: Máximo de resultados.
+        kinds: Tipos a incluir (``product``, ``store``, ``category``);
+            None = todos.
+
+    Returns:
+        Lista de dicts ``{"type", "id", "store", "name"}`` ordenada por
+        relevancia.
+    """
+    expression = build_match_expression(q)
+    if not expression or not is_available():
+        return []
+    kinds = list(kinds or (KIND_PRODUCT, KIND_STORE, KIND_CATEGORY))
+
+    store_table = Store._meta.db_table
+    product_table = Product._meta.db_table
+    kind_placeholders = ", ".join(["%s"] * len(kinds))
+    # bm25 recibe un peso por columna (incluidas las UNINDEXED): el nombre
+    # pesa 10 veces más que la descripción.
+    sql = f"""
+        SELECT {TABLE}.kind, {TABLE}.obj_id, {TABLE}.store_id, {TABLE}.title,
+               bm25({TABLE}, 0, 0, 0, 10.0, 1.0) AS score
+        FROM {TABLE}
+        LEFT JOIN {store_table} AS s ON s.id = {TABLE}.store_id
+        WHERE {TABLE} MATCH %s
+          AND {TABLE}.kind IN ({kind_placeholders})
+          AND (
+            s.enabled = 1
+            OR ({TABLE}.kind = %s AND EXISTS (
+                SELECT 1 FROM {product_table} AS p
+                JOIN {store_table} AS ps ON ps.id = p.store_id
+                WHERE p.category_id = {TABLE}.obj_id AND ps.enabled = 1
+            ))
+          )
+        ORDER BY score
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [expression, *kinds, KIND_CATEGORY, limit])
+        rows = cursor.fetchall()
+    return [
+        {"type": kind, "id": obj_id, "store": store_id, "name": title}
+        for kind, obj_id, store_id, title, _score in rows
+    ]
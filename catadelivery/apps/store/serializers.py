@@ -1,14 +1,31 @@
 from rest_framework import serializers
 
+from . import images
 from .models import Category, Product, Store
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs de los derivados de una imagen (``null`` mientras se generan)."""
+
+    def to_representation(self, value):
+        return images.variant_urls(value, self.context.get("request"))
+
+
 class StoreSerializer(serializers.ModelSerializer):
+    logo_variants = ImageVariantsField()
+
     class Meta:
         model = Store
         fields = "__all__"
 
 
+class NearbyStoreSerializer(StoreSerializer):
+    """Store con la distancia y el costo de envío calculados para una dirección."""
+
+    distance_km = serializers.FloatField(read_only=True)
+    delivery_fee = serializers.FloatField(read_only=True)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -16,6 +33,8 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class ProductSerializer(serializers.ModelSerializer):
+    photo_variants = ImageVariantsField()
+
     class Meta:
         model = Product
         fields = "__all__"
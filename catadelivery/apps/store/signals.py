@@ -0,0 +1,80 @@
+"""
+Signals para los modelos del catálogo (Store, Category, Product).
+Invalidan el snapshot del catálogo (ver catalog.py), mantienen el índice de
+búsqueda (ver search.py) y limpian los derivados de imágenes (ver images.py)
+al guardar o borrar.
+"""
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import images, search
+from .catalog import invalidate_category_catalogs, invalidate_store_catalog
+from .models import Category, Product, Store
+
+
+@receiver(post_save, sender=Category)
+def invalidate_catalogs_on_category_change(sender, instance, created=False, **kwargs):
+    # Una categoría nueva no tiene productos; al borrarla se borran sus
+    # productos y cada uno invalida su store.
+    if not created:
+        invalidate_category_catalogs(instance.pk)
+
+
+@receiver(post_init, sender=Product)
+def remember_loaded_store(sender, instance, **kwargs):
+    """Recuerda el store con el que se cargó, para invalidar ambos si se mueve."""
+    instance._loaded_store_id = instance.__dict__.get("store_id")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_on_product_change(sender, instance, **kwargs):
+    loaded_store_id = getattr(instance, "_loaded_store_id", None)
+    if loaded_store_id and loaded_store_id != instance.store_id:
+        invalidate_store_catalog(instance.store_id, loaded_store_id)
+    else:
+        invalidate_store_catalog(instance.store_id)
+    instance._loaded_store_id = instance.store_id
+
+
+# ---------------------------------------------------------------------------
+# Índice de búsqueda
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Store)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+def index_catalog_instance(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_instance(instance)
+
+
+@receiver(post_delete, sender=Store)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def remove_catalog_instance(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using="default", **kwargs):
+    if sender.name == "apps.store":
+        search.ensure_index()
+
+
+# ---------------------------------------------------------------------------
+# Derivados de imágenes
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Store)
+@receiver(post_save, sender=Product)
+def clear_removed_image_derivatives(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    images.clear_removed(instance)
+
+
+@receiver(post_delete, sender=Store)
+@receiver(post_delete, sender=Product)
+def delete_image_derivatives(sender, instance, **kwargs):
+    _, variants_field, _ = images.IMAGE_FIELDS[sender._meta.label]
+    images.delete_variants(getattr(instance, variants_field))
@@ -1,16 +1,40 @@
-from django.contrib import admin
+import io
+
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.http import HttpResponse, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from import_export.admin import ImportExportModelAdmin
 from unfold.admin import ModelAdmin
+from unfold.decorators import action as unfold_action
 
-from .models import ClientAddress, MonthSubscription, RoleChangeRequest, UserProfile
+from .bulk_import import ImportReport, import_addresses, import_users
+from .models import ClientAddress, MonthSubscription, OutboxEmail, RoleChangeRequest, UserProfile
 from django.utils.translation import gettext_lazy as _
 
+# La vista del admin hashea en el proceso web (sin pool): lotes chicos para
+# no retener la transacción de SQLite. Las cargas grandes van por el command
+# ``import_users``.
+ADMIN_IMPORT_BATCH_SIZE = 50
+
 
 class BaseImportExportAdmin(ImportExportModelAdmin, ModelAdmin):
     pass
 
 
+class BulkImportForm(forms.Form):
+    users_file = forms.FileField(label="CSV de usuarios", required=False)
+    addresses_file = forms.FileField(label="CSV de direcciones", required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get("users_file") and not cleaned.get("addresses_file"):
+            raise forms.ValidationError("Debe subir al menos un archivo.")
+        return cleaned
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(BaseImportExportAdmin, UserAdmin):
     list_display = (
@@ -26,9 +50,77 @@ class UserProfileAdmin(BaseImportExportAdmin, UserAdmin):
     search_fields = ("username", "email", "first_name", "last_name")
     ordering = ("username",)
     fieldsets = UserAdmin.fieldsets + (
-        (_("Catadelivery"), {"fields": ("role", "is_available")}),
+        (_("Catadelivery"), {"fields": ("role", "is_available", "subscription_valid_until", "current_subscription")}),
     )
+    readonly_fields = ("subscription_valid_until", "current_subscription")
     add_fieldsets = UserAdmin.add_fieldsets + ((_("Catadelivery"), {"fields": ("role",)}),)
+    actions_list = ["bulk_import_link"]
+
+    @unfold_action(description="Importación masiva", url_path="bulk-import-link", permissions=["add"])
+    def bulk_import_link(self, request):
+        """Botón en la lista de usuarios hacia la vista de importación."""
+        return HttpResponseRedirect(reverse("admin:users_userprofile_bulk_import"))
+
+    def get_urls(self):
+        urls = [
+            path(
+                "bulk-import/",
+                self.admin_site.admin_view(self.bulk_import_view),
+                name="users_userprofile_bulk_import",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def bulk_import_view(self, request):
+        """
+        Importación masiva de usuarios y direcciones (ver bulk_import.py).
+        Si hay filas con error se descarga el reporte en CSV.
+
+        Corre en el proceso web sin pool de procesos; para miles de filas
+        usar ``python manage.py import_users``.
+        """
+        if not self.has_add_permission(request):
+            return HttpResponseRedirect(reverse("admin:users_userprofile_changelist"))
+
+        form = BulkImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            report = ImportReport()
+            users_file = form.cleaned_data.get("users_file")
+            addresses_file = form.cleaned_data.get("addresses_file")
+            if users_file:
+                import_users(
+                    io.TextIOWrapper(users_file.file, encoding="utf-8-sig"),
+                    batch_size=ADMIN_IMPORT_BATCH_SIZE,
+                    workers=1,
+                    report=report,
+                )
+            if addresses_file:
+                import_addresses(
+                    io.TextIOWrapper(addresses_file.file, encoding="utf-8-sig"),
+                    batch_size=ADMIN_IMPORT_BATCH_SIZE,
+                    report=report,
+                )
+
+            self.message_user(
+                request,
+                f"{report.created['users']} usuario(s) y {report.created['addresses']} dirección(es) importados, "
+                f"{len(report.errors)} fila(s) con error.",
+                messages.WARNING if report.errors else messages.SUCCESS,
+            )
+            if report.errors:
+                response = HttpResponse(content_type="text/csv")
+                response["Content-Disposition"] = 'attachment; filename="errores_importacion.csv"'
+                report.write_csv(response)
+                return response
+            return HttpResponseRedirect(reverse("admin:users_userprofile_changelist"))
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Importación masiva de usuarios",
+            "opts": self.model._meta,
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/users/userprofile/bulk_import.html", context)
 
 
 @admin.register(MonthSubscription)
@@ -116,6 +208,14 @@ class RoleChangeRequestAdmin(BaseImportExportAdmin):
     autocomplete_fields = ("user", "resolved_by")
 
 
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(ModelAdmin):
+    list_display = ("id", "subject", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "to")
+    readonly_fields = ("attempts", "last_error", "claimed_at", "created_at", "sent_at")
+
+
 admin.site.site_header = "Catadelivery"
 admin.site.site_title = "Catadelivery"
 admin.site.index_title = "Catadelivery administration"
\ No newline at end of file
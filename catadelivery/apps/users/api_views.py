@@ -1,10 +1,10 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.core.mail import send_mail
 from django.utils import timezone
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from apps.chat import live_position, location_trail
 from apps.store.serializers import StoreSerializer
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
@@ -13,6 +13,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework import permissions, serializers, viewsets, status
 from rest_framework.decorators import action
 
+from .mailer import enqueue_email
 from .models import ClientAddress, FCMToken, MonthSubscription, RoleChangeRequest, UserProfile
 from .serializers import (
     CatadeliveryTokenObtainPairSerializer,
@@ -37,7 +38,8 @@ class UserProfileViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = (
-            User.objects.prefetch_related("subscriptions", "addresses", "stores")
+            User.objects.select_related("current_subscription")
+            .prefetch_related("addresses", "stores")
             .order_by("-date_joined")
         )
         user = self.request.user
@@ -212,6 +214,30 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         user.last_location_update = timezone.now()
         user.save(update_fields=['current_latitude', 'current_longitude', 'last_location_update'])
 
+        # Guardar el fix en el recorrido histórico (MongoDB, con downsampling).
+        # Un fallo de Mongo no debe impedir la actualización de la posición.
+        try:
+            location_trail.record_location(
+                rider_id=user.id,
+                latitude=latitude,
+                longitude=longitude,
+                timestamp=user.last_location_update,
+            )
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"⚠️ [LOCATION UPDATE] No se pudo guardar el recorrido de {user.username}: {e}")
+
+        # Difundir la posición al cliente si el rider tiene un pedido en ruta
+        # (con throttle y deduplicación del lado del servidor).
+        try:
+            live_position.publish_rider_position(
+                rider_id=user.id,
+                latitude=latitude,
+                longitude=longitude,
+                timestamp=user.last_location_update,
+            )
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"⚠️ [LOCATION UPDATE] No se pudo difundir la posición de {user.username}: {e}")
+
         if prev_lat and prev_lon:
             logger.info(f"✅ [LOCATION UPDATE] Rider {user.username}: ({prev_lat:.4f}, {prev_lon:.4f}) → ({latitude:.4f}, {longitude:.4f})")
         else:
@@ -460,12 +486,11 @@ class ForgotPasswordView(GenericAPIView):
             f"{reset_url}\n\n"
             "If you did not request a password reset, you can ignore this email."
         )
-        send_mail(
+        # Se encola: el envío real lo hace send_outbox_emails en segundo plano.
+        enqueue_email(
             subject="Catadelivery password reset",
             message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[email],
-            fail_silently=False,
         )
         return Response({"detail": "Password reset email sent."})
 
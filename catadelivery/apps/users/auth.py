@@ -0,0 +1,68 @@
+"""
+Resolución cacheada de usuarios a partir de tokens JWT.
+
+Cada request autenticado pasa por ``JWTAuthentication.get_user``, que carga
+el ``UserProfile`` desde la base de datos, y el ``JWTAuthMiddleware`` del
+chat hace lo mismo en cada conexión WebSocket. Este módulo guarda el usuario
+resuelto en el cache de Django (``LocMemCache`` por proceso: LRU con TTL),
+de modo que un request autenticado en estado estable no hace consultas de
+autenticación. El objeto cacheado incluye ``role`` e ``is_available``, que
+son los campos que revisan las vistas.
+
+La entrada se indexa por ``user_id`` y se invalida al guardar o eliminar el
+``UserProfile`` (ver ``signals.py``), lo que incluye un cambio de
+contraseña o la desactivación de la cuenta. Las
+actualizaciones masivas con ``QuerySet.update()`` no disparan signals y
+deben llamar a ``invalidate_users`` explícitamente.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CACHE_TTL = getattr(settings, "USER_AUTH_CACHE_TTL", 300)
+
+
+def _cache_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def get_cached_user(validated_token):
+    """
+    Devuelve el usuario cacheado para *validated_token* o ``None``.
+
+    No toca la base de datos, por lo que es seguro llamarla desde código
+    asíncrono.
+    """
+    user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    user = cache.get(_cache_key(user_id))
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+def cache_user(validated_token, user) -> None:
+    """Guarda *user* (resuelto a partir de *validated_token*) en el cache."""
+    cache.set(_cache_key(user.pk), user, USER_CACHE_TTL)
+
+
+def invalidate_users(user_ids) -> None:
+    """Elimina del cache las entradas de los usuarios indicados."""
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` con resolución de usuario cacheada."""
+
+    def get_user(self, validated_token):
+        user = get_cached_user(validated_token)
+        if user is None:
+            # Valida existencia e is_active; solo se cachea si pasa.
+            user = super().get_user(validated_token)
+            cache_user(validated_token, user)
+        return user
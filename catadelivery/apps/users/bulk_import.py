@@ -0,0 +1,299 @@
+"""
+Importación masiva de usuarios (``UserProfile``) y direcciones (``ClientAddress``).
+
+Dar de alta una ciudad nueva implica registrar miles de clientes y riders.
+Por ``RegistrationView`` o por el import de import_export cada fila calcula
+un hash PBKDF2 en serie y hace su propio INSERT. Aquí:
+
+- Las filas se leen y validan en streaming (``csv.DictReader``); una fila
+  inválida se anota en el reporte de errores y no aborta el archivo.
+- Los hashes de contraseña de cada lote se calculan en un pool de procesos
+  (solo desde el command; la vista del admin hashea en el proceso web con
+  lotes chicos, sin hacer fork del worker ASGI).
+- Los inserts se hacen con ``bulk_create`` por lotes, cada lote en su
+  propia transacción. Si otra escritura gana la carrera de unicidad
+  (``IntegrityError``), el lote se reintenta fila por fila y solo las que
+  chocan quedan en el reporte.
+
+CSV de usuarios (``password`` obligatorio, ``role`` por defecto ``client``)::
+
+    username,email,first_name,last_name,phone_number,role,password
+
+CSV de direcciones (``username`` puede ser de un usuario existente)::
+
+    username,name,latitude,longitude,description
+
+Lo usan el command ``import_users`` y la vista de importación del admin.
+"""
+import csv
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps as django_apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from apps.common import geo
+
+from .models import ClientAddress, UserProfile
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class ImportReport:
+    """Resultado de una importación: filas creadas y errores por línea."""
+
+    def __init__(self):
+        self.created = {"users": 0, "addresses": 0}
+        self.errors = []
+
+    def add_error(self, source, line, message):
+        self.errors.append({"source": source, "line": line, "error": message})
+
+    def write_csv(self, fileobj):
+        writer = csv.DictWriter(fileobj, fieldnames=["source", "line", "error"])
+        writer.writeheader()
+        writer.writerows(self.errors)
+
+
+def _init_worker():
+    # Con "spawn" el proceso hijo no hereda Django configurado.
+    if not django_apps.ready:
+        django.setup()
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _errors_text(exc):
+    return "; ".join(exc.messages)
+
+
+def _insert_batch(model, rows, source, report, batch_size, conflict_message):
+    """
+    Inserta ``[(línea, objeto)]`` con ``bulk_create`` y devuelve cuántos
+    quedaron creados.
+
+    Ante un ``IntegrityError`` (otro proceso insertó el mismo username o
+    dirección entre la verificación y el insert) reintenta fila por fila,
+    cada una en su savepoint, y anota las que chocan con
+    ``conflict_message(objeto)``.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([obj for _, obj in rows], batch_size=batch_size)
+        return len(rows)
+    except IntegrityError:
+        pass
+
+    created = 0
+    for line, obj in rows:
+        # El bulk_create revertido pudo dejar asignado el pk.
+        obj.pk = None
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([obj])
+        except IntegrityError:
+            report.add_error(source, line, conflict_message(obj))
+        else:
+            created += 1
+    return created
+
+
+# ---------------------------------------------------------------------------
+# Usuarios
+# ---------------------------------------------------------------------------
+def _validate_user_row(row, seen_usernames):
+    """Devuelve ``(UserProfile sin guardar, password)`` o lanza ValidationError."""
+    username = (row.get("username") or "").strip()
+    email = (row.get("email") or "").strip()
+    role = (row.get("role") or UserProfile.Roles.CLIENT).strip()
+    password = row.get("password") or ""
+    phone_number = (row.get("phone_number") or "").strip() or None
+
+    if not username:
+        raise ValidationError("username es obligatorio.")
+    if username in seen_usernames:
+        raise ValidationError(f"username '{username}' repetido en el archivo.")
+    if role not in UserProfile.Roles.values:
+        raise ValidationError(f"role '{role}' inválido.")
+    if email:
+        validate_email(email)
+    if phone_number and len(phone_number) > 15:
+        raise ValidationError("phone_number supera los 15 caracteres.")
+    if not password:
+        raise ValidationError("password es obligatorio.")
+
+    user = UserProfile(
+        username=username,
+        email=email,
+        first_name=(row.get("first_name") or "").strip(),
+        last_name=(row.get("last_name") or "").strip(),
+        phone_number=phone_number,
+        role=role,
+    )
+    UserProfile._meta.get_field("username").run_validators(username)
+    validate_password(password, user=user)
+    return user, password
+
+
+def import_users(fileobj, batch_size=DEFAULT_BATCH_SIZE, workers=None, report=None):
+    """
+    Importa usuarios desde un CSV abierto en modo texto.
+
+    Args:
+        fileobj: Archivo CSV con encabezado.
+        batch_size: Filas por lote de hash + ``bulk_create``.
+        workers: Procesos para el hash de contraseñas (None = CPUs disponibles,
+            1 = sin pool).
+        report: ``ImportReport`` a completar (se crea uno si es None).
+
+    Returns:
+        El ``ImportReport``.
+    """
+    report = report or ImportReport()
+    seen_usernames = set()
+
+    def valid_rows():
+        # Línea 1 es el encabezado.
+        for line, row in enumerate(csv.DictReader(fileobj), start=2):
+            try:
+                user, password = _validate_user_row(row, seen_usernames)
+            except ValidationError as e:
+                report.add_error("users", line, _errors_text(e))
+                continue
+            seen_usernames.add(user.username)
+            yield line, user, password
+
+    executor = None
+    if workers != 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        for batch in _batches(valid_rows(), batch_size):
+            existing = set(
+                UserProfile.objects.filter(
+                    username__in=[user.username for _, user, _ in batch]
+                ).values_list("username", flat=True)
+            )
+            pending = []
+            for line, user, password in batch:
+                if user.username in existing:
+                    report.add_error("users", line, f"username '{user.username}' ya existe.")
+                else:
+                    pending.append((line, user, password))
+            if not pending:
+                continue
+
+            passwords = [password for _, _, password in pending]
+            if executor is not None:
+                hashes = executor.map(make_password, passwords, chunksize=max(1, len(passwords) // 32))
+            else:
+                hashes = map(make_password, passwords)
+            rows = []
+            for (line, user, _), hashed in zip(pending, hashes):
+                user.password = hashed
+                rows.append((line, user))
+
+            report.created["users"] += _insert_batch(
+                UserProfile, rows, "users", report, batch_size,
+                lambda user: f"username '{user.username}' ya existe.",
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Direcciones
+# ---------------------------------------------------------------------------
+def _validate_address_row(row):
+    """Devuelve ``(username, ClientAddress sin usuario)`` o lanza ValidationError."""
+    username = (row.get("username") or "").strip()
+    name = (row.get("name") or "").strip()
+    if not username:
+        raise ValidationError("username es obligatorio.")
+    if not name:
+        raise ValidationError("name es obligatorio.")
+    if len(name) > 120:
+        raise ValidationError("name supera los 120 caracteres.")
+    try:
+        latitude = float(row.get("latitude"))
+        longitude = float(row.get("longitude"))
+    except (TypeError, ValueError):
+        raise ValidationError("latitude y longitude deben ser números válidos.")
+    if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180):
+        raise ValidationError("Coordenadas fuera de rango.")
+    address = ClientAddress(
+        name=name,
+        latitude=latitude,
+        longitude=longitude,
+        description=(row.get("description") or "").strip(),
+        # bulk_create no pasa por save(): el geohash se calcula aquí.
+        geohash=geo.encode(latitude, longitude),
+    )
+    return username, address
+
+
+def import_addresses(fileobj, batch_size=DEFAULT_BATCH_SIZE, report=None):
+    """
+    Importa direcciones desde un CSV abierto en modo texto.
+
+    El usuario se busca por ``username`` (una consulta por lote); se respeta
+    la unicidad ``(user, name)`` contra la base y dentro del archivo.
+
+    Returns:
+        El ``ImportReport``.
+    """
+    report = report or ImportReport()
+    seen_pairs = set()
+
+    def valid_rows():
+        for line, row in enumerate(csv.DictReader(fileobj), start=2):
+            try:
+                username, address = _validate_address_row(row)
+            except ValidationError as e:
+                report.add_error("addresses", line, _errors_text(e))
+                continue
+            yield line, username, address
+
+    for batch in _batches(valid_rows(), batch_size):
+        user_ids = dict(
+            UserProfile.objects.filter(
+                username__in={username for _, username, _ in batch}
+            ).values_list("username", "id")
+        )
+        existing = set(
+            ClientAddress.objects.filter(user_id__in=user_ids.values()).values_list("user_id", "name")
+        )
+        rows = []
+        for line, username, address in batch:
+            user_id = user_ids.get(username)
+            if user_id is None:
+                report.add_error("addresses", line, f"username '{username}' no existe.")
+                continue
+            pair = (user_id, address.name)
+            if pair in existing or pair in seen_pairs:
+                report.add_error("addresses", line, f"La dirección '{address.name}' ya existe para '{username}'.")
+                continue
+            seen_pairs.add(pair)
+            address.user_id = user_id
+            rows.append((line, address))
+
+        if rows:
+            report.created["addresses"] += _insert_batch(
+                ClientAddress, rows, "addresses", report, batch_size,
+                lambda address: f"La dirección '{address.name}' ya existe para ese usuario.",
+            )
+    return report
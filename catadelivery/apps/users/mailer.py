@@ -0,0 +1,147 @@
+"""
+Cola de correos transaccionales (outbox).
+
+Antes ``ForgotPasswordView`` llamaba a ``send_mail`` de forma síncrona: un
+SMTP lento bloqueaba el worker durante todo el handshake TLS y una caída del
+servidor se convertía en un 500. Ahora el request solo encola el mensaje
+(``enqueue_email``) y un proceso en segundo plano (``send_outbox_emails``)
+los envía en lotes reutilizando una sola conexión, con reintentos y
+backoff exponencial.
+
+Funciona con cualquier ``EMAIL_BACKEND`` (smtp, locmem, filebased...), ya
+que usa ``get_connection()`` de Django.
+
+Varios procesos ``send_outbox_emails`` pueden correr a la vez: cada lote se
+reclama antes de enviarse (``claim_batch``), así un correo se entrega una
+sola vez. Si un proceso muere con filas reclamadas, vuelven a la cola
+cuando vence ``EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS``.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+BACKOFF_BASE_SECONDS = getattr(settings, "EMAIL_OUTBOX_BACKOFF_SECONDS", 30)
+BATCH_SIZE = getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 50)
+CLAIM_TIMEOUT_SECONDS = getattr(settings, "EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS", 600)
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """Encola un correo para envío en segundo plano y devuelve la fila creada."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+
+
+def _backoff(attempts):
+    """Espera antes del siguiente intento: base * 2^(intentos-1)."""
+    return timedelta(seconds=BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Reclama hasta *batch_size* correos listos para enviar y los devuelve.
+
+    Candidatos: pendientes con el reintento vencido y reclamados por un
+    proceso que no terminó dentro de ``CLAIM_TIMEOUT_SECONDS``. En
+    PostgreSQL ``skip_locked`` evita que dos procesos esperen por las mismas
+    filas; en cualquier motor el ``UPDATE`` condicionado al estado leído
+    (compare-and-swap) garantiza que cada fila la reclama un solo proceso.
+    """
+    now = timezone.now()
+    ready = Q(status=OutboxEmail.Status.PENDING, next_attempt_at__lte=now) | Q(
+        status=OutboxEmail.Status.SENDING,
+        claimed_at__lt=now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS),
+    )
+    claimed = []
+    with transaction.atomic():
+        candidates = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(ready)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        for email in candidates:
+            won = OutboxEmail.objects.filter(
+                pk=email.pk, status=email.status, claimed_at=email.claimed_at
+            ).update(status=OutboxEmail.Status.SENDING, claimed_at=now)
+            if won:
+                email.status = OutboxEmail.Status.SENDING
+                email.claimed_at = now
+                claimed.append(email)
+    return claimed
+
+
+def send_pending(batch_size=BATCH_SIZE, connection=None):
+    """
+    Envía los correos pendientes cuyo reintento ya venció; cada lote se
+    reclama con :func:`claim_batch` antes de enviarse.
+
+    Todos los mensajes del ciclo se envían por la misma conexión, que se abre
+    una sola vez. Cada fila queda como ``sent``, o se reprograma con backoff,
+    o pasa a ``failed`` al agotar ``MAX_ATTEMPTS``.
+
+    Returns:
+        Tupla (enviados, reprogramados, fallidos)
+    """
+    sent = retried = failed = 0
+    connection = connection or get_connection(fail_silently=False)
+
+    try:
+        connection.open()
+    except Exception as e:  # noqa: BLE001
+        # Sin conexión no hay nada que intentar en este ciclo.
+        logger.error(f"❌ [OUTBOX] No se pudo abrir la conexión de correo: {e}")
+        return sent, retried, failed
+
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+
+            for email in batch:
+                email.attempts += 1
+                try:
+                    EmailMessage(
+                        subject=email.subject,
+                        body=email.body,
+                        from_email=email.from_email,
+                        to=email.to,
+                        connection=connection,
+                    ).send()
+                except Exception as e:  # noqa: BLE001
+                    email.last_error = str(e)
+                    if email.attempts >= MAX_ATTEMPTS:
+                        email.status = OutboxEmail.Status.FAILED
+                        failed += 1
+                        logger.error(f"❌ [OUTBOX] Correo #{email.pk} descartado tras {email.attempts} intentos: {e}")
+                    else:
+                        email.status = OutboxEmail.Status.PENDING
+                        email.next_attempt_at = timezone.now() + _backoff(email.attempts)
+                        retried += 1
+                        logger.warning(f"⚠️ [OUTBOX] Correo #{email.pk} reprogramado (intento {email.attempts}): {e}")
+                else:
+                    email.status = OutboxEmail.Status.SENT
+                    email.sent_at = timezone.now()
+                    email.last_error = ""
+                    sent += 1
+                email.claimed_at = None
+                email.save(update_fields=[
+                    "attempts", "status", "sent_at", "last_error", "next_attempt_at", "claimed_at",
+                ])
+    finally:
+        connection.close()
+
+    return sent, retried, failed
@@ -4,18 +4,18 @@ Management command para expirar suscripciones vencidas automáticamente.
 Uso:
     python manage.py expire_subscriptions
 
-Configurar como tarea periódica con cron:
+    # Modo daemon: se ejecuta cada 5 minutos (+/- 10%) sin depender de cron
+    python manage.py expire_subscriptions --daemon --interval 300 --jitter 0.1
+
+También puede seguir configurándose como tarea periódica con cron:
     # Ejecutar cada hora
     0 * * * * cd /path/to/project && python manage.py expire_subscriptions
-
-    # Ejecutar cada 30 minutos
-    */30 * * * * cd /path/to/project && python manage.py expire_subscriptions
 """
 import logging
 
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 
+from apps.users.management.scheduling import add_daemon_arguments, run_forever, timed
 from apps.users.models import MonthSubscription
 
 logger = logging.getLogger(__name__)
@@ -27,31 +27,29 @@ class Command(BaseCommand):
         "También desactiva la disponibilidad (is_available) de los usuarios afectados."
     )
 
+    def add_arguments(self, parser):
+        add_daemon_arguments(parser, default_interval=300)
+
     def handle(self, *args, **options):
-        now = timezone.now()
-        expired = MonthSubscription.objects.filter(
-            status=MonthSubscription.Status.ACTIVE,
-            expires_at__lt=now,
-        ).select_related("user")
-
-        count = expired.count()
-        if count == 0:
-            self.stdout.write("No hay suscripciones por expirar.")
-            return
+        if options["daemon"]:
+            run_forever(self.run_once, options["interval"], options["jitter"], self.stdout)
+        else:
+            self.run_once()
 
-        self.stdout.write(f"Se encontraron {count} suscripciones vencidas. Procesando...")
+    def run_once(self):
+        (expired, deactivated), elapsed_ms = timed(MonthSubscription.expire_overdue)
 
-        for subscription in expired:
-            subscription.expire()
-            self.stdout.write(
-                f"  - {subscription.user.username}: suscripción expirada "
-                f"(vencida el {subscription.expires_at:%Y-%m-%d %H:%M})"
-            )
-            logger.info(
-                "[EXPIRE_SUBSCRIPTIONS] Usuario %s: suscripción expirada",
-                subscription.user.username,
-            )
+        if expired == 0:
+            self.stdout.write(f"No hay suscripciones por expirar ({elapsed_ms:.0f} ms).")
+            return
 
         self.stdout.write(self.style.SUCCESS(
-            f"Proceso completado. {count} suscripciones expiradas."
+            f"Proceso completado en {elapsed_ms:.0f} ms. "
+            f"{expired} suscripciones expiradas, {deactivated} usuarios desactivados."
         ))
+        logger.info(
+            "[EXPIRE_SUBSCRIPTIONS] %s suscripciones expiradas, %s usuarios desactivados (%.0f ms)",
+            expired,
+            deactivated,
+            elapsed_ms,
+        )
@@ -0,0 +1,80 @@
+"""
+Management command para importar usuarios y direcciones en masa desde CSV.
+
+Uso:
+    python manage.py import_users --users usuarios.csv
+    python manage.py import_users --users usuarios.csv --addresses direcciones.csv \
+        --workers 8 --batch-size 1000 --report errores.csv
+
+Ver ``apps/users/bulk_import.py`` para el formato de los archivos.
+"""
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.bulk_import import DEFAULT_BATCH_SIZE, ImportReport, import_addresses, import_users
+from apps.users.management.scheduling import timed
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Importa UserProfile y ClientAddress desde CSV con hash de contraseñas en paralelo."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", help="CSV de usuarios.")
+        parser.add_argument("--addresses", help="CSV de direcciones.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Filas por lote (default {DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Procesos para el hash de contraseñas (default: CPUs disponibles).",
+        )
+        parser.add_argument(
+            "--report",
+            help="Ruta del CSV de errores (default: stdout).",
+        )
+
+    def handle(self, *args, **options):
+        if not options["users"] and not options["addresses"]:
+            raise CommandError("Debe indicar --users y/o --addresses.")
+
+        report = ImportReport()
+
+        def run():
+            if options["users"]:
+                with open(options["users"], newline="", encoding="utf-8-sig") as fp:
+                    import_users(fp, options["batch_size"], options["workers"], report)
+            if options["addresses"]:
+                with open(options["addresses"], newline="", encoding="utf-8-sig") as fp:
+                    import_addresses(fp, options["batch_size"], report)
+
+        _, elapsed_ms = timed(run)
+
+        if report.errors:
+            if options["report"]:
+                with open(options["report"], "w", newline="", encoding="utf-8") as fp:
+                    report.write_csv(fp)
+                self.stdout.write(f"Reporte de errores guardado en {options['report']}.")
+            else:
+                report.write_csv(sys.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación completada en {elapsed_ms:.0f} ms: "
+            f"{report.created['users']} usuarios, {report.created['addresses']} direcciones, "
+            f"{len(report.errors)} filas con error."
+        ))
+        logger.info(
+            "[IMPORT_USERS] %s usuarios, %s direcciones, %s errores (%.0f ms)",
+            report.created["users"],
+            report.created["addresses"],
+            len(report.errors),
+            elapsed_ms,
+        )
@@ -0,0 +1,138 @@
+"""
+Management command para purgar datos que crecen sin límite.
+
+- Tokens de ``token_blacklist`` (outstanding y blacklisted) ya vencidos: con
+  ``ROTATE_REFRESH_TOKENS`` y ``BLACKLIST_AFTER_ROTATION`` cada refresh agrega
+  filas en ambas tablas.
+- ``FCMToken`` marcados con ``is_active=False`` por ``_deactivate_token``.
+- Correos de la cola (``OutboxEmail``) ya enviados o fallidos.
+
+Borra en lotes de tamaño acotado, cada uno en su propia transacción, para no
+retener locks de escritura largos (SQLite bloquea toda la base al escribir).
+
+Uso:
+    python manage.py purge_stale_data
+    python manage.py purge_stale_data --chunk-size 500 --fcm-days 7
+
+    # Modo daemon: cada 6 horas (+/- 10%)
+    python manage.py purge_stale_data --daemon --interval 21600
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from apps.users.management.scheduling import add_daemon_arguments, run_forever, timed
+from apps.users.models import FCMToken, OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def delete_in_chunks(queryset, chunk_size, pause=0.0):
+    """
+    Borra las filas de *queryset* en lotes de *chunk_size* por PK.
+
+    Cada ``DELETE`` es una transacción corta (autocommit). Devuelve la
+    cantidad de filas del modelo del queryset que se borraron.
+    """
+    model = queryset.model
+    total = 0
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return total
+        _, per_model = model.objects.filter(pk__in=pks).delete()
+        total += per_model.get(model._meta.label, 0)
+        if pause:
+            time.sleep(pause)
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina en lotes los tokens JWT vencidos, los tokens FCM inactivos "
+        "y los correos ya procesados de la cola."
+    )
+
+    def add_arguments(self, parser):
+        add_daemon_arguments(parser, default_interval=6 * 3600)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Filas por lote de borrado (default 1000).",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Segundos de pausa entre lotes para dejar pasar otras escrituras (default 0.05).",
+        )
+        parser.add_argument(
+            "--fcm-days",
+            type=int,
+            default=7,
+            help="Días que se conserva un token FCM inactivo antes de borrarlo (default 7).",
+        )
+        parser.add_argument(
+            "--outbox-days",
+            type=int,
+            default=30,
+            help="Días que se conservan los correos enviados o fallidos (default 30).",
+        )
+
+    def handle(self, *args, **options):
+        if options["daemon"]:
+            run_forever(
+                lambda: self.run_once(options),
+                options["interval"],
+                options["jitter"],
+                self.stdout,
+            )
+        else:
+            self.run_once(options)
+
+    def run_once(self, options):
+        purged, elapsed_ms = timed(lambda: self.purge(options))
+
+        for table, count in purged.items():
+            self.stdout.write(f"  - {table}: {count} filas eliminadas")
+        self.stdout.write(self.style.SUCCESS(
+            f"Purga completada en {elapsed_ms:.0f} ms. {sum(purged.values())} filas eliminadas."
+        ))
+        logger.info("[PURGE] %s (%.0f ms)", purged, elapsed_ms)
+
+    def purge(self, options):
+        now = timezone.now()
+        chunk_size = options["chunk_size"]
+        pause = options["pause"]
+
+        expired_outstanding = OutstandingToken.objects.filter(expires_at__lt=now)
+        return {
+            # Primero los blacklisted para contarlos por separado (si no, se
+            # borrarían en cascada con su outstanding).
+            "token_blacklist_blacklistedtoken": delete_in_chunks(
+                BlacklistedToken.objects.filter(token__expires_at__lt=now), chunk_size, pause
+            ),
+            "token_blacklist_outstandingtoken": delete_in_chunks(
+                expired_outstanding, chunk_size, pause
+            ),
+            "users_fcmtoken": delete_in_chunks(
+                FCMToken.objects.filter(
+                    is_active=False,
+                    updated_at__lt=now - timedelta(days=options["fcm_days"]),
+                ),
+                chunk_size,
+                pause,
+            ),
+            "users_outboxemail": delete_in_chunks(
+                OutboxEmail.objects.filter(
+                    status__in=[OutboxEmail.Status.SENT, OutboxEmail.Status.FAILED],
+                    created_at__lt=now - timedelta(days=options["outbox_days"]),
+                ),
+                chunk_size,
+                pause,
+            ),
+        }
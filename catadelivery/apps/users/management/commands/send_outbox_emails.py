@@ -0,0 +1,44 @@
+"""
+Management command que envía los correos encolados en ``OutboxEmail``.
+
+Uso:
+    python manage.py send_outbox_emails
+
+    # Modo daemon: revisa la cola cada 10 segundos
+    python manage.py send_outbox_emails --daemon --interval 10
+"""
+import logging
+
+from django.core.management.base import BaseCommand
+
+from apps.users.mailer import send_pending
+from apps.users.management.scheduling import add_daemon_arguments, run_forever, timed
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Envía los correos pendientes de la cola (outbox) por una sola conexión."
+
+    def add_arguments(self, parser):
+        add_daemon_arguments(parser, default_interval=10)
+
+    def handle(self, *args, **options):
+        if options["daemon"]:
+            run_forever(self.run_once, options["interval"], options["jitter"], self.stdout)
+        else:
+            self.run_once()
+
+    def run_once(self):
+        (sent, retried, failed), elapsed_ms = timed(send_pending)
+        if sent or retried or failed:
+            self.stdout.write(
+                f"{sent} enviados, {retried} reprogramados, {failed} fallidos ({elapsed_ms:.0f} ms)."
+            )
+            logger.info(
+                "[OUTBOX] %s enviados, %s reprogramados, %s fallidos (%.0f ms)",
+                sent,
+                retried,
+                failed,
+                elapsed_ms,
+            )
@@ -0,0 +1,29 @@
+"""
+Management command para recalcular el estado de suscripción desnormalizado
+(``subscription_valid_until`` y ``current_subscription``) de los usuarios.
+
+Uso:
+    python manage.py sync_subscription_state
+
+Necesario una vez después de agregar los campos (backfill) o si se modificaron
+suscripciones con ``QuerySet.update()``, que no pasa por ``MonthSubscription.save``.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Recalcula subscription_valid_until y current_subscription de riders y stores."
+
+    def handle(self, *args, **options):
+        users = UserProfile.objects.filter(
+            role__in=[UserProfile.Roles.RIDER, UserProfile.Roles.STORE],
+        )
+        count = 0
+        for user in users.iterator():
+            user.sync_subscription_state()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Estado de suscripción recalculado para {count} usuarios."
+        ))
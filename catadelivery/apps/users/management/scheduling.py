@@ -0,0 +1,68 @@
+"""
+Planificador en proceso para management commands con modo ``--daemon``.
+
+Permite correr tareas periódicas sin depender de cron: ejecuta la tarea,
+reporta cuántas filas cambió y cuánto tardó, y duerme el intervalo
+configurado con un jitter aleatorio para que varias instancias no
+coincidan en el mismo instante.
+"""
+import logging
+import random
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def add_daemon_arguments(parser, default_interval):
+    """Agrega ``--daemon``, ``--interval`` y ``--jitter`` a un command."""
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Ejecutar de forma periódica en este proceso en lugar de una sola vez.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=default_interval,
+        help=f"Segundos entre ejecuciones en modo daemon (default {default_interval}).",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.1,
+        help="Fracción aleatoria (+/-) aplicada al intervalo (default 0.1).",
+    )
+
+
+def timed(task):
+    """Ejecuta *task* y devuelve ``(resultado, milisegundos)``."""
+    started = time.monotonic()
+    result = task()
+    return result, (time.monotonic() - started) * 1000
+
+
+def run_forever(task, interval, jitter, stdout=None):
+    """
+    Ejecuta *task* cada *interval* segundos (+/- *jitter*) hasta Ctrl+C.
+
+    Los errores de una ejecución se registran y no detienen el daemon.
+    """
+    logger.info("[DAEMON] Iniciado (intervalo %.0fs, jitter %.0f%%)", interval, jitter * 100)
+    try:
+        while True:
+            # Descartar conexiones caídas o vencidas entre ejecuciones.
+            close_old_connections()
+            try:
+                task()
+            except Exception:  # noqa: BLE001
+                logger.exception("[DAEMON] Error en la ejecución periódica")
+            finally:
+                close_old_connections()
+            delay = max(0.0, interval * (1 + random.uniform(-jitter, jitter)))
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        if stdout is not None:
+            stdout.write("Daemon detenido.")
+        logger.info("[DAEMON] Detenido")
@@ -1,11 +1,13 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import FileExtensionValidator
 import calendar
 
+from apps.common import geo
+
 
 class UserProfile(AbstractUser):
     """Custom user model with role management for Catadelivery."""
@@ -49,6 +51,32 @@ class UserProfile(AbstractUser):
         blank=True,
         help_text=_("Última vez que el rider actualizó su ubicación"),
     )
+    current_geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        default="",
+        db_index=True,
+        editable=False,
+        help_text=_("Geohash de la posición actual del rider (se calcula al guardar)"),
+    )
+
+    # Estado de suscripción desnormalizado (lo mantiene MonthSubscription.save)
+    subscription_valid_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_("Vencimiento de la suscripción activa más lejana (vacío si no hay ninguna)"),
+    )
+    current_subscription = models.ForeignKey(
+        "MonthSubscription",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+        help_text=_("Suscripción más relevante: activa, pendiente o la más reciente"),
+    )
 
     class Meta:
         verbose_name = "Usuario"
@@ -57,6 +85,13 @@ class UserProfile(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        kwargs["update_fields"] = geo.with_geohash_update_fields(
+            self, kwargs.get("update_fields"),
+            "current_latitude", "current_longitude", "current_geohash",
+        )
+        super().save(*args, **kwargs)
+
     @property
     def is_client(self):
         return self.role == self.Roles.CLIENT
@@ -71,16 +106,27 @@ class UserProfile(AbstractUser):
 
     def has_active_subscription(self):
         """Verifica si el usuario tiene una suscripción activa y vigente."""
-        return self.subscriptions.filter(
-            status=MonthSubscription.Status.ACTIVE,
-            expires_at__gte=timezone.now(),
-        ).exists()
+        return (
+            self.subscription_valid_until is not None
+            and self.subscription_valid_until >= timezone.now()
+        )
 
     def get_current_subscription(self):
         """
         Retorna la suscripción más relevante:
         1. Activa y vigente  2. Pendiente  3. La más reciente
         """
+        current = self.current_subscription
+        if (
+            current is not None
+            and current.status == MonthSubscription.Status.ACTIVE
+            and not current.is_vigent
+        ):
+            # Venció por tiempo y aún no pasó expire_subscriptions.
+            return self._compute_current_subscription()
+        return current
+
+    def _compute_current_subscription(self):
         return (
             self.subscriptions.filter(
                 status=MonthSubscription.Status.ACTIVE,
@@ -92,6 +138,20 @@ class UserProfile(AbstractUser):
             or self.subscriptions.first()
         )
 
+    def sync_subscription_state(self, save=True):
+        """
+        Recalcula ``subscription_valid_until`` y ``current_subscription``
+        a partir de las suscripciones del usuario.
+        """
+        valid_until = self.subscriptions.filter(
+            status=MonthSubscription.Status.ACTIVE,
+            expires_at__gte=timezone.now(),
+        ).aggregate(models.Max("expires_at"))["expires_at__max"]
+        self.subscription_valid_until = valid_until
+        self.current_subscription = self._compute_current_subscription()
+        if save:
+            self.save(update_fields=["subscription_valid_until", "current_subscription"])
+
     def clean(self):
         super().clean()
         if (
@@ -153,6 +213,12 @@ class MonthSubscription(models.Model):
         date = self.created_at.strftime("%Y-%m-%d") if self.created_at else "nueva"
         return f"{self.user.username} - {self.get_status_display()} ({date})"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Mantener el estado desnormalizado del usuario (approve/reject/expire,
+        # acciones del admin, comprobantes subidos, etc.).
+        self.user.sync_subscription_state()
+
     @property
     def is_vigent(self):
         """True si la suscripción está activa y no ha vencido."""
@@ -175,10 +241,73 @@ class MonthSubscription(models.Model):
         self.status = self.Status.REJECTED
         self.save(update_fields=["status"])
 
+    @classmethod
+    def expire_overdue(cls, now=None):
+        """
+        Versión masiva de ``expire()`` en SQL por conjuntos.
+
+        1. Un UPDATE marca como vencidas las suscripciones activas ya vencidas.
+        2. Un UPDATE pone ``is_available=False`` a riders/stores que se
+           quedaron sin ninguna suscripción vigente.
+        3. Un UPDATE recalcula el estado desnormalizado de los usuarios afectados.
+
+        ``QuerySet.update()`` no dispara signals, así que el cache de
+        autenticación de esos usuarios se invalida explícitamente.
+
+        Returns:
+            Tupla (suscripciones_expiradas, usuarios_desactivados)
+        """
+        from .auth import invalidate_users
+
+        now = now or timezone.now()
+        overdue = cls.objects.filter(status=cls.Status.ACTIVE, expires_at__lt=now)
+
+        with transaction.atomic():
+            user_ids = list(overdue.values_list("user_id", flat=True).distinct())
+            if not user_ids:
+                return 0, 0
+            expired_count = overdue.update(status=cls.Status.EXPIRED)
+
+            vigent = cls.objects.filter(
+                user=models.OuterRef("pk"),
+                status=cls.Status.ACTIVE,
+                expires_at__gte=now,
+            )
+            deactivated_count = UserProfile.objects.filter(
+                pk__in=user_ids,
+                role__in=[UserProfile.Roles.RIDER, UserProfile.Roles.STORE],
+                is_available=True,
+            ).exclude(models.Exists(vigent)).update(is_available=False)
+
+            # Misma prioridad que get_current_subscription(): vigente, pendiente, más reciente.
+            current = (
+                cls.objects.filter(user=models.OuterRef("pk"))
+                .annotate(
+                    rank=models.Case(
+                        models.When(status=cls.Status.ACTIVE, expires_at__gte=now, then=0),
+                        models.When(status=cls.Status.PENDING, then=1),
+                        default=2,
+                        output_field=models.IntegerField(),
+                    )
+                )
+                .order_by("rank", "-created_at")
+                .values("pk")[:1]
+            )
+            UserProfile.objects.filter(pk__in=user_ids).update(
+                subscription_valid_until=models.Subquery(
+                    vigent.order_by("-expires_at").values("expires_at")[:1]
+                ),
+                current_subscription=models.Subquery(current),
+            )
+
+        invalidate_users(user_ids)
+        return expired_count, deactivated_count
+
     def expire(self):
         """Marca como vencida y fuerza is_available=False si no hay otra vigente."""
         self.status = self.Status.EXPIRED
         self.save(update_fields=["status"])
+        # save() ya sincronizó subscription_valid_until: la verificación no consulta la BD.
         if self.user.role in {UserProfile.Roles.RIDER, UserProfile.Roles.STORE}:
             if not self.user.has_active_subscription() and self.user.is_available:
                 self.user.is_available = False
@@ -195,6 +324,7 @@ class ClientAddress(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     description = models.TextField()
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True, editable=False)
 
     class Meta:
         verbose_name = "Dirección"
@@ -204,6 +334,12 @@ class ClientAddress(models.Model):
     def __str__(self):
         return f"{self.name} ({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        kwargs["update_fields"] = geo.with_geohash_update_fields(
+            self, kwargs.get("update_fields"), "latitude", "longitude", "geohash",
+        )
+        super().save(*args, **kwargs)
+
 
 class RoleChangeRequest(models.Model):
     """Stores admin-facing notifications when a client wants extended privileges."""
@@ -295,4 +431,50 @@ class FCMToken(models.Model):
         ordering = ["-updated_at"]
 
     def __str__(self):
-        return f"{self.user.username} - {self.platform} ({self.token[:20]}...)"
\ No newline at end of file
+        return f"{self.user.username} - {self.platform} ({self.token[:20]}...)"
+
+
+class OutboxEmail(models.Model):
+    """
+    Correo transaccional encolado. Los requests solo insertan la fila; el
+    command ``send_outbox_emails`` los envía en lotes por una sola conexión.
+    Antes de enviar, cada fila se reclama (``sending`` + ``claimed_at``) para
+    que dos procesos no entreguen el mismo correo.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pendiente")
+        SENDING = "sending", _("Enviando")
+        SENT = "sent", _("Enviado")
+        FAILED = "failed", _("Fallido")
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(help_text="Lista de destinatarios")
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Cuándo un proceso reclamó el correo para enviarlo",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Correo en cola"
+        verbose_name_plural = "Correos en cola"
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_next_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.get_status_display()})"
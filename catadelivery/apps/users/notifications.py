@@ -263,8 +263,10 @@ class FCMNotificationService:
         Marca un token como inactivo cuando falla el envío.
         """
         try:
+            from django.utils import timezone
             from .models import FCMToken
-            FCMToken.objects.filter(token=token).update(is_active=False)
+            # updated_at marca desde cuándo está inactivo (lo usa purge_stale_data)
+            FCMToken.objects.filter(token=token).update(is_active=False, updated_at=timezone.now())
             logger.info(f"ℹ️ [FCM] Token desactivado: {token[:20]}...")
         except Exception as e:
             logger.error(f"❌ [FCM] Error al desactivar token: {str(e)}")
@@ -0,0 +1,26 @@
+"""
+Signals para los modelos UserProfile y MonthSubscription.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import invalidate_users
+from .models import MonthSubscription, UserProfile
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Invalida el usuario cacheado por la autenticación JWT al guardarlo o eliminarlo."""
+    invalidate_users([instance.pk])
+
+
+@receiver(post_delete, sender=MonthSubscription)
+def sync_subscription_state_on_delete(sender, instance, **kwargs):
+    """Recalcula el estado de suscripción desnormalizado al eliminar una suscripción."""
+    try:
+        user = UserProfile.objects.get(pk=instance.user_id)
+    except UserProfile.DoesNotExist:
+        # Borrado en cascada del propio usuario.
+        return
+    user.sync_subscription_state()
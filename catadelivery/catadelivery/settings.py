@@ -147,9 +147,16 @@ STATICFILES_DIRS = [BASE_DIR / "static"] if (BASE_DIR / "static").exists() else
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Derivados de logos y fotos de productos (apps/store/images.py); los genera
+# `python manage.py generate_image_derivatives --daemon`.
+IMAGE_DERIVATIVE_SIZES = {"thumb": 160, "list": 480, "detail": 1080}  # lado mayor en px
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get("IMAGE_DERIVATIVE_WORKERS", 2))
+IMAGE_DERIVATIVE_MAX_ATTEMPTS = 3          # luego se espera a que cambie la imagen
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "apps.users.auth.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
@@ -164,6 +171,23 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
 }
 
+# Cache por proceso (LRU con TTL). Lo usa, entre otros, la resolución de
+# usuarios de la autenticación JWT (apps/users/auth.py).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catadelivery",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # Cache compartido entre procesos daphne; con CHANNEL_REDIS_URL (ver
+    # Django Channels, más abajo) pasa a ser Redis.
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catadelivery-shared",
+    },
+}
+USER_AUTH_CACHE_TTL = 300
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Catadelivery API",
     "DESCRIPTION": "API documentation for Catadelivery platform.",
@@ -179,6 +203,11 @@ EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
 EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", "True").lower() in {"1", "true", "yes"}
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "noreply@catadelivery.local")
+# Cola de correos (apps/users/mailer.py, command send_outbox_emails)
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF_SECONDS = 30
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS = 600   # lo reclamado por un proceso caído vuelve a la cola
 
 UNFOLD = {
     "SITE_TITLE": "Catadelivery",
@@ -214,17 +243,81 @@ FIREBASE_CREDENTIALS_PATH = BASE_DIR / "deliveryct-firebase-adminsdk-fbsvc-076f6
 # ---------------------------------------------------------------------------
 # Django Channels
 # ---------------------------------------------------------------------------
-CHANNEL_LAYERS = {
-    "default": {
-        # InMemory para desarrollo; en producción usar Redis:
-        # "BACKEND": "channels_redis.core.RedisChannelLayer",
-        # "CONFIG": {"hosts": [("127.0.0.1", 6379)]},
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
-}
+# Con CHANNEL_REDIS_URL (redis://host:6379/0 o unix:///ruta/redis.sock) el
+# channel layer es Redis y los grupos funcionan entre varios procesos daphne;
+# el cache "shared" también pasa a Redis. Sin ella se usa InMemory/LocMem,
+# válido solo para un proceso (desarrollo).
+CHANNEL_REDIS_URL = os.environ.get("CHANNEL_REDIS_URL")
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [CHANNEL_REDIS_URL],
+                "capacity": int(os.environ.get("CHANNEL_LAYER_CAPACITY", 1500)),
+                "expiry": 10,
+                "group_expiry": 24 * 3600,
+                "prefix": "catadelivery",
+            },
+        },
+    }
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CHANNEL_REDIS_URL,
+        "KEY_PREFIX": "catadelivery",
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
 
 # ---------------------------------------------------------------------------
 # MongoDB — almacén exclusivo de mensajes de chat
 # ---------------------------------------------------------------------------
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
-MONGO_DB_NAME = os.environ.get("MONGO_DB_NAME", "catadelivery_chat")
\ No newline at end of file
+MONGO_DB_NAME = os.environ.get("MONGO_DB_NAME", "catadelivery_chat")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))  # por cliente (sync y async)
+
+# Escritura diferida de mensajes de chat (apps/chat/write_behind.py)
+CHAT_WRITE_BEHIND_BATCH_SIZE = 100          # insert_many al juntar 100 mensajes...
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL_S = 0.2    # ...o a los 200 ms
+CHAT_WRITE_BEHIND_MAX_RETRIES = 5
+CHAT_WRITE_BEHIND_BACKLOG_WARNING = 5000
+CHAT_WRITE_BEHIND_DURABLE = os.environ.get("CHAT_WRITE_BEHIND_DURABLE", "false").lower() == "true"
+
+# Participantes por conversación en cache (apps/chat/membership.py)
+CHAT_MEMBERSHIP_CACHE_TTL = 300
+CHAT_MEMBERSHIP_CACHE_ALIAS = "shared"
+CHAT_MEMBERSHIP_LOCAL_TTL = 10              # nivel local por proceso, leído sin salto de hilo
+
+# Máximo de mensajes reenviados al reconectar con ?since_seq= (ChatConsumer)
+CHAT_REPLAY_MAX_MESSAGES = 500
+
+# Tópicos por conexión en el socket multiplexado ws/stream/ (UserStreamConsumer)
+CHAT_STREAM_MAX_SUBSCRIPTIONS = 100
+
+# Cola de salida por conexión WebSocket (apps/chat/outbound.py)
+CHAT_OUTBOUND_MAX_FRAMES = 256              # frames pendientes antes de aplicar la política
+CHAT_OUTBOUND_POLICY = os.environ.get("CHAT_OUTBOUND_POLICY", "shed")  # "shed" o "close"
+CHAT_OUTBOUND_COALESCE_MS = 25              # ventana para agrupar ráfagas (clientes con ?batch=1)
+CHAT_OUTBOUND_BATCH_MAX_FRAMES = 50
+CHAT_OUTBOUND_MAX_UNACKED = 64              # frames en vuelo sin ack (clientes con ?ack=1)
+CHAT_OUTBOUND_SEND_TIMEOUT_S = 10           # ventana llena (o un envío) más tiempo que esto cierra la conexión
+
+# Conversaciones de pedidos entregados/cancelados sin mensajes en este plazo
+# se compactan en chat_archives (python manage.py compact_chat_archives)
+CHAT_ARCHIVE_AFTER_DAYS = int(os.environ.get("CHAT_ARCHIVE_AFTER_DAYS", 30))
+
+# Recorrido GPS de riders (colección rider_location_trails en MongoDB)
+RIDER_TRAIL_BUCKET_SECONDS = 15 * 60       # un documento por rider cada 15 min
+RIDER_TRAIL_MAX_POINTS_PER_BUCKET = 200
+RIDER_TRAIL_MIN_DISTANCE_M = 25.0          # downsampling por distancia
+RIDER_TRAIL_MIN_INTERVAL_S = 5.0
+RIDER_TRAIL_MAX_INTERVAL_S = 60.0          # guardar al menos un punto por minuto
+RIDER_TRAIL_RETENTION_DAYS = int(os.environ.get("RIDER_TRAIL_RETENTION_DAYS", 30))
+
+# Posición en vivo del rider hacia el cliente (WebSocket ws/orders/<id>/tracking/)
+RIDER_LIVE_MIN_INTERVAL_S = 3.0            # como máximo un mensaje cada 3 s
+RIDER_LIVE_MIN_DISTANCE_M = 5.0            # solo si se movió más de 5 m
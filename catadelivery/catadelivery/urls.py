@@ -25,7 +25,7 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from apps.chat.api_views import ConversationViewSet
 from apps.order.api_views import OrderProductViewSet, OrderViewSet
-from apps.store.api_views import CategoryViewSet, ProductViewSet, StoreViewSet
+from apps.store.api_views import CategoryViewSet, ProductViewSet, SearchView, StoreViewSet
 from apps.users.api_views import (
     CatadeliveryTokenObtainPairView,
     ChangePasswordView,
@@ -64,6 +64,7 @@ urlpatterns = [
     path("api/auth/forgot-password/", ForgotPasswordView.as_view(), name="forgot_password"),
     path("api/auth/reset-password/", ResetPasswordView.as_view(), name="reset_password"),
     path("api/auth/toggle-active/", ToggleActiveStatusView.as_view(), name="toggle_active"),
+    path("api/search/", SearchView.as_view(), name="search"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/docs/",